@@ -12,7 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .agent import root_agent
+__all__ = ["root_agent"]
 
 
-__all__ = ["root_agent"]
+def __getattr__(name: str) -> object:
+    # Importing a submodule (e.g. `app.utils.tracing`) no longer builds the agent graph.
+    if name == "root_agent":
+        from .agent import get_root_agent
+
+        return get_root_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,27 +1,15 @@
+from __future__ import annotations
 
+import functools
 import os
-import google.auth
-from google.genai import types
-from google.adk.agents import Agent
-from google.adk.tools import agent_tool
+from collections.abc import Callable
+from typing import TYPE_CHECKING
 
-from app.bq_agent import usda_bigquery_agent
-from app.allergen_agent import allergen_research_agent
-from app.image_agent import image_agent
+from app.allergen_index import lookup_food_allergens, scan_ingredients_for_allergens
+from app.config import Config
 
-
-_, project_id = google.auth.default()
-os.environ.setdefault("GOOGLE_CLOUD_PROJECT", project_id)
-os.environ.setdefault("GOOGLE_CLOUD_LOCATION", "global")
-os.environ.setdefault("GOOGLE_GENAI_USE_VERTEXAI", "True")
-
-MODEL = "gemini-2.5-flash"
-
-agent_generation = types.GenerateContentConfig(
-    temperature=0.6,
-    top_p=0.9,
-    max_output_tokens=32768,
-)  
+if TYPE_CHECKING:
+    from google.adk.agents import Agent, BaseAgent
 
 
 MAIN_AGENT_INSTRUCTIONS="""
@@ -30,16 +18,105 @@ Answer questions related to food, nutrician, allergies, dietary health, and othe
 You have 2 helper agents.
 - The usda_bigquery_agent has access to a large database from the USDA containing all sorts to food-related information.
 - The image_agent generate images if requested
+For allergen questions about a specific USDA food or ingredient list, first use
+lookup_food_allergens (by fdc_id) or scan_ingredients_for_allergens (by food name or ingredients).
+They cover milk, egg, fish, shellfish, tree nuts, peanuts, wheat, soy, sesame and gluten.
+Only use the allergy research tool for other allergens, medical questions, or when the index has no answer.
 You can use your tool to search for information about allergies and related health concerns online.
 When you use the Google Search tool, always cite the source of the information you find.
 """
 
-root_agent = Agent(
-    name="main_agent",
-    model=MODEL,
-    description="Provides Answers to Users Food and Allergy Questions.",
-    instruction=MAIN_AGENT_INSTRUCTIONS,
-    tools=[agent_tool.AgentTool(agent=allergen_research_agent)],
-    sub_agents=[usda_bigquery_agent, image_agent],
-    generate_content_config=agent_generation,
-)
\ No newline at end of file
+
+# The agent graph is built on first use: importing `app` no longer loads ADK,
+# resolves credentials or creates BigQuery clients. Each getter is cached, so
+# the graph is still built once per process.
+def _configure_environment() -> None:
+    if not os.environ.get("GOOGLE_CLOUD_PROJECT"):
+        import google.auth
+
+        _, project_id = google.auth.default()
+        os.environ.setdefault("GOOGLE_CLOUD_PROJECT", project_id)
+    os.environ.setdefault("GOOGLE_CLOUD_LOCATION", "global")
+    os.environ.setdefault("GOOGLE_GENAI_USE_VERTEXAI", "True")
+
+
+@functools.cache
+def get_main_agent() -> Agent:
+    _configure_environment()
+    from google.adk.agents import Agent
+    from google.adk.tools import agent_tool
+    from google.genai import types
+
+    from app.allergen_agent import get_allergen_research_agent
+    from app.bq_agent import get_bigquery_agent
+    from app.context_manager import compact_context
+    from app.image_agent import get_image_agent
+    from app.model_cascade import cascade_model
+
+    agent_generation = types.GenerateContentConfig(
+        temperature=0.6,
+        top_p=0.9,
+        max_output_tokens=32768,
+    )
+
+    return Agent(
+        name="main_agent",
+        # Cheapest tier first; escalates to Config.MODEL only when needed.
+        model=cascade_model("main_agent"),
+        description="Provides Answers to Users Food and Allergy Questions.",
+        instruction=MAIN_AGENT_INSTRUCTIONS,
+        tools=[
+            lookup_food_allergens,
+            scan_ingredients_for_allergens,
+            agent_tool.AgentTool(agent=get_allergen_research_agent()),
+        ],
+        sub_agents=[get_bigquery_agent(), get_image_agent()],
+        generate_content_config=agent_generation,
+        # Older turns are summarized so the prompt does not grow with the chat.
+        before_model_callback=compact_context,
+    )
+
+
+@functools.cache
+def get_orchestrator() -> BaseAgent:
+    main_agent = get_main_agent()
+    if not Config.PLANNER_MODE_ENABLED:
+        return main_agent
+    from app.allergen_agent import get_allergen_research_agent
+    from app.bq_agent import get_bigquery_agent
+    from app.model_cascade import cascade_model
+    from app.planner import build_planner_agent
+
+    # Compound data + allergy questions run both lookups concurrently.
+    return build_planner_agent(
+        main_agent,
+        get_bigquery_agent(),
+        get_allergen_research_agent(),
+        cascade_model("planner_merge_agent"),
+    )
+
+
+@functools.cache
+def get_root_agent() -> BaseAgent:
+    orchestrator = get_orchestrator()
+    if not Config.INTENT_ROUTER_ENABLED:
+        return orchestrator
+    from app.router import build_intent_router
+
+    # The local router answers confident requests without a main_agent hop and
+    # falls back to the orchestrator for everything else.
+    return build_intent_router(orchestrator)
+
+
+_LAZY_AGENTS: dict[str, Callable[[], BaseAgent]] = {
+    "root_agent": get_root_agent,
+    "orchestrator": get_orchestrator,
+    "main_agent": get_main_agent,
+}
+
+
+def __getattr__(name: str) -> BaseAgent:
+    # `from app.agent import root_agent` (and ADK's agent loader) build the graph here.
+    if name in _LAZY_AGENTS:
+        return _LAZY_AGENTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -13,23 +13,31 @@
 # limitations under the License.
 
 # mypy: disable-error-code="attr-defined,arg-type"
-import datetime
-import json
 import logging
 import os
 from typing import Any
 
 import google.auth
 import vertexai
-from google.adk.artifacts import GcsArtifactService
 from google.cloud import logging as google_cloud_logging
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider, export
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider, export
 from vertexai._genai.types import AgentEngine, AgentEngineConfig
 from vertexai.agent_engines.templates.adk import AdkApp
 
-from app.agent import root_agent
+from app.agent import get_root_agent
+from app.config import Config
+from app.utils.artifact_cache import artifact_cache_stats, build_artifact_service
+from app.utils.deployment import (
+    METADATA_FILE,
+    content_hash,
+    find_agent_engine,
+    read_metadata,
+    write_metadata,
+)
+from app.utils.feedback import FeedbackWriter
 from app.utils.gcs import create_bucket_if_not_exists
+from app.utils.tail_sampling import TailSamplingSpanProcessor
 from app.utils.tracing import CloudTraceLoggingSpanExporter
 from app.utils.typing import Feedback
 
@@ -43,19 +51,53 @@ class AgentEngineApp(AdkApp):
         logging.basicConfig(level=logging.INFO)
         logging_client = google_cloud_logging.Client()
         self.logger = logging_client.logger(__name__)
+        self.feedback_writer = FeedbackWriter(
+            self.logger,
+            batch_size=Config.FEEDBACK_BATCH_SIZE,
+            flush_interval_s=Config.FEEDBACK_FLUSH_INTERVAL_SECONDS,
+        )
         provider = TracerProvider()
-        processor = export.BatchSpanProcessor(
+        processor: SpanProcessor = export.BatchSpanProcessor(
             CloudTraceLoggingSpanExporter(
                 project_id=os.environ.get("GOOGLE_CLOUD_PROJECT")
             )
         )
+        self.span_sampler: TailSamplingSpanProcessor | None = None
+        if Config.TRACE_SAMPLING_ENABLED:
+            # Only the traces worth reading reach the exporter.
+            processor = self.span_sampler = TailSamplingSpanProcessor(
+                processor,
+                sample_rate=Config.TRACE_SAMPLE_RATE,
+                slow_ms=Config.TRACE_SLOW_MS,
+                keep_tools=Config.TRACE_KEEP_TOOLS,
+                max_traces=Config.TRACE_MAX_BUFFERED,
+                timeout_s=Config.TRACE_BUFFER_TIMEOUT_SECONDS,
+            )
         provider.add_span_processor(processor)
         trace.set_tracer_provider(provider)
 
+    def get_trace_sampling_stats(self) -> dict[str, Any]:
+        """Kept and dropped span counts of the tail sampler in this worker."""
+        if self.span_sampler is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.span_sampler.stats()}
+
+    def get_artifact_cache_stats(self) -> dict[str, Any]:
+        """Artifact cache hits, backend loads and background uploads in this worker."""
+        return {"enabled": Config.ARTIFACT_CACHE_ENABLED, **artifact_cache_stats()}
+
     def register_feedback(self, feedback: dict[str, Any]) -> None:
-        """Collect and log feedback."""
+        """Validate feedback and queue it for a batched log write."""
         feedback_obj = Feedback.model_validate(feedback)
-        self.logger.log_struct(feedback_obj.model_dump(), severity="INFO")
+        self.feedback_writer.add(feedback_obj)
+
+    def get_feedback_summary(
+        self, invocation_id: str | None = None, user_id: str | None = None
+    ) -> dict[str, Any]:
+        """Feedback score aggregates seen by this worker, overall or per invocation/user."""
+        return self.feedback_writer.summary(
+            invocation_id=invocation_id, user_id=user_id
+        )
 
     def register_operations(self) -> dict[str, list[str]]:
         """Registers the operations of the Agent.
@@ -63,7 +105,13 @@ class AgentEngineApp(AdkApp):
         Extends the base operations to include feedback registration functionality.
         """
         operations = super().register_operations()
-        operations[""] = operations.get("", []) + ["register_feedback"]
+        operations[""] = [
+            *operations.get("", []),
+            "register_feedback",
+            "get_feedback_summary",
+            "get_trace_sampling_stats",
+            "get_artifact_cache_stats",
+        ]
         return operations
 
 
@@ -75,39 +123,76 @@ def deploy_agent_engine_app(
     extra_packages: list[str] = ["./app"],
     env_vars: dict[str, str] = {},
     service_account: str | None = None,
+    force: bool = False,
+    client: Any | None = None,
+    metadata_file: str = METADATA_FILE,
 ) -> AgentEngine:
-    """Deploy the agent engine app to Vertex AI."""
+    """
+    Deploy the agent engine app to Vertex AI.
+
+    Skipped when the engine in `metadata_file` still exists and the content
+    hash of the packages, requirements, env vars and settings matches the
+    last deploy; pass `force` to deploy anyway.
+    """
     logging.basicConfig(level=logging.INFO)
     staging_bucket_uri = f"gs://{project}-agent-engine"
     artifacts_bucket_name = f"{project}-my-agent-in-agent-engine-logs-data"
+
+    # Read requirements
+    with open(requirements_file) as f:
+        requirements = f.read().strip().split("\n")
+
+    # Set worker parallelism to 1
+    env_vars = {**env_vars, "NUM_WORKERS": "1"}
+
+    digest = content_hash(
+        extra_packages,
+        requirements,
+        env_vars,
+        {
+            "project": project,
+            "location": location,
+            "agent_name": agent_name,
+            "service_account": service_account,
+        },
+    )
+    metadata = read_metadata(metadata_file)
+
+    # Initialize vertexai client
+    if client is None:
+        client = vertexai.Client(
+            project=project,
+            location=location,
+        )
+    existing = find_agent_engine(
+        client, agent_name, metadata.get("remote_agent_engine_id")
+    )
+    if (
+        existing is not None
+        and not force
+        and metadata.get("content_hash") == digest
+        and metadata.get("remote_agent_engine_id") == existing.api_resource.name
+    ):
+        logging.info(
+            f"No changes since the last deploy of {agent_name} "
+            f"({existing.api_resource.name}); skipping. Use --force to redeploy."
+        )
+        return existing
+
     create_bucket_if_not_exists(
         bucket_name=artifacts_bucket_name, project=project, location=location
     )
     create_bucket_if_not_exists(
         bucket_name=staging_bucket_uri, project=project, location=location
     )
-
-    # Initialize vertexai client
-    client = vertexai.Client(
-        project=project,
-        location=location,
-    )
     vertexai.init(project=project, location=location)
 
-    # Read requirements
-    with open(requirements_file) as f:
-        requirements = f.read().strip().split("\n")
-
     agent_engine = AgentEngineApp(
-        agent=root_agent,
-        artifact_service_builder=lambda: GcsArtifactService(
-            bucket_name=artifacts_bucket_name
-        ),
+        agent=get_root_agent(),
+        # GCS behind a per-worker memory and disk cache (Config.ARTIFACT_CACHE_*).
+        artifact_service_builder=lambda: build_artifact_service(artifacts_bucket_name),
     )
 
-    # Set worker parallelism to 1
-    env_vars["NUM_WORKERS"] = "1"
-
     # Common configuration for both create and update operations
     config = AgentEngineConfig(
         display_name=agent_name,
@@ -125,34 +210,18 @@ def deploy_agent_engine_app(
     }
     logging.info(f"Agent config: {agent_config}")
 
-    # Check if an agent with this name already exists
-    existing_agents = list(client.agent_engines.list())
-    matching_agents = [
-        agent
-        for agent in existing_agents
-        if agent.api_resource.display_name == agent_name
-    ]
-
-    if matching_agents:
+    if existing is not None:
         # Update the existing agent with new configuration
         logging.info(f"Updating existing agent: {agent_name}")
         remote_agent = client.agent_engines.update(
-            name=matching_agents[0].api_resource.name, **agent_config
+            name=existing.api_resource.name, **agent_config
         )
     else:
         # Create a new agent if none exists
         logging.info(f"Creating new agent: {agent_name}")
         remote_agent = client.agent_engines.create(**agent_config)
 
-    metadata = {
-        "remote_agent_engine_id": remote_agent.api_resource.name,
-        "deployment_timestamp": datetime.datetime.now().isoformat(),
-    }
-    metadata_file = "deployment_metadata.json"
-
-    with open(metadata_file, "w") as f:
-        json.dump(metadata, f, indent=2)
-
+    write_metadata(metadata_file, remote_agent.api_resource.name, digest)
     logging.info(f"Agent Engine ID written to {metadata_file}")
 
     return remote_agent
@@ -197,6 +266,11 @@ if __name__ == "__main__":
         default=None,
         help="Service account email to use for the agent engine",
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Deploy even if nothing changed since the last deploy",
+    )
     args = parser.parse_args()
 
     # Parse environment variables if provided
@@ -225,4 +299,5 @@ if __name__ == "__main__":
         extra_packages=args.extra_packages,
         env_vars=env_vars,
         service_account=args.service_account,
+        force=args.force,
     )
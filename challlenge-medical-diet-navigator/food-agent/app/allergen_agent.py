@@ -1,6 +1,10 @@
-from google.adk.agents import Agent
-from google.genai import types
-from google.adk.tools import google_search 
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
 
 
 # ---- Agent that uses Allergy Online webite Data Store ----
@@ -11,21 +15,39 @@ You can also use the Google Search tool to find relevant information on the web.
 When you use the Google Search tool, always cite the source of the information you find.
 """
 
-MODEL = "gemini-2.5-flash"
-
-agent_generation = types.GenerateContentConfig(
-    temperature=0.6,
-    top_p=0.9,
-    max_output_tokens=32768,
-)  
-
-allergen_research_agent = Agent(
-    model=MODEL,   # or your preferred Gemini model
-    name="allergy_research_agent",
-    description=f"Answer questions about allergies and related health concerns.",
-    instruction=INSTR,
-    tools=[
-        google_search
-    ],  
-    generate_content_config=agent_generation,
-)
+
+# Built on first use; ADK and the model cascade are only imported then.
+@functools.cache
+def get_allergen_research_agent() -> Agent:
+    from google.adk.agents import Agent
+    from google.adk.tools import google_search
+    from google.genai import types
+
+    from .model_cascade import cascade_model
+    from .utils.search_cache import after_model_search_cache, before_model_search_cache
+
+    agent_generation = types.GenerateContentConfig(
+        temperature=0.6,
+        top_p=0.9,
+        max_output_tokens=32768,
+    )
+
+    return Agent(
+        model=cascade_model("allergy_research_agent"),
+        name="allergy_research_agent",
+        description=f"Answer questions about allergies and related health concerns.",
+        instruction=INSTR,
+        tools=[
+            google_search
+        ],
+        generate_content_config=agent_generation,
+        # Repeat questions are answered from the search cache, citations included.
+        before_model_callback=before_model_search_cache,
+        after_model_callback=after_model_search_cache,
+    )
+
+
+def __getattr__(name: str) -> object:
+    if name == "allergen_research_agent":
+        return get_allergen_research_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
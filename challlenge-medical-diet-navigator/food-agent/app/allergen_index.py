@@ -0,0 +1,636 @@
+"""
+Offline allergen index over the USDA FoodData Central tables.
+
+A single Aho-Corasick automaton holding every allergen synonym is compiled when
+this module is imported. The dataset import (`python -m app.ingest`) scans
+`food.description`, `input_food.ingredient_description` and the food category
+and publishes a per-`fdc_id` allergen bitmap snapshot; agents only load that
+snapshot, and lookups are binary searches in it. Web search is only needed for
+foods or allergens the index does not cover.
+"""
+
+from __future__ import annotations
+
+import bisect
+import enum
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+from .config import Config
+from .ingest.refresh import read_versions
+
+
+class Allergen(enum.IntFlag):
+    """Major allergen families (FDA "Big 9" plus gluten for Celiac users)."""
+
+    MILK = 1 << 0
+    EGG = 1 << 1
+    FISH = 1 << 2
+    SHELLFISH = 1 << 3
+    TREE_NUTS = 1 << 4
+    PEANUTS = 1 << 5
+    WHEAT = 1 << 6
+    SOY = 1 << 7
+    SESAME = 1 << 8
+    GLUTEN = 1 << 9
+
+
+# Synonyms per family. Terms are matched on whole words after normalization.
+# fmt: off
+ALLERGEN_SYNONYMS: dict[Allergen, tuple[str, ...]] = {
+    Allergen.MILK: (
+        "milk", "dairy", "cheese", "butter", "buttermilk", "cream", "yogurt",
+        "yoghurt", "whey", "casein", "caseinate", "lactose", "ghee", "kefir",
+        "curd", "curds", "custard", "ricotta", "mozzarella", "cheddar",
+        "parmesan", "ice cream", "half and half", "nonfat dry milk",
+    ),
+    Allergen.EGG: (
+        "egg", "eggs", "egg white", "egg yolk", "albumin", "albumen",
+        "mayonnaise", "meringue", "ovalbumin", "lysozyme",
+    ),
+    Allergen.FISH: (
+        "fish", "salmon", "tuna", "cod", "pollock", "haddock", "halibut",
+        "tilapia", "trout", "anchovy", "anchovies", "sardine", "sardines",
+        "mackerel", "herring", "catfish", "flounder", "snapper", "bass",
+        "swordfish", "fish sauce", "worcestershire",
+    ),
+    Allergen.SHELLFISH: (
+        "shellfish", "shrimp", "prawn", "prawns", "crab", "lobster",
+        "crayfish", "crawfish", "krill", "clam", "clams", "mussel", "mussels",
+        "oyster", "oysters", "scallop", "scallops", "squid", "octopus",
+    ),
+    Allergen.TREE_NUTS: (
+        "tree nut", "tree nuts", "almond", "almonds", "walnut", "walnuts",
+        "pecan", "pecans", "cashew", "cashews", "pistachio", "pistachios",
+        "hazelnut", "hazelnuts", "filbert", "filberts", "macadamia",
+        "brazil nut", "brazil nuts", "pine nut", "pine nuts", "chestnut",
+        "chestnuts", "praline", "marzipan", "nougat", "nuts",
+    ),
+    Allergen.PEANUTS: (
+        "peanut", "peanuts", "groundnut", "groundnuts", "peanut butter",
+        "peanut oil", "arachis",
+    ),
+    Allergen.WHEAT: (
+        "wheat", "flour", "semolina", "durum", "spelt", "farro", "bulgur",
+        "couscous", "seitan", "bread", "breadcrumbs", "pasta", "noodles",
+        "graham", "wheat germ", "wheat bran", "einkorn", "emmer",
+    ),
+    Allergen.SOY: (
+        "soy", "soya", "soybean", "soybeans", "tofu", "tempeh", "edamame",
+        "miso", "soy sauce", "tamari", "soy lecithin", "shoyu", "natto",
+    ),
+    Allergen.SESAME: (
+        "sesame", "sesame seed", "sesame seeds", "sesame oil", "tahini",
+        "halvah", "halva", "benne",
+    ),
+    Allergen.GLUTEN: (
+        "gluten", "barley", "rye", "malt", "triticale", "brewer s yeast",
+    ),
+}
+# fmt: on
+
+# Terms that embed an allergen synonym but are not that allergen. They win the
+# leftmost-longest match, so e.g. "peanut butter" never reports MILK and
+# "coconut milk" reports nothing.
+ALLERGEN_EXCLUSIONS: dict[str, Allergen] = {
+    "peanut butter": Allergen.PEANUTS,
+    "almond butter": Allergen.TREE_NUTS,
+    "cashew butter": Allergen.TREE_NUTS,
+    "almond milk": Allergen.TREE_NUTS,
+    "cashew milk": Allergen.TREE_NUTS,
+    "soy milk": Allergen.SOY,
+    "soymilk": Allergen.SOY,
+    "cocoa butter": Allergen(0),
+    "shea butter": Allergen(0),
+    "apple butter": Allergen(0),
+    "nut butter": Allergen.TREE_NUTS,
+    "coconut milk": Allergen(0),
+    "coconut cream": Allergen(0),
+    "oat milk": Allergen(0),
+    "rice milk": Allergen(0),
+    "cream of tartar": Allergen(0),
+    "water chestnut": Allergen(0),
+    "water chestnuts": Allergen(0),
+    "nutmeg": Allergen(0),
+    "buckwheat": Allergen(0),
+    "rice flour": Allergen(0),
+    "corn flour": Allergen(0),
+    "almond flour": Allergen.TREE_NUTS,
+    "coconut flour": Allergen(0),
+    "gluten free": Allergen(0),
+    "wheat free": Allergen(0),
+    "dairy free": Allergen(0),
+    "egg free": Allergen(0),
+    "rice noodles": Allergen(0),
+    "egg noodles": Allergen.EGG | Allergen.WHEAT | Allergen.GLUTEN,
+}
+
+# Wheat always carries gluten.
+_IMPLIED: dict[Allergen, Allergen] = {Allergen.WHEAT: Allergen.GLUTEN}
+
+# Category names only hint at allergens; they are reported as "possible".
+CATEGORY_HINTS: dict[str, Allergen] = {
+    "dairy and egg products": Allergen.MILK | Allergen.EGG,
+    "finfish and shellfish products": Allergen.FISH | Allergen.SHELLFISH,
+    "nut and seed products": Allergen.TREE_NUTS | Allergen.SESAME,
+    "legumes and legume products": Allergen.PEANUTS | Allergen.SOY,
+    "baked products": Allergen.WHEAT | Allergen.GLUTEN | Allergen.EGG | Allergen.MILK,
+    "cereal grains and pasta": Allergen.WHEAT | Allergen.GLUTEN,
+    "breakfast cereals": Allergen.WHEAT | Allergen.GLUTEN,
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse punctuation so patterns match on word boundaries."""
+    return " " + _NON_ALNUM.sub(" ", (text or "").lower()).strip() + " "
+
+
+def allergen_names(mask: int) -> list[str]:
+    """Return the lowercase family names set in an allergen bitmap."""
+    return [(a.name or "").lower() for a in Allergen if a.value & mask]
+
+
+def parse_allergen(name: str) -> Allergen:
+    """Parse a family name or synonym ("tree nuts", "sesame seeds") into a flag."""
+    key = _NON_ALNUM.sub("_", name.strip().lower()).strip("_").upper()
+    if key in Allergen.__members__:
+        return Allergen[key]
+    mask = MATCHER.scan(name)
+    if not mask:
+        raise ValueError(f"Unknown allergen: {name!r}")
+    return Allergen(mask)
+
+
+class AllergenMatcher:
+    """
+    Aho-Corasick automaton over allergen synonyms.
+
+    Matches are whole-word and resolved leftmost-longest, so a longer term
+    ("peanut butter") shadows the shorter ones it contains ("butter").
+    """
+
+    def __init__(self, patterns: dict[str, int]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # (pattern length, mask) for every pattern ending at a node
+        self._out: list[list[tuple[int, int]]] = [[]]
+        for term, mask in patterns.items():
+            self._add(normalize_text(term).strip(), mask)
+        self._build()
+
+    @classmethod
+    def from_synonyms(
+        cls,
+        synonyms: dict[Allergen, tuple[str, ...]] = ALLERGEN_SYNONYMS,
+        exclusions: dict[str, Allergen] = ALLERGEN_EXCLUSIONS,
+    ) -> AllergenMatcher:
+        patterns: dict[str, int] = {}
+        for allergen, terms in synonyms.items():
+            for term in terms:
+                patterns[term] = patterns.get(term, 0) | allergen.value
+        for term, allergen in exclusions.items():
+            patterns[term] = allergen.value
+        return cls(patterns)
+
+    def _add(self, term: str, mask: int) -> None:
+        # Patterns are stored padded so they only match whole words.
+        term = f" {term} "
+        node = 0
+        for ch in term:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(term), mask))
+
+    def _build(self) -> None:
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child].extend(self._out[self._fail[child]])
+
+    def iter_matches(self, text: str) -> Iterator[tuple[int, int, int]]:
+        """Yield raw (start, end, mask) matches over normalized text."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, mask in self._out[node]:
+                yield i + 1 - length, i + 1, mask
+
+    def scan(self, text: str) -> int:
+        """Return the allergen bitmap for free text."""
+        normalized = normalize_text(text)
+        matches = sorted(self.iter_matches(normalized), key=lambda m: (m[0], -m[1]))
+        mask = 0
+        # Padding spaces are shared between adjacent words, hence the -1.
+        covered_until = -1
+        for start, end, m in matches:
+            if start < covered_until - 1:
+                continue
+            covered_until = end
+            mask |= m
+        for allergen, implied in _IMPLIED.items():
+            if mask & allergen:
+                mask |= implied
+        return mask
+
+
+MATCHER = AllergenMatcher.from_synonyms()
+
+
+@dataclass(frozen=True)
+class FoodAllergens:
+    """Index entry for one food."""
+
+    description: str
+    contains: int
+    possible: int
+
+
+# Binary snapshot layout, after a one-line JSON header: fdc_ids (int64),
+# contains and possible bitmaps (uint16), description offsets (uint32) and
+# the concatenated UTF-8 descriptions.
+_SNAPSHOT_FORMAT = 2
+_ARRAYS = (("_ids", "q"), ("_contains", "H"), ("_possible", "H"), ("_offsets", "I"))
+
+
+class AllergenIndex:
+    """
+    `fdc_id` -> allergen bitmap index.
+
+    Entries are kept in parallel arrays sorted by `fdc_id` rather than as one
+    Python object per food, so a full release costs a few bytes per food
+    plus its description, and a lookup is a binary search.
+    """
+
+    def __init__(
+        self, entries: dict[int, FoodAllergens] | None = None, version: int = 0
+    ) -> None:
+        self._set_entries(entries or {})
+        # `_dataset_version` the index was built from; 0 if unknown.
+        self.version = version
+
+    def _set_entries(self, entries: dict[int, FoodAllergens]) -> None:
+        ids = sorted(entries)
+        encoded = [entries[i].description.encode() for i in ids]
+        self._ids = array("q", ids)
+        self._contains = array("H", (entries[i].contains for i in ids))
+        self._possible = array("H", (entries[i].possible for i in ids))
+        self._offsets = array(
+            "I", itertools.accumulate((len(d) for d in encoded), initial=0)
+        )
+        self._descriptions = b"".join(encoded)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, fdc_id: object) -> bool:
+        return isinstance(fdc_id, int) and self._position(fdc_id) is not None
+
+    def _position(self, fdc_id: int) -> int | None:
+        i = bisect.bisect_left(self._ids, fdc_id)
+        return i if i < len(self._ids) and self._ids[i] == fdc_id else None
+
+    def _entry(self, i: int) -> FoodAllergens:
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return FoodAllergens(
+            self._descriptions[start:end].decode(), self._contains[i], self._possible[i]
+        )
+
+    def get(self, fdc_id: int) -> FoodAllergens | None:
+        i = self._position(int(fdc_id))
+        return None if i is None else self._entry(i)
+
+    def entries(self) -> dict[int, FoodAllergens]:
+        return {fdc_id: self._entry(i) for i, fdc_id in enumerate(self._ids)}
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[dict[str, Any]], matcher: AllergenMatcher = MATCHER
+    ) -> AllergenIndex:
+        """
+        Build the index from rows with `fdc_id`, `description`, `food_category`
+        and `ingredients` (a list of `input_food.ingredient_description`).
+        Several rows for one `fdc_id` are merged.
+        """
+        entries: dict[int, FoodAllergens] = {}
+        for row in rows:
+            fdc_id = int(row["fdc_id"])
+            description = row.get("description") or ""
+            text = " | ".join([description, *(row.get("ingredients") or [])])
+            contains = matcher.scan(text)
+            category = (row.get("food_category") or "").strip().lower()
+            possible = CATEGORY_HINTS.get(category, Allergen(0)).value & ~contains
+            prev = entries.get(fdc_id)
+            if prev is not None:
+                contains |= prev.contains
+                possible = (possible | prev.possible) & ~contains
+                description = prev.description or description
+            entries[fdc_id] = FoodAllergens(description, contains, possible)
+        return cls(entries)
+
+    @classmethod
+    def from_bigquery(
+        cls,
+        project_id: str = Config.GOOGLE_CLOUD_PROJECT,
+        dataset_name: str = Config.DATASET_NAME,
+        client: Any = None,
+    ) -> AllergenIndex:
+        """Scan the USDA dataset once and build the index from the result."""
+        if client is None:
+            from google.cloud import bigquery
+
+            client = bigquery.Client(project=project_id)
+        versions = read_versions(client, project_id, dataset_name)
+        rows = client.query(build_index_sql(project_id, dataset_name)).result()
+        index = cls.from_rows(dict(row.items()) for row in rows)
+        index.version = versions[-1].version if versions else 0
+        return index
+
+    def catch_up(
+        self,
+        project_id: str = Config.GOOGLE_CLOUD_PROJECT,
+        dataset_name: str = Config.DATASET_NAME,
+        client: Any = None,
+    ) -> bool:
+        """
+        Apply dataset refreshes newer than `self.version`.
+
+        Incremental refreshes re-scan only their changed foods. A full reload,
+        a category change, or a refresh of our tables without a list of
+        changed foods rebuilds the whole index. Returns True if anything changed.
+        """
+        if client is None:
+            from google.cloud import bigquery
+
+            client = bigquery.Client(project=project_id)
+        versions = read_versions(client, project_id, dataset_name, after=self.version)
+        if not versions:
+            return False
+        fdc_ids: set[int] = set()
+        for v in versions:
+            touched = INDEX_TABLES.intersection(v.changed_tables)
+            if (
+                v.mode == "full"
+                or "food_category" in touched
+                or (touched and not v.changed_fdc_ids)
+            ):
+                rebuilt = AllergenIndex.from_bigquery(project_id, dataset_name, client)
+                self._set_entries(rebuilt.entries())
+                self.version = rebuilt.version
+                return True
+            if touched:
+                fdc_ids.update(v.changed_fdc_ids)
+        if fdc_ids:
+            from google.cloud import bigquery
+
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ArrayQueryParameter("fdc_ids", "INT64", sorted(fdc_ids))
+                ]
+            )
+            sql = build_index_sql(project_id, dataset_name, scoped=True)
+            rows = client.query(sql, job_config=job_config).result()
+            self.replace_foods(fdc_ids, (dict(row.items()) for row in rows))
+        self.version = versions[-1].version
+        logging.info(
+            f"Allergen index caught up to dataset version {self.version} "
+            f"({len(fdc_ids)} foods re-scanned)"
+        )
+        return True
+
+    def replace_foods(
+        self, fdc_ids: Iterable[int], rows: Iterable[dict[str, Any]]
+    ) -> None:
+        """Drop `fdc_ids` and index `rows` in their place (removed foods stay gone)."""
+        entries = self.entries()
+        for fdc_id in fdc_ids:
+            entries.pop(int(fdc_id), None)
+        entries.update(AllergenIndex.from_rows(rows).entries())
+        self._set_entries(entries)
+
+    def save(self, path: str) -> None:
+        """Write a snapshot to a local path or a gs:// URI."""
+        header = {
+            "format": _SNAPSHOT_FORMAT,
+            "version": self.version,
+            "count": len(self),
+            "byteorder": sys.byteorder,
+        }
+        data = [json.dumps(header).encode(), b"\n"]
+        data += [getattr(self, name).tobytes() for name, _ in _ARRAYS]
+        data.append(self._descriptions)
+        _write_bytes(path, b"".join(data))
+
+    @classmethod
+    def load(cls, path: str) -> AllergenIndex:
+        data = _read_bytes(path)
+        header_end = data.find(b"\n")
+        try:
+            header = json.loads(data[:header_end])
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("format") != _SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not an allergen index snapshot")
+        index = cls(version=header["version"])
+        count, pos = header["count"], header_end + 1
+        for name, typecode in _ARRAYS:
+            values = array(typecode)
+            size = (count + (name == "_offsets")) * values.itemsize
+            values.frombytes(data[pos : pos + size])
+            if header["byteorder"] != sys.byteorder:
+                values.byteswap()
+            setattr(index, name, values)
+            pos += size
+        index._descriptions = data[pos:]
+        return index
+
+
+def _read_bytes(path: str) -> bytes:
+    if path.startswith("gs://"):
+        import google.cloud.storage as storage
+        from google.api_core.exceptions import NotFound
+
+        bucket, _, name = path[len("gs://") :].partition("/")
+        try:
+            return storage.Client().bucket(bucket).blob(name).download_as_bytes()
+        except NotFound as e:
+            raise FileNotFoundError(f"No snapshot at {path}") from e
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    if path.startswith("gs://"):
+        import google.cloud.storage as storage
+
+        bucket, _, name = path[len("gs://") :].partition("/")
+        blob = storage.Client().bucket(bucket).blob(name)
+        blob.upload_from_string(data, content_type="application/octet-stream")
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# Tables `build_index_sql` reads; refreshes of other tables leave the index alone.
+INDEX_TABLES = frozenset({"food", "food_category", "input_food"})
+
+
+def build_index_sql(project_id: str, dataset_name: str, scoped: bool = False) -> str:
+    """
+    SQL returning one row per food with its category and ingredient names.
+    `scoped` limits it to the foods in the `@fdc_ids` array parameter.
+    """
+    ds = f"`{project_id}.{dataset_name}"
+    where = "WHERE f.fdc_id IN UNNEST(@fdc_ids)\n" if scoped else ""
+    return f"""
+SELECT
+  f.fdc_id,
+  f.description,
+  c.description AS food_category,
+  ARRAY_AGG(DISTINCT i.ingredient_description IGNORE NULLS) AS ingredients
+FROM {ds}.food` AS f
+LEFT JOIN {ds}.food_category` AS c ON c.id = f.food_category_id
+LEFT JOIN {ds}.input_food` AS i ON i.fdc_id = f.fdc_id
+{where}GROUP BY f.fdc_id, f.description, c.description
+"""
+
+
+def publish_allergen_index(
+    path: str,
+    project_id: str = Config.GOOGLE_CLOUD_PROJECT,
+    dataset_name: str = Config.DATASET_NAME,
+    client: Any = None,
+) -> bool:
+    """
+    Bring the snapshot at `path` up to date with the dataset.
+
+    Run by `python -m app.ingest` after every import or refresh, so the
+    dataset is only scanned there. An existing snapshot is caught up
+    (incremental refreshes re-scan only their foods); a missing or unreadable
+    one is built from scratch. Returns True if a new snapshot was written.
+    """
+    try:
+        index = AllergenIndex.load(path)
+    except (OSError, ValueError) as e:
+        logging.info(f"Building allergen index from scratch ({e})")
+        index = AllergenIndex.from_bigquery(project_id, dataset_name, client)
+    else:
+        if not index.catch_up(project_id, dataset_name, client):
+            return False
+    index.save(path)
+    logging.info(f"Wrote allergen index of {len(index)} foods to {path}")
+    return True
+
+
+_index: AllergenIndex | None = None
+_index_error: tuple[float, str] | None = None
+_index_lock = threading.Lock()
+# A missing snapshot is looked for again after this many seconds.
+_RETRY_AFTER_S = 300
+
+
+def get_allergen_index() -> AllergenIndex:
+    """
+    Return the process-wide index, loading the snapshot at
+    `Config.ALLERGEN_INDEX_PATH` on first use.
+
+    The dataset itself is never scanned here; the snapshot is produced by the
+    import pipeline (`publish_allergen_index`).
+    """
+    global _index, _index_error
+    with _index_lock:
+        if _index is not None:
+            return _index
+        if _index_error and time.monotonic() - _index_error[0] < _RETRY_AFTER_S:
+            raise RuntimeError(_index_error[1])
+        path = Config.ALLERGEN_INDEX_PATH
+        try:
+            if not path:
+                raise ValueError("ALLERGEN_INDEX_PATH is not set")
+            _index = AllergenIndex.load(path)
+        except Exception as e:
+            _index_error = (time.monotonic(), f"Allergen index not available: {e}")
+            raise RuntimeError(_index_error[1]) from e
+        logging.info(f"Allergen index ready with {len(_index)} foods")
+        return _index
+
+
+# =========================
+# Tools
+# =========================
+def lookup_food_allergens(fdc_id: int) -> dict[str, Any]:
+    """
+    Look up the major allergens of a USDA food by its `fdc_id`.
+
+    Use this before searching the web whenever you know the food's fdc_id.
+    "contains" lists allergens named in the food's description or ingredients;
+    "possible" lists allergens only suggested by the food's category.
+
+    Args:
+        fdc_id: The USDA FoodData Central id of the food.
+
+    Returns:
+        {"status": "success", "fdc_id": ..., "description": ..., "contains": [...], "possible": [...]}
+        or {"status": "not_found", ...} when the food is not in the index.
+    """
+    try:
+        entry = get_allergen_index().get(fdc_id)
+    except Exception as e:
+        logging.warning(str(e))
+        return {"status": "error", "error_message": f"{e}; research the food instead."}
+    if entry is None:
+        return {
+            "status": "not_found",
+            "fdc_id": fdc_id,
+            "error_message": "Food not in the allergen index; research it instead.",
+        }
+    return {
+        "status": "success",
+        "fdc_id": fdc_id,
+        "description": entry.description,
+        "contains": allergen_names(entry.contains),
+        "possible": allergen_names(entry.possible),
+    }
+
+
+def scan_ingredients_for_allergens(text: str) -> dict[str, Any]:
+    """
+    Detect major allergens (milk, egg, fish, shellfish, tree nuts, peanuts,
+    wheat, soy, sesame, gluten) named in a food name or ingredient list.
+
+    Args:
+        text: A food name, recipe, or ingredient list.
+
+    Returns:
+        {"status": "success", "contains": [...]}
+    """
+    return {"status": "success", "contains": allergen_names(MATCHER.scan(text))}
@@ -1,28 +1,19 @@
-import google.auth
-from google.genai import types
-from google.adk.agents import Agent
-from google.adk.tools.bigquery import BigQueryCredentialsConfig, BigQueryToolset
-from google.adk.tools.bigquery.config import BigQueryToolConfig, WriteMode
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING, Any
 
 from .bq_schema import DB_SCHEMA
 from .config import Config
 
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
+    from google.adk.agents.readonly_context import ReadonlyContext
+    from google.adk.tools.base_tool import BaseTool
+    from google.adk.tools.bigquery import BigQueryToolset
+
 PROJECT_ID = Config.GOOGLE_CLOUD_PROJECT
 DATASET_NAME = Config.DATASET_NAME
-MODEL = Config.MODEL
-
-# Uses Application Default Credentials for BigQuery (gcloud or service account).
-adc, _ = google.auth.default()
-bq_credentials = BigQueryCredentialsConfig(credentials=adc)
-
-# Read-only tool config (blocks DDL/DML). You can change to WriteMode.ALLOWED later if needed.
-bq_tool_cfg = BigQueryToolConfig(write_mode=WriteMode.BLOCKED)
-
-# Instantiate the BigQuery toolset
-bq_tools = BigQueryToolset(
-    credentials_config=bq_credentials,
-    bigquery_tool_config=bq_tool_cfg
-)
 
 # Instruct the agent to **only** use your dataset
 INSTR = f"""
@@ -31,21 +22,73 @@ The dataset you have access to contains information from the USDA about foods an
 Only query the dataset `{PROJECT_ID}.{DATASET_NAME}`.
 Fully qualify every table as `{PROJECT_ID}.{DATASET_NAME}.<table>`.
 Never perform DDL/DML; SELECT-only. Return the SQL you ran along with a concise answer.
+Columns are already typed as listed, so never CAST them. Filter on `clustered_by` columns when you can.
 Here is the database schema, please study it {DB_SCHEMA}
 """
 
-agent_generation = types.GenerateContentConfig(
-    temperature=0.6,
-    top_p=0.9,
-    max_output_tokens=32768,
-)  
-
-
-usda_bigquery_agent = Agent(
-    model=MODEL,         # Works with ADK; requires a Gemini API key or Vertex AI setup
-    name="usda_food_information_bigquery_agent",
-    description="""Analyzes tables in a BigQuery dataset that contains food information from the USDA. Tables.""",
-    instruction=INSTR,
-    tools=[bq_tools],
-    generate_content_config=agent_generation,
-)
\ No newline at end of file
+# The toolset and the agent are built on first use, so importing this module
+# (or the `app` package) stays cheap. Credentials are resolved later still, when
+# the agent first lists its tools, so building the graph needs no ADC.
+@functools.cache
+def get_bq_tools() -> BigQueryToolset:
+    from google.adk.tools.bigquery import BigQueryCredentialsConfig, BigQueryToolset
+    from google.adk.tools.bigquery.config import BigQueryToolConfig, WriteMode
+
+    class AdcBigQueryToolset(BigQueryToolset):
+        async def get_tools(
+            self, readonly_context: ReadonlyContext | None = None
+        ) -> list[BaseTool]:
+            if self._credentials_config is None:
+                import google.auth
+
+                # Uses Application Default Credentials for BigQuery (gcloud or service account).
+                adc, _ = google.auth.default()
+                self._credentials_config = BigQueryCredentialsConfig(credentials=adc)
+            return await super().get_tools(readonly_context)
+
+    # Read-only tool config (blocks DDL/DML). You can change to WriteMode.ALLOWED later if needed.
+    bq_tool_cfg = BigQueryToolConfig(write_mode=WriteMode.BLOCKED)
+
+    # Instantiate the BigQuery toolset
+    return AdcBigQueryToolset(
+        bigquery_tool_config=bq_tool_cfg
+    )
+
+
+@functools.cache
+def get_bigquery_agent() -> Agent:
+    from google.adk.agents import Agent
+    from google.genai import types
+
+    from .context_manager import compact_context
+    from .model_cascade import cascade_model
+    from .sql_governor import after_execute_sql, before_execute_sql
+
+    agent_generation = types.GenerateContentConfig(
+        temperature=0.6,
+        top_p=0.9,
+        max_output_tokens=32768,
+    )
+
+    return Agent(
+        model=cascade_model("usda_food_information_bigquery_agent"),  # Works with ADK; requires a Gemini API key or Vertex AI setup
+        name="usda_food_information_bigquery_agent",
+        description="""Analyzes tables in a BigQuery dataset that contains food information from the USDA. Tables.""",
+        instruction=INSTR,
+        tools=[get_bq_tools()],
+        generate_content_config=agent_generation,
+        # Every generated query is checked, rewritten and cost-estimated before it runs.
+        before_tool_callback=before_execute_sql,
+        after_tool_callback=after_execute_sql,
+        # Large results of earlier queries are cut down and older turns summarized.
+        before_model_callback=compact_context,
+    )
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps `from app.bq_agent import usda_bigquery_agent` working.
+    if name == "usda_bigquery_agent":
+        return get_bigquery_agent()
+    if name == "bq_tools":
+        return get_bq_tools()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,417 +1,5 @@
-DB_SCHEMA = """
-[{
-  "table_name": "lab_method_nutrient",
-  "fields": [{
-    "column_name": "lab_method_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "nutrient_id",
-    "data_type": "INT64"
-  }]
-}, {
-  "table_name": "food_update_log_entry",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "description",
-    "data_type": "STRING"
-  }, {
-    "column_name": "last_updated",
-    "data_type": "DATE"
-  }]
-}, {
-  "table_name": "input_food",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_of_input_food",
-    "data_type": "INT64"
-  }, {
-    "column_name": "seq_num",
-    "data_type": "STRING"
-  }, {
-    "column_name": "amount",
-    "data_type": "STRING"
-  }, {
-    "column_name": "ingredient_code",
-    "data_type": "STRING"
-  }, {
-    "column_name": "ingredient_description",
-    "data_type": "STRING"
-  }, {
-    "column_name": "unit",
-    "data_type": "STRING"
-  }, {
-    "column_name": "portion_code",
-    "data_type": "STRING"
-  }, {
-    "column_name": "portion_description",
-    "data_type": "STRING"
-  }, {
-    "column_name": "gram_weight",
-    "data_type": "STRING"
-  }, {
-    "column_name": "retention_code",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "sub_sample_food",
-  "fields": [{
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id_of_sample_food",
-    "data_type": "INT64"
-  }]
-}, {
-  "table_name": "food",
-  "fields": [{
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "data_type",
-    "data_type": "STRING"
-  }, {
-    "column_name": "description",
-    "data_type": "STRING"
-  }, {
-    "column_name": "food_category_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "publication_date",
-    "data_type": "DATE"
-  }]
-}, {
-  "table_name": "foundation_food",
-  "fields": [{
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "NDB_number",
-    "data_type": "INT64"
-  }, {
-    "column_name": "footnote",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "market_acquisition",
-  "fields": [{
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "brand_description",
-    "data_type": "STRING"
-  }, {
-    "column_name": "expiration_date",
-    "data_type": "DATE"
-  }, {
-    "column_name": "label_weight",
-    "data_type": "STRING"
-  }, {
-    "column_name": "location",
-    "data_type": "STRING"
-  }, {
-    "column_name": "acquisition_date",
-    "data_type": "DATE"
-  }, {
-    "column_name": "sales_type",
-    "data_type": "STRING"
-  }, {
-    "column_name": "sample_lot_nbr",
-    "data_type": "STRING"
-  }, {
-    "column_name": "sell_by_date",
-    "data_type": "DATE"
-  }, {
-    "column_name": "store_city",
-    "data_type": "STRING"
-  }, {
-    "column_name": "store_name",
-    "data_type": "STRING"
-  }, {
-    "column_name": "store_state",
-    "data_type": "STRING"
-  }, {
-    "column_name": "upc_code",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "food_protein_conversion_factor",
-  "fields": [{
-    "column_name": "food_nutrient_conversion_factor_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "value",
-    "data_type": "FLOAT64"
-  }]
-}, {
-  "table_name": "lab_method_code",
-  "fields": [{
-    "column_name": "lab_method_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "code",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "food_nutrient_conversion_factor",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }]
-}, {
-  "table_name": "food_calorie_conversion_factor",
-  "fields": [{
-    "column_name": "food_nutrient_conversion_factor_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "protein_value",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "fat_value",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "carbohydrate_value",
-    "data_type": "FLOAT64"
-  }]
-}, {
-  "table_name": "food_portion",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "seq_num",
-    "data_type": "INT64"
-  }, {
-    "column_name": "amount",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "measure_unit_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "portion_description",
-    "data_type": "STRING"
-  }, {
-    "column_name": "modifier",
-    "data_type": "STRING"
-  }, {
-    "column_name": "gram_weight",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "data_points",
-    "data_type": "INT64"
-  }, {
-    "column_name": "footnote",
-    "data_type": "STRING"
-  }, {
-    "column_name": "min_year_acquired",
-    "data_type": "INT64"
-  }]
-}, {
-  "table_name": "sample_food",
-  "fields": [{
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }]
-}, {
-  "table_name": "lab_method",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "description",
-    "data_type": "STRING"
-  }, {
-    "column_name": "technique",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "nutrient",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "name",
-    "data_type": "STRING"
-  }, {
-    "column_name": "unit_name",
-    "data_type": "STRING"
-  }, {
-    "column_name": "nutrient_nbr",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "rank",
-    "data_type": "FLOAT64"
-  }]
-}, {
-  "table_name": "food_nutrient",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "nutrient_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "amount",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "data_points",
-    "data_type": "INT64"
-  }, {
-    "column_name": "derivation_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "min",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "max",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "median",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "footnote",
-    "data_type": "STRING"
-  }, {
-    "column_name": "min_year_acquired",
-    "data_type": "INT64"
-  }]
-}, {
-  "table_name": "measure_unit",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "name",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "acquisition_samples",
-  "fields": [{
-    "column_name": "fdc_id_of_sample_food",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id_of_acquisition_food",
-    "data_type": "INT64"
-  }]
-}, {
-  "table_name": "agricultural_samples",
-  "fields": [{
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "acquisition_date",
-    "data_type": "DATE"
-  }, {
-    "column_name": "market_class",
-    "data_type": "STRING"
-  }, {
-    "column_name": "treatment",
-    "data_type": "STRING"
-  }, {
-    "column_name": "state",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "sub_sample_result",
-  "fields": [{
-    "column_name": "food_nutrient_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "adjusted_amount",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "lab_method_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "nutrient_name",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "food_attribute_type",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "name",
-    "data_type": "STRING"
-  }, {
-    "column_name": "description",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "food_category",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "code",
-    "data_type": "INT64"
-  }, {
-    "column_name": "description",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "food_attribute",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "seq_num",
-    "data_type": "INT64"
-  }, {
-    "column_name": "food_attribute_type_id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "name",
-    "data_type": "STRING"
-  }, {
-    "column_name": "value",
-    "data_type": "STRING"
-  }]
-}, {
-  "table_name": "food_component",
-  "fields": [{
-    "column_name": "id",
-    "data_type": "INT64"
-  }, {
-    "column_name": "fdc_id",
-    "data_type": "STRING"
-  }, {
-    "column_name": "name",
-    "data_type": "STRING"
-  }, {
-    "column_name": "pct_weight",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "is_refuse",
-    "data_type": "BOOL"
-  }, {
-    "column_name": "gram_weight",
-    "data_type": "FLOAT64"
-  }, {
-    "column_name": "data_points",
-    "data_type": "INT64"
-  }, {
-    "column_name": "min_year_acqured",
-    "data_type": "INT64"
-  }]
-}]
-"""
\ No newline at end of file
+# Rendered from the typed table definitions in app/ingest/schema.py, which are
+# also used to load the tables. Edit the schema there, not here.
+from .ingest.schema import render_db_schema
+
+DB_SCHEMA = render_db_schema()
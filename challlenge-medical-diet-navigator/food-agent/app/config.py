@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     """Application configuration."""
@@ -11,9 +12,151 @@ class Config:
     # Need to create a bucket in your project. (It must be public)
     # Image generation will write images to this bucket.
     IMAGE_BUCKET = os.getenv("IMAGE_BUCKET", "food-agent-generated-images-dar")
+
+    # Allergen index snapshot (local path or gs:// URI). `python -m app.ingest`
+    # writes it after every import or refresh; agents only load it.
+    ALLERGEN_INDEX_PATH = os.getenv(
+        "ALLERGEN_INDEX_PATH",
+        f"gs://{GOOGLE_CLOUD_PROJECT}-agent-engine/allergen-index/{DATASET_NAME}.bin",
+    )
+
+    # Local SQLite file shared by all workers on a host for cached results.
+    CACHE_DB_PATH = os.getenv(
+        "CACHE_DB_PATH", os.path.join(tempfile.gettempdir(), "food-agent-cache.sqlite3")
+    )
+
+    # Grounded Google Search answers of the allergen agent are reused for this long.
+    SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", CACHE_DB_PATH)
+    SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(24 * 3600)))
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+    # Local intent router in front of main_agent. Messages it is not confident
+    # about still go through main_agent. The classifier is optional and is
+    # trained from the transfer log with `python -m app.router`.
+    INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+    ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.8"))
+    ROUTER_MODEL_PATH = os.getenv("ROUTER_MODEL_PATH", "")
+    ROUTER_TRANSFER_LOG = os.getenv("ROUTER_TRANSFER_LOG", "")
+
+    # Planner mode runs the BigQuery and allergen lookups of compound questions
+    # ("high-protein snacks safe for a sesame allergy") in parallel.
+    PLANNER_MODE_ENABLED = os.getenv("PLANNER_MODE_ENABLED", "true").lower() == "true"
+
+    # SQL cost governor for the BigQuery agent: row cap added to every query,
+    # and (when dry runs are on) the most bytes a single query may scan.
+    SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "200"))
+    SQL_DRY_RUN = os.getenv("SQL_DRY_RUN", "true").lower() == "true"
+    SQL_MAX_BYTES_SCANNED = int(os.getenv("SQL_MAX_BYTES_SCANNED", str(500 * 1024**2)))
                                
     
 
 
 
 
+
+    # FoodData Central release imported by `python -m app.ingest`.
+    USDA_DOWNLOAD_URL = os.getenv(
+        "USDA_DOWNLOAD_URL",
+        "https://fdc.nal.usda.gov/fdc-datasets/FoodData_Central_foundation_food_csv_2025-04-24.zip",
+    )
+    INGEST_WORK_DIR = os.getenv(
+        "INGEST_WORK_DIR", os.path.join(tempfile.gettempdir(), "food-agent-ingest")
+    )
+
+    # Model cascade: each agent answers with the first (cheapest) tier and only
+    # escalates on low confidence, a tool error or an invalid response. Tiers
+    # are "model[:max_output_tokens[:thinking_budget]]", comma separated and
+    # cheapest first; override per agent with e.g. MAIN_AGENT_MODEL_TIERS.
+    # Off by default, and only for the listed agents when on: low confidence
+    # is judged by hedging alone, so medical and allergy answers (main,
+    # allergy research and planner merge agents) stay on MODEL.
+    MODEL_CASCADE_ENABLED = os.getenv("MODEL_CASCADE_ENABLED", "false").lower() == "true"
+    MODEL_CASCADE_AGENTS = tuple(
+        a.strip()
+        for a in os.getenv(
+            "MODEL_CASCADE_AGENTS", "imagen_tool_agent,usda_food_information_bigquery_agent"
+        ).split(",")
+        if a.strip()
+    )
+    MODEL_TIERS = os.getenv("MODEL_TIERS", f"gemini-2.5-flash-lite:8192:0,{MODEL}:32768")
+
+    # Generated images are reused for repeat prompts (same normalized prompt
+    # and generation options) until they expire or are evicted. Keep the TTL
+    # below any lifecycle rule that deletes objects from IMAGE_BUCKET.
+    IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+    IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH", CACHE_DB_PATH)
+    IMAGE_CACHE_TTL_SECONDS = int(os.getenv("IMAGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "2000"))
+
+    # Concurrent GCS uploads of generated images, shared by all requests.
+    IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "4"))
+
+    # Generated images are also published as WebP (and AVIF when Pillow
+    # supports it) at these widths; the chat UI picks one via srcset.
+    IMAGE_VARIANTS_ENABLED = os.getenv("IMAGE_VARIANTS_ENABLED", "true").lower() == "true"
+    IMAGE_AVIF_ENABLED = os.getenv("IMAGE_AVIF_ENABLED", "true").lower() == "true"
+    IMAGE_VARIANT_WIDTHS = tuple(
+        int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,1024").split(",") if w.strip()
+    )
+    IMAGE_DISPLAY_MAX_CSS_PX = int(os.getenv("IMAGE_DISPLAY_MAX_CSS_PX", "640"))
+
+    # Image requests run as background jobs: the agent replies at once with a
+    # placeholder and the web app polls the job's status object in
+    # IMAGE_BUCKET. At most IMAGE_JOB_CONCURRENCY jobs generate at a time.
+    IMAGE_JOBS_ENABLED = os.getenv("IMAGE_JOBS_ENABLED", "true").lower() == "true"
+    IMAGE_JOB_CONCURRENCY = int(os.getenv("IMAGE_JOB_CONCURRENCY", "2"))
+    IMAGE_JOB_MAX_PENDING = int(os.getenv("IMAGE_JOB_MAX_PENDING", "16"))
+    IMAGE_JOB_TIMEOUT_SECONDS = int(os.getenv("IMAGE_JOB_TIMEOUT_SECONDS", "180"))
+    IMAGE_JOB_PREFIX = os.getenv("IMAGE_JOB_PREFIX", "image-jobs")
+
+    # Tail-based trace sampling: a trace is buffered until its root span ends
+    # and is always exported when it errored, took TRACE_SLOW_MS or longer,
+    # or ran one of TRACE_KEEP_TOOLS; other traces at TRACE_SAMPLE_RATE.
+    TRACE_SAMPLING_ENABLED = os.getenv("TRACE_SAMPLING_ENABLED", "true").lower() == "true"
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+    TRACE_KEEP_TOOLS = tuple(
+        t.strip()
+        for t in os.getenv(
+            "TRACE_KEEP_TOOLS",
+            "execute_sql,get_table_info,list_table_ids,get_dataset_info,list_dataset_ids,"
+            "generate_image_tool,start_image_job",
+        ).split(",")
+        if t.strip()
+    )
+    TRACE_MAX_BUFFERED = int(os.getenv("TRACE_MAX_BUFFERED", "2000"))
+    TRACE_BUFFER_TIMEOUT_SECONDS = float(os.getenv("TRACE_BUFFER_TIMEOUT_SECONDS", "120"))
+
+    # Feedback is written to Cloud Logging in batches of FEEDBACK_BATCH_SIZE,
+    # at least every FEEDBACK_FLUSH_INTERVAL_SECONDS and at shutdown.
+    FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "50"))
+    FEEDBACK_FLUSH_INTERVAL_SECONDS = float(os.getenv("FEEDBACK_FLUSH_INTERVAL_SECONDS", "5"))
+
+    # Conversation context: each agent sees its last CONTEXT_KEEP_TURNS turns
+    # verbatim; older turns are replaced by a rolling summary (at most
+    # CONTEXT_SUMMARY_CHARS) with the allergies, conditions and foods
+    # mentioned. Tool results over CONTEXT_MAX_TOOL_CHARS in earlier turns
+    # are cut down.
+    CONTEXT_MANAGER_ENABLED = os.getenv("CONTEXT_MANAGER_ENABLED", "true").lower() == "true"
+    CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+    CONTEXT_SUMMARY_CHARS = int(os.getenv("CONTEXT_SUMMARY_CHARS", "3000"))
+    CONTEXT_MAX_TOOL_CHARS = int(os.getenv("CONTEXT_MAX_TOOL_CHARS", "2000"))
+    CONTEXT_MAX_FOODS = int(os.getenv("CONTEXT_MAX_FOODS", "20"))
+
+    # Agent Engine artifacts are cached in memory and on local disk in front
+    # of GCS. Saves of a session file this worker already wrote return once
+    # cached and are written to GCS in the background; other saves write
+    # through. A file's version list is re-read after
+    # ARTIFACT_VERSIONS_TTL_SECONDS to see other replicas' writes.
+    ARTIFACT_CACHE_ENABLED = os.getenv("ARTIFACT_CACHE_ENABLED", "true").lower() == "true"
+    ARTIFACT_CACHE_DIR = os.getenv(
+        "ARTIFACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "food-agent-artifacts")
+    )
+    ARTIFACT_CACHE_MEMORY_BYTES = int(os.getenv("ARTIFACT_CACHE_MEMORY_BYTES", str(64 * 1024**2)))
+    ARTIFACT_CACHE_DISK_BYTES = int(os.getenv("ARTIFACT_CACHE_DISK_BYTES", str(1024**3)))
+    ARTIFACT_CACHE_DISK_TTL_SECONDS = float(
+        os.getenv("ARTIFACT_CACHE_DISK_TTL_SECONDS", str(24 * 3600))
+    )
+    ARTIFACT_VERSIONS_TTL_SECONDS = float(os.getenv("ARTIFACT_VERSIONS_TTL_SECONDS", "30"))
+    ARTIFACT_UPLOAD_WORKERS = int(os.getenv("ARTIFACT_UPLOAD_WORKERS", "4"))
+    ARTIFACT_UPLOAD_MAX_PENDING = int(os.getenv("ARTIFACT_UPLOAD_MAX_PENDING", "256"))
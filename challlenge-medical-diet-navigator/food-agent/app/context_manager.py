@@ -0,0 +1,453 @@
+"""
+Bounded conversation context for the LLM agents.
+
+Sessions keep every turn, including large BigQuery results, and ADK sends
+all of it to the model on every call, so prompts grow with the chat. The
+`before_model_callback` here keeps an agent's input roughly flat:
+
+- the last `Config.CONTEXT_KEEP_TURNS` turns are sent verbatim;
+- older turns are replaced by one rolling summary message: a line per turn
+  (what was asked, what was answered) plus the allergies, conditions and
+  foods mentioned, capped at `Config.CONTEXT_SUMMARY_CHARS`;
+- tool results and relayed agent output longer than
+  `Config.CONTEXT_MAX_TOOL_CHARS` in earlier kept turns are cut down. The
+  current turn is never changed.
+
+The summary is extractive, so compaction costs no model call. It is kept in
+session state per agent and only turns that have newly left the window are
+summarized on each call.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from typing import Any
+
+from google.genai import types
+
+from .allergen_index import MATCHER, allergen_names
+from .config import Config
+
+STATE_KEY_PREFIX = "context_summary:"
+SUMMARY_HEADER = (
+    "Summary of earlier turns in this conversation (later turns follow verbatim):"
+)
+
+# Words that state an allergy or intolerance. The allergen is named right
+# before a noun or adjective ("a peanut allergy", "lactose intolerant") or
+# after the cue ("allergic to peanuts", "I avoid eggs").
+_ALLERGY_CUE = re.compile(
+    r"\b(?:allerg|intoleran|sensitiv)\w*|\bavoid\w*|\b(?:can'?t|cannot) (?:eat|have)",
+    re.IGNORECASE,
+)
+_NOUN_CUE = re.compile(r"allerg|intoleran|sensitiv", re.IGNORECASE)
+_PREPOSITION = re.compile(r"^\s*(?:to|towards|of)\b", re.IGNORECASE)
+# A cue's clause starts after punctuation or a conjunction; what came before
+# it in the clause decides whether the cue is negated or asked about.
+_CLAUSE_BREAK = re.compile(
+    r"[,;:]|\b(?:and|but|so|if|since|because|though|although|while|whereas)\b",
+    re.IGNORECASE,
+)
+_NEGATION = re.compile(
+    r"\b(?:no|not|never|without|dont|doesnt|isnt|arent|wasnt)\b|n['\u2019]t\b",
+    re.IGNORECASE,
+)
+_QUESTION = re.compile(
+    r"^\s*(?:should|can|could|do|does|did|is|are|am|was|will|would|may|might|must"
+    r"|what|which|how|why|when|where|who)\b",
+    re.IGNORECASE,
+)
+# The foods a cue applies to end at the next verb, pronoun or clause word.
+_OBJECT_END = re.compile(
+    r"[.;:?!]|\b(?:is|are|was|were|am|be|can|could|should|would|will|do|does|did"
+    r"|may|might|must|what|which|how|why|when|where|who|that|but|so|because|since"
+    r"|if|for|in|like|please|i|i'm|im|he|she|they|we|you|it|my|his|her|their|our)\b",
+    re.IGNORECASE,
+)
+_CONDITIONS = {
+    "type 1 diabetes": r"type 1 diabet|\bt1d\b",
+    "type 2 diabetes": r"type 2 diabet|\bt2d\b",
+    "diabetes": r"diabet",
+    "prediabetes": r"pre-?diabet",
+    "hypertension": r"hypertension|high blood pressure",
+    "high cholesterol": r"cholesterol",
+    "celiac disease": r"c[o]?eliac",
+    "kidney disease": r"kidney disease|\bckd\b|renal",
+    "heart disease": r"heart disease|cardiovascular",
+    "gout": r"\bgout\b",
+    "irritable bowel syndrome": r"\bibs\b|irritable bowel",
+    "pregnancy": r"pregnan",
+    "anemia": r"ana?emi",
+}
+_CONDITION_PATTERNS = {
+    name: re.compile(p, re.IGNORECASE) for name, p in _CONDITIONS.items()
+}
+# `description` fields of USDA rows, in JSON and in Python reprs of tool results.
+_DESCRIPTION = re.compile(r"""["']description["']:\s*["']([^"']{2,120})["']""")
+_SENTENCE = re.compile(r"(?<=[.!?\n])\s+")
+_FOREIGN_CONTEXT = "For context:"
+_SAID = re.compile(r"^\[[^\]]+\] said: ", re.DOTALL)
+
+
+class ContextStats:
+    """Model input sizes before and after compaction, in characters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.compacted = 0
+        self.turns_summarized = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def record(
+        self, *, compacted: bool, summarized: int, chars_in: int, chars_out: int
+    ) -> None:
+        with self._lock:
+            self.calls += 1
+            self.compacted += int(compacted)
+            self.turns_summarized += summarized
+            self.chars_in += chars_in
+            self.chars_out += chars_out
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "compacted": self.compacted,
+                "turns_summarized": self.turns_summarized,
+                "chars_in": self.chars_in,
+                "chars_out": self.chars_out,
+                "reduction": round(1 - self.chars_out / self.chars_in, 3)
+                if self.chars_in
+                else 0.0,
+            }
+
+
+STATS = ContextStats()
+
+
+def _is_turn_start(content: types.Content) -> bool:
+    """A message from the user, not a tool result or another agent's relayed output."""
+    if content.role != "user" or not content.parts:
+        return False
+    if content.parts[0].text == _FOREIGN_CONTEXT:
+        return False
+    return not any(part.function_response for part in content.parts)
+
+
+def split_turns(contents: list[types.Content]) -> list[list[types.Content]]:
+    """
+    Group contents into turns, each starting at a user message. Contents
+    before the first user message form a turn of their own.
+    """
+    turns: list[list[types.Content]] = []
+    for content in contents:
+        if not turns or _is_turn_start(content):
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _part_chars(part: types.Part) -> int:
+    if part.text:
+        return len(part.text)
+    if part.function_call:
+        return len(json.dumps(part.function_call.args or {}, default=str))
+    if part.function_response:
+        return len(json.dumps(part.function_response.response or {}, default=str))
+    return 0
+
+
+def content_chars(contents: list[types.Content]) -> int:
+    """Approximate prompt size of `contents`; inline data is not counted."""
+    return sum(_part_chars(p) for c in contents for p in c.parts or [])
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def _user_text(turn: list[types.Content]) -> str:
+    if not turn or not _is_turn_start(turn[0]):
+        return ""
+    return " ".join(p.text for p in turn[0].parts or [] if p.text)
+
+
+def _answer_text(turn: list[types.Content]) -> str:
+    """The last text any agent replied with in `turn`."""
+    for content in reversed(turn[1:]):
+        for part in reversed(content.parts or []):
+            if not part.text or part.thought or part.text == _FOREIGN_CONTEXT:
+                continue
+            if content.role == "model":
+                return part.text
+            if _SAID.match(part.text):
+                return _SAID.sub("", part.text)
+    return ""
+
+
+def _tool_names(turn: list[types.Content]) -> list[str]:
+    names: list[str] = []
+    for content in turn:
+        for part in content.parts or []:
+            call = part.function_call
+            if call and call.name and call.name not in names:
+                names.append(call.name)
+    return names
+
+
+def _tool_text(turn: list[types.Content]) -> str:
+    chunks = []
+    for content in turn[1:]:
+        for part in content.parts or []:
+            if part.function_response:
+                chunks.append(
+                    json.dumps(part.function_response.response or {}, default=str)
+                )
+            elif part.text and content.role == "user":
+                chunks.append(part.text)
+    return "\n".join(chunks)
+
+
+def _clause_before(sentence: str, start: int) -> str:
+    """The part of `sentence`'s clause that comes before position `start`."""
+    breaks = [m.end() for m in _CLAUSE_BREAK.finditer(sentence, 0, start)]
+    return sentence[breaks[-1] if breaks else 0 : start]
+
+
+def _stated_allergies(sentence: str) -> tuple[int, int]:
+    """Allergens `sentence` states, and those it rules out, as allergen masks."""
+    stated = ruled_out = 0
+    for cue in _ALLERGY_CUE.finditer(sentence):
+        before = _clause_before(sentence, cue.start())
+        if _QUESTION.match(before):
+            continue  # "Should I avoid eggs?" asks, it does not state.
+        after = sentence[cue.end() :]
+        allergens = 0
+        noun = _NOUN_CUE.match(cue.group())
+        if noun:
+            allergens = MATCHER.scan(" ".join(before.split()[-3:]))
+        if not noun or _PREPOSITION.match(after):
+            end = _OBJECT_END.search(after)
+            allergens |= MATCHER.scan(after[: end.start() if end else None])
+        if _NEGATION.search(before):
+            ruled_out |= allergens
+        else:
+            stated |= allergens
+    return stated, ruled_out
+
+
+def _stated_conditions(sentence: str) -> tuple[list[str], list[str]]:
+    stated: list[str] = []
+    ruled_out: list[str] = []
+    for name, pattern in _CONDITION_PATTERNS.items():
+        if match := pattern.search(sentence):
+            negated = _NEGATION.search(_clause_before(sentence, match.start()))
+            (ruled_out if negated else stated).append(name)
+    return stated, ruled_out
+
+
+def extract_facts(user_text: str, tool_text: str = "") -> dict[str, list[str]]:
+    """
+    Allergies and conditions the user states or rules out ("no milk
+    allergy"), and foods the tools returned. Only the foods an allergy cue
+    applies to count, so "I am allergic to peanuts, is almond butter ok?"
+    records peanuts and not tree nuts.
+    """
+    allergies = no_allergies = 0
+    conditions: dict[str, None] = {}
+    no_conditions: dict[str, None] = {}
+    for sentence in _SENTENCE.split(user_text):
+        stated, ruled_out = _stated_allergies(sentence)
+        allergies |= stated
+        no_allergies |= ruled_out & ~stated
+        stated_conditions, ruled_out_conditions = _stated_conditions(sentence)
+        conditions.update(dict.fromkeys(stated_conditions))
+        no_conditions.update(dict.fromkeys(ruled_out_conditions))
+    if "diabetes" in conditions and sum("diabetes" in c for c in conditions) > 1:
+        del conditions["diabetes"]  # a more specific kind was named
+    foods = list(dict.fromkeys(m.strip() for m in _DESCRIPTION.findall(tool_text)))
+    return {
+        "allergies": allergen_names(allergies),
+        "conditions": list(conditions),
+        "foods": foods,
+        "ruled_out_allergies": allergen_names(no_allergies),
+        "ruled_out_conditions": [c for c in no_conditions if c not in conditions],
+    }
+
+
+def summarize_turn(turn: list[types.Content]) -> str:
+    """One summary line for a turn."""
+    line = f"- User: {_clip(_user_text(turn), 200)}"
+    if tools := _tool_names(turn):
+        line += f" | Tools: {', '.join(tools)}"
+    if answer := _answer_text(turn):
+        line += f" | Answer: {_clip(answer, 280)}"
+    return line
+
+
+def _merge(summary: dict[str, Any], turn: list[types.Content]) -> None:
+    summary["lines"].append(summarize_turn(turn))
+    facts = extract_facts(_user_text(turn), _tool_text(turn))
+    for key in ("allergies", "conditions"):
+        # A later turn that rules a fact out ("no milk allergy after all")
+        # removes it; a fact is only kept while nothing newer contradicts it.
+        known = set(summary["facts"][key]) - set(facts[f"ruled_out_{key}"])
+        summary["facts"][key] = sorted(known | set(facts[key]))
+    foods = [f for f in summary["facts"]["foods"] if f not in facts["foods"]] + facts[
+        "foods"
+    ]
+    summary["facts"]["foods"] = foods[-Config.CONTEXT_MAX_FOODS :]
+    # Rolling: the oldest lines go first once the summary is over budget.
+    while len(summary["lines"]) > 1 and sum(len(x) + 1 for x in summary["lines"]) > (
+        Config.CONTEXT_SUMMARY_CHARS
+    ):
+        summary["lines"].pop(0)
+        summary["dropped"] += 1
+
+
+def update_summary(
+    summary: dict[str, Any] | None, old_turns: list[list[types.Content]]
+) -> tuple[dict[str, Any], int]:
+    """
+    Extend `summary` (from session state) with the turns in `old_turns` it
+    has not seen yet. Returns the summary and how many turns were added.
+    """
+    fresh = {
+        "turns": 0,
+        "last_user": "",
+        "lines": [],
+        "dropped": 0,
+        "facts": {"allergies": [], "conditions": [], "foods": []},
+    }
+    if summary:
+        seen = summary.get("turns", 0)
+        # Reuse only if the same turns are still there; otherwise start over.
+        if 0 < seen <= len(old_turns) and summary.get("last_user") == _clip(
+            _user_text(old_turns[seen - 1]), 80
+        ):
+            fresh = json.loads(json.dumps(summary))
+    added = old_turns[fresh["turns"] :]
+    for turn in added:
+        _merge(fresh, turn)
+    if added:
+        fresh["turns"] = len(old_turns)
+        fresh["last_user"] = _clip(_user_text(old_turns[-1]), 80)
+    return fresh, len(added)
+
+
+def render_summary(summary: dict[str, Any]) -> str:
+    lines = [SUMMARY_HEADER]
+    labels = {
+        "allergies": "Allergies mentioned",
+        "conditions": "Health conditions mentioned",
+        "foods": "Foods discussed",
+    }
+    for key, label in labels.items():
+        if values := summary["facts"].get(key):
+            lines.append(f"{label}: {'; '.join(values)}")
+    lines.append("Earlier turns:")
+    if summary.get("dropped"):
+        lines.append(f"- ({summary['dropped']} earlier turns not shown)")
+    lines.extend(summary["lines"])
+    return "\n".join(lines)
+
+
+def _shrink_response(response: dict[str, Any], limit: int) -> dict[str, Any]:
+    """A smaller stand-in for a tool result over `limit` characters."""
+    rows = response.get("rows")
+    if isinstance(rows, list):
+        shrunk = {k: v for k, v in response.items() if k != "rows"}
+        kept: list[Any] = []
+        size = len(json.dumps(shrunk, default=str))
+        for row in rows:
+            size += len(json.dumps(row, default=str)) + 2
+            if size > limit and kept:
+                break
+            kept.append(row)
+        shrunk["rows"] = kept
+        shrunk["rows_omitted"] = len(rows) - len(kept)
+        return shrunk
+    text = json.dumps(response, default=str)
+    return {"truncated_result": text[:limit], "chars_omitted": len(text) - limit}
+
+
+def truncate_tool_outputs(turns: list[list[types.Content]], limit: int) -> None:
+    """Cut down long tool results and relayed agent output in `turns`, in place."""
+    for turn in turns:
+        for content in turn:
+            parts = content.parts or []
+            for part in parts:
+                response = part.function_response
+                if response and response.response:
+                    if len(json.dumps(response.response, default=str)) > limit:
+                        response.response = _shrink_response(response.response, limit)
+                elif (
+                    content.role == "user"
+                    and part.text
+                    and len(part.text) > limit
+                    and parts[0].text == _FOREIGN_CONTEXT
+                ):
+                    omitted = len(part.text) - limit
+                    part.text = f"{part.text[:limit]}… [{omitted} characters omitted]"
+
+
+def compact_context(callback_context: Any, llm_request: Any) -> None:
+    """
+    `before_model_callback` bounding what the agent sends to the model.
+
+    Rewrites `llm_request.contents` and never answers in the model's place.
+    """
+    if not Config.CONTEXT_MANAGER_ENABLED or not llm_request.contents:
+        return None
+    limit = Config.CONTEXT_MAX_TOOL_CHARS
+    keep = max(1, Config.CONTEXT_KEEP_TURNS)
+    chars_in = content_chars(llm_request.contents)
+    turns = split_turns(llm_request.contents)
+    old, recent = turns[:-keep], turns[-keep:]
+    truncate_tool_outputs(recent[:-1], limit)
+
+    summarized = 0
+    contents = [c for turn in recent for c in turn]
+    if old:
+        key = STATE_KEY_PREFIX + callback_context.agent_name
+        summary, summarized = update_summary(callback_context.state.get(key), old)
+        if summarized:
+            callback_context.state[key] = summary
+        note = types.Content(
+            role="user", parts=[types.Part(text=render_summary(summary))]
+        )
+        contents.insert(0, note)
+    llm_request.contents = contents
+
+    chars_out = content_chars(contents)
+    STATS.record(
+        compacted=bool(old),
+        summarized=summarized,
+        chars_in=chars_in,
+        chars_out=chars_out,
+    )
+    if old or chars_out < chars_in:
+        logging.info(
+            json.dumps(
+                {
+                    "context_manager": "compacted",
+                    "agent": callback_context.agent_name,
+                    "turns_summarized": len(old),
+                    "turns_kept": len(recent),
+                    "chars_in": chars_in,
+                    "chars_out": chars_out,
+                }
+            )
+        )
+    return None
+
+
+def context_stats() -> dict[str, Any]:
+    """Aggregate per-process context compaction statistics."""
+    return STATS.snapshot()
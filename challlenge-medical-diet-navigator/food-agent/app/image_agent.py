@@ -1,15 +1,86 @@
 from __future__ import annotations
 
-import time, uuid
-from typing import Any, Dict, List, Optional
+import asyncio
+import functools
+import html
+import io
+import json
+import logging
+import threading
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict
 
 from google import genai
 from google.genai import types
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud import storage
-from google.adk.agents import Agent
 
 from .config import Config
+from .utils.image_cache import content_address, get_image_cache, image_cache_key
+from .utils.image_jobs import JobRunner
+
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
+
 IMAGE_BUCKET = Config.IMAGE_BUCKET
+IMAGE_MODEL = "gemini-2.5-flash-image-preview"
+MAX_IMAGES_PER_CALL = 4
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+JOB_STATUS_CACHE_CONTROL = "no-store"
+
+# =========================
+# Pooled clients
+# =========================
+# Built once per process: each client holds auth state and an HTTP
+# connection pool, so per-call construction costs a handshake every time.
+# The genai client's async connections belong to the event loop that opened
+# them, so it is only used on the image job loop (`_get_job_runner`), which
+# lives as long as the process; the agent's own loops come and go.
+_genai_client: genai.Client | None = None
+_storage_client: storage.Client | None = None
+_upload_pool: ThreadPoolExecutor | None = None
+_job_runner: JobRunner | None = None
+_clients_lock = threading.Lock()
+
+def _get_genai_client() -> genai.Client:
+    global _genai_client
+    with _clients_lock:
+        if _genai_client is None:
+            _genai_client = genai.Client(
+                vertexai=True, project=Config.GOOGLE_CLOUD_PROJECT, location="global"
+            )
+        return _genai_client
+
+def _get_storage_client() -> storage.Client:
+    global _storage_client
+    with _clients_lock:
+        if _storage_client is None:
+            _storage_client = storage.Client()
+        return _storage_client
+
+def _get_upload_pool() -> ThreadPoolExecutor:
+    # GCS uploads are blocking calls; a bounded pool keeps them off the event
+    # loop without letting a burst of requests open unbounded connections.
+    global _upload_pool
+    with _clients_lock:
+        if _upload_pool is None:
+            _upload_pool = ThreadPoolExecutor(
+                max_workers=Config.IMAGE_UPLOAD_WORKERS, thread_name_prefix="gcs-upload"
+            )
+        return _upload_pool
+
+def _get_job_runner() -> JobRunner:
+    global _job_runner
+    with _clients_lock:
+        if _job_runner is None:
+            _job_runner = JobRunner(
+                max_concurrent=Config.IMAGE_JOB_CONCURRENCY,
+                max_pending=Config.IMAGE_JOB_MAX_PENDING,
+                name="image-jobs",
+            )
+        return _job_runner
 
 # =========================
 # Helpers
@@ -20,6 +91,8 @@ def _ext_for_mime(mime_type: str) -> str:
         return "jpg"
     if "webp" in m:
         return "webp"
+    if "avif" in m:
+        return "avif"
     if "png" in m:
         return "png"
     if "gif" in m:
@@ -36,17 +109,21 @@ def _upload_bytes_to_gcs(
     bucket: str,
     mime_type: str = "image/png",
     prefix: str = "generated",
+    blob_name: str | None = None,
 ) -> Dict[str, str]:
-    client = storage.Client()
-    bucket_obj = client.bucket(bucket)
+    bucket_obj = _get_storage_client().bucket(bucket)
 
     ext = _ext_for_mime(mime_type)
-    blob_name = f"{prefix}/{int(time.time())}-{uuid.uuid4().hex}.{ext}"
+    # Content-addressed: identical bytes map to one object that never changes.
+    blob_name = blob_name or f"{prefix}/{content_address(data)}.{ext}"
 
     blob = bucket_obj.blob(blob_name)
-    # Optionally set cache control if you want CDN/browser caching
-    # blob.cache_control = "public, max-age=86400"
-    blob.upload_from_string(data, content_type=mime_type)
+    # Object names never get new content, so browsers and CDNs may keep them.
+    blob.cache_control = IMMUTABLE_CACHE_CONTROL
+    try:
+        blob.upload_from_string(data, content_type=mime_type, if_generation_match=0)
+    except PreconditionFailed:
+        pass  # Already stored by an earlier request.
     public_url = _public_gcs_url(bucket, blob_name)
 
     return {
@@ -57,100 +134,370 @@ def _upload_bytes_to_gcs(
         "markdown": f'![{blob_name}]({public_url} "Generated by Imagen")',
     }
 
+# =========================
+# Delivery variants
+# =========================
+def _encode_variants(data: bytes) -> list[dict[str, Any]]:
+    """
+    Display and thumbnail renditions of a generated image, smallest format
+    first. Returns [] when Pillow is missing or cannot read the image, in
+    which case only the original is served.
+    """
+    try:
+        from PIL import Image, features
+    except ImportError:
+        return []
+    try:
+        original: Image.Image = Image.open(io.BytesIO(data))
+        original.load()
+    except Exception as e:
+        logging.warning(f"Could not decode generated image for variants: {e}")
+        return []
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "A" in original.getbands() else "RGB")
+
+    formats = [("WEBP", "image/webp", {"quality": 80, "method": 4})]
+    if Config.IMAGE_AVIF_ENABLED and features.check("avif"):
+        formats.insert(0, ("AVIF", "image/avif", {"quality": 55, "speed": 8}))
+
+    variants: list[dict[str, Any]] = []
+    widths = sorted({min(w, original.width) for w in Config.IMAGE_VARIANT_WIDTHS})
+    for width in widths:
+        height = round(original.height * width / original.width)
+        resized = (
+            original
+            if width == original.width
+            else original.resize((width, height), Image.Resampling.LANCZOS)
+        )
+        for fmt, mime_type, options in formats:
+            buf = io.BytesIO()
+            resized.save(buf, format=fmt, **options)
+            variants.append(
+                {
+                    "data": buf.getvalue(),
+                    "mime_type": mime_type,
+                    "width": width,
+                    "height": height,
+                }
+            )
+    return variants
+
+def _publish_image(
+    data: bytes, bucket: str, mime_type: str = "image/png"
+) -> dict[str, Any]:
+    """
+    Upload the original plus its display/thumbnail variants and build
+    responsive markup. Runs on the upload pool.
+    """
+    info: dict[str, Any] = dict(
+        _upload_bytes_to_gcs(data, bucket=bucket, mime_type=mime_type)
+    )
+    variants = _encode_variants(data) if Config.IMAGE_VARIANTS_ENABLED else []
+    if not variants:
+        return info
+
+    stem = info["filename"].rsplit(".", 1)[0]
+    published = []
+    for v in variants:
+        uploaded = _upload_bytes_to_gcs(
+            v["data"],
+            bucket=bucket,
+            mime_type=v["mime_type"],
+            blob_name=f"{stem}-{v['width']}w.{_ext_for_mime(v['mime_type'])}",
+        )
+        published.append(
+            {
+                "public_url": uploaded["public_url"],
+                "mime_type": v["mime_type"],
+                "width": v["width"],
+                "height": v["height"],
+                "bytes": len(v["data"]),
+            }
+        )
+    info["variants"] = published
+    info["bytes"] = len(data)
+
+    sources = []
+    by_type: dict[str, list[dict[str, Any]]] = {}
+    for v in published:
+        by_type.setdefault(v["mime_type"], []).append(v)
+    max_px = Config.IMAGE_DISPLAY_MAX_CSS_PX
+    sizes = f"(max-width: {max_px}px) 100vw, {max_px}px"
+    for mime, items in by_type.items():
+        srcset = ", ".join(f"{v['public_url']} {v['width']}w" for v in items)
+        sources.append(f'<source type="{mime}" srcset="{srcset}" sizes="{sizes}">')
+    fallback = by_type["image/webp"][-1]
+    alt = html.escape(info["filename"], quote=True)
+    info["srcset"] = ", ".join(
+        f"{v['public_url']} {v['width']}w" for v in by_type["image/webp"]
+    )
+    info["html"] = (
+        f'<a href="{info["public_url"]}"><picture>{"".join(sources)}'
+        f'<img src="{fallback["public_url"]}" alt="{alt}" width="{fallback["width"]}" '
+        f'height="{fallback["height"]}" loading="lazy" decoding="async"></picture></a>'
+    )
+    # Plain markdown shows the WebP display version and links to the original.
+    image_md = f'![{info["filename"]}]({fallback["public_url"]} "Generated by Imagen")'
+    info["markdown"] = f"[{image_md}]({info['public_url']})"
+    return info
+
+def _image_config(return_text: bool) -> types.GenerateContentConfig:
+    # Keep tokens lean: default to IMAGE-only; include TEXT only if requested
+    response_modalities = ["IMAGE"] + (["TEXT"] if return_text else [])
+    return types.GenerateContentConfig(
+        temperature=1.0,
+        top_p=0.95,
+        max_output_tokens=4096,
+        response_modalities=response_modalities,
+        safety_settings=[
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
+            types.SafetySetting(
+                category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"
+            ),
+            types.SafetySetting(
+                category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"
+            ),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
+        ],
+    )
+
+def _cache_key(
+    prompt: str, bucket: str, n: int, cfg: types.GenerateContentConfig
+) -> str | None:
+    return image_cache_key(
+        prompt,
+        IMAGE_MODEL,
+        {
+            "config": cfg.model_dump(mode="json", exclude_none=True),
+            "n": n,
+            "bucket": bucket,
+            "variants": list(Config.IMAGE_VARIANT_WIDTHS)
+            if Config.IMAGE_VARIANTS_ENABLED
+            else [],
+        },
+    )
+
 # =========================
 # Tool
 # =========================
-def generate_image_tool(
+async def generate_image_tool(
     prompt: str,
     *,
     bucket: str = IMAGE_BUCKET,
     n: int = 1,
     return_text: bool = False,
+    fresh: bool = False,
 ) -> Dict[str, Any]:
     """
     Generate image(s) with Gemini 2.5 Flash Image (preview),
     upload to a (public) GCS bucket, and return lightweight URLs.
 
+    Repeat prompts return the images generated before. Set fresh=True only
+    when the user asks for a new or different version of an image.
+
     Returns:
         {
           "status": "success",
           "images": [
-            {"public_url": "...", "gcs_uri": "...", "mime_type": "...", "filename": "..."}
+            {"public_url": "...", "gcs_uri": "...", "mime_type": "...", "filename": "...",
+             "markdown": "...", "html": "<picture> with AVIF/WebP srcset",
+             "variants": [{"public_url": "...", "mime_type": "...", "width": ..., "bytes": ...}]}
           ],
           "text": "optional textual output (if return_text=True)"
         }
     """
-    client = genai.Client(vertexai=True, api_key=None)
-    client = genai.Client(vertexai=True, 
-                          project=Config.GOOGLE_CLOUD_PROJECT, 
-                          location="global")
-
+    n = max(1, min(n, MAX_IMAGES_PER_CALL))
+    cfg = _image_config(return_text)
+    cache_key = _cache_key(prompt, bucket, n, cfg)
+    if Config.IMAGE_CACHE_ENABLED and cache_key and not fresh:
+        cached = get_image_cache().get(cache_key)
+        if cached is not None:
+            logging.info("Image cache hit")
+            return {**cached, "cache": "hit"}
 
+    future = _get_job_runner().submit(
+        lambda: _generate_images(prompt, bucket, n, return_text, cfg, cache_key)
+    )
+    if future is None:
+        return {
+            "status": "error",
+            "error_message": "Too many images are being generated right now; try again shortly.",
+        }
+    return await asyncio.wrap_future(future)
 
+async def _generate_images(
+    prompt: str,
+    bucket: str,
+    n: int,
+    return_text: bool,
+    cfg: types.GenerateContentConfig,
+    cache_key: str | None,
+) -> dict[str, Any]:
+    """Generates, uploads and caches `n` images; runs on the image job loop."""
     contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
-    # Keep tokens lean: default to IMAGE-only; include TEXT only if requested
-    response_modalities = ["IMAGE"] + (["TEXT"] if return_text else [])
-
-    cfg = types.GenerateContentConfig(
-        temperature=1.0,
-        top_p=0.95,
-        max_output_tokens=4096,
-        response_modalities=response_modalities,
-        safety_settings=[
-            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
-        ],
-    )
+    loop = asyncio.get_running_loop()
+    text_out: list[str] = []
 
-    try:
-        stream = client.models.generate_content_stream(
-            model="gemini-2.5-flash-image-preview",
+    async def generate_one() -> asyncio.Future | None:
+        # One stream per image, so n images generate side by side. The upload
+        # starts on the worker pool as soon as the bytes arrive.
+        stream = await _get_genai_client().aio.models.generate_content_stream(
+            model=IMAGE_MODEL,
             contents=contents,
             config=cfg,
         )
+        try:
+            async for chunk in stream:
+                cand = getattr(chunk, "candidates", [None])[0]
+                if (
+                    not cand
+                    or not cand.content
+                    or not getattr(cand.content, "parts", None)
+                ):
+                    continue
+
+                for part in cand.content.parts:
+                    # Optional text (captions/notes)
+                    if getattr(part, "text", None):
+                        text_out.append(part.text)
 
-        outputs: List[Dict[str, str]] = []
-        text_out: List[str] = []
-
-        for chunk in stream:
-            cand = getattr(chunk, "candidates", [None])[0]
-            if not cand or not cand.content or not getattr(cand.content, "parts", None):
-                continue
-
-            for part in cand.content.parts:
-                # Optional text (captions/notes)
-                if getattr(part, "text", None):
-                    text_out.append(part.text)
-
-                # Image bytes
-                inline = getattr(part, "inline_data", None)
-                if inline and getattr(inline, "data", None):
-                    info = _upload_bytes_to_gcs(
-                        inline.data,
-                        bucket=bucket,
-                        mime_type=inline.mime_type or "image/png",
-                    )
-                    outputs.append(info)
-                    if len(outputs) >= n:
-                        break
-
-            if len(outputs) >= n:
-                break
+                    # Image bytes
+                    inline = getattr(part, "inline_data", None)
+                    if inline and getattr(inline, "data", None):
+                        return loop.run_in_executor(
+                            _get_upload_pool(),
+                            functools.partial(
+                                _publish_image,
+                                inline.data,
+                                bucket=bucket,
+                                mime_type=inline.mime_type or "image/png",
+                            ),
+                        )
+            return None
+        finally:
+            # Returning at the first image leaves the stream open; close it
+            # now rather than whenever it is garbage collected.
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    try:
+        generated = await asyncio.gather(
+            *(generate_one() for _ in range(n)), return_exceptions=True
+        )
+        uploads = [u for u in generated if isinstance(u, asyncio.Future)]
+        errors = [e for e in generated if isinstance(e, BaseException)]
+        outputs: list[dict[str, str]] = list(await asyncio.gather(*uploads))
 
         if not outputs and not text_out:
+            if errors:
+                raise errors[0]
             return {"status": "error", "error_message": "No image or text returned."}
 
         result: Dict[str, Any] = {"status": "success", "images": outputs}
         if return_text and text_out:
             result["text"] = "\n".join(text_out)
+        if Config.IMAGE_CACHE_ENABLED and cache_key and len(outputs) == n:
+            # A fresh image replaces the cached one for later repeats.
+            get_image_cache().set(cache_key, result)
         return result
 
     except Exception as e:
         print("ERROR generating image:", e)
         return {"status": "error", "error_message": str(e)}
 
+# =========================
+# Background jobs
+# =========================
+def _job_placeholder(job_id: str) -> str:
+    # The web app finds this element by its data attribute and swaps in the
+    # finished image.
+    return (
+        f'<div class="image-job" data-image-job="{job_id}">Generating your image…</div>'
+    )
+
+def _write_job_status(bucket: str, job_id: str, status: dict[str, Any]) -> None:
+    blob = (
+        _get_storage_client()
+        .bucket(bucket)
+        .blob(f"{Config.IMAGE_JOB_PREFIX}/{job_id}.json")
+    )
+    blob.cache_control = JOB_STATUS_CACHE_CONTROL
+    blob.upload_from_string(json.dumps(status), content_type="application/json")
+
+async def _run_image_job(
+    job_id: str, prompt: str, bucket: str, n: int, return_text: bool
+) -> dict[str, Any]:
+    # start_image_job already looked in the cache.
+    cfg = _image_config(return_text)
+    try:
+        result = await asyncio.wait_for(
+            _generate_images(
+                prompt, bucket, n, return_text, cfg, _cache_key(prompt, bucket, n, cfg)
+            ),
+            timeout=Config.IMAGE_JOB_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        result = {"status": "error", "error_message": "Image generation timed out."}
+
+    if result.get("status") == "success" and result.get("images"):
+        status: dict[str, Any] = {
+            "job_id": job_id,
+            "status": "done",
+            "html": "\n".join(
+                img.get("html") or img.get("markdown", "") for img in result["images"]
+            ),
+            "images": result["images"],
+        }
+        if result.get("text"):
+            status["text"] = result["text"]
+    else:
+        status = {
+            "job_id": job_id,
+            "status": "error",
+            "error_message": result.get("error_message", "No image returned."),
+        }
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            _get_upload_pool(), _write_job_status, bucket, job_id, status
+        )
+    except Exception:
+        logging.exception(f"Could not write status for image job {job_id}")
+    return status
+
+def start_image_job(
+    prompt: str, n: int = 1, return_text: bool = False, fresh: bool = False
+) -> dict[str, Any]:
+    """
+    Start generating image(s) in the background and return immediately.
+
+    Repeat prompts return the images generated before. Set fresh=True only
+    when the user asks for a new or different version of an image.
+
+    Returns:
+        {"status": "pending", "job_id": "...", "html": "placeholder the web app replaces"}
+        or, for a repeat prompt, the finished result of `generate_image_tool`.
+    """
+    bucket = IMAGE_BUCKET
+    n = max(1, min(n, MAX_IMAGES_PER_CALL))
+    cache_key = _cache_key(prompt, bucket, n, _image_config(return_text))
+    if Config.IMAGE_CACHE_ENABLED and cache_key and not fresh:
+        cached = get_image_cache().get(cache_key)
+        if cached is not None:
+            logging.info("Image cache hit")
+            return {**cached, "cache": "hit"}
+
+    job_id = uuid.uuid4().hex
+    future = _get_job_runner().submit(
+        lambda: _run_image_job(job_id, prompt, bucket, n, return_text)
+    )
+    if future is None:
+        return {
+            "status": "error",
+            "error_message": "Too many images are being generated right now; try again shortly.",
+        }
+    return {"status": "pending", "job_id": job_id, "html": _job_placeholder(job_id)}
+
 # =========================
 # Agent
 # =========================
@@ -160,15 +507,48 @@ agent_generation = types.GenerateContentConfig(
     max_output_tokens=2048,
 )
 
-image_agent = Agent(
-    model="gemini-2.5-flash",   # planner/brain model
-    name="imagen_tool_agent",
-    instruction=(
+image_tool: Callable[..., Any]
+if Config.IMAGE_JOBS_ENABLED:
+    image_tool = start_image_job
+    image_instruction = (
+        "You generate images based on user prompts. "
+        "When asked for an image, call `start_image_job` with a concise visual prompt. "
+        "Pass fresh=True only when the user asks for a new or different version of an image. "
+        "If the status is pending, reply with one short sentence and the `html` placeholder exactly "
+        "as returned; the website replaces it with the image when it is ready. Do not wait or call "
+        "the tool again. If images are returned, give the user the `html` of each image "
+        "(the `markdown` when there is no `html`)."
+    )
+else:
+    image_tool = generate_image_tool
+    image_instruction = (
         "You generate images based on user prompts. "
         "When asked for an image, call `generate_image_tool` with a concise visual prompt. "
-        "Return the Markdown from the tool output to the user so it can be displayed on their website."
-    ),
-    description="Agent that creates images via a custom tool powered by Gemini 2.5 Flash Image (preview).",
-    tools=[generate_image_tool],
-    generate_content_config=agent_generation,
-)
+        "Pass fresh=True only when the user asks for a new or different version of an image. "
+        "Return the `html` from the tool output to the user so it can be displayed on their website "
+        "as a responsive image; use the `markdown` when there is no `html`."
+    )
+
+@functools.cache
+def get_image_agent() -> Agent:
+    # ADK and the model cascade load here, not when the image tools are imported.
+    from google.adk.agents import Agent
+
+    from .context_manager import compact_context
+    from .model_cascade import cascade_model
+
+    return Agent(
+        model=cascade_model("imagen_tool_agent"),  # planner/brain model
+        name="imagen_tool_agent",
+        instruction=image_instruction,
+        description="Agent that creates images via a custom tool powered by Gemini 2.5 Flash Image (preview).",
+        tools=[image_tool],
+        generate_content_config=agent_generation,
+        before_model_callback=compact_context,
+    )
+
+
+def __getattr__(name: str) -> Any:
+    if name == "image_agent":
+        return get_image_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,25 @@
+"""USDA FoodData Central ingestion into BigQuery."""
+
+from .load import load_csv, load_csv_directory, load_file
+from .pipeline import BigQueryLoader, ImportResult, LocalLoader, run_import
+from .refresh import RefreshResult, read_versions, run_refresh, stamp_version
+from .schema import TABLES, TABLES_BY_NAME, FieldSpec, TableSpec, render_db_schema
+
+__all__ = [
+    "TABLES",
+    "TABLES_BY_NAME",
+    "BigQueryLoader",
+    "FieldSpec",
+    "ImportResult",
+    "LocalLoader",
+    "RefreshResult",
+    "TableSpec",
+    "load_csv",
+    "load_csv_directory",
+    "load_file",
+    "read_versions",
+    "render_db_schema",
+    "run_import",
+    "run_refresh",
+    "stamp_version",
+]
@@ -0,0 +1,128 @@
+"""
+Import (or refresh) the FoodData Central release into BigQuery.
+
+    uv run python -m app.ingest --project my-project --dataset usda_dataset
+
+Re-running only reloads tables whose CSV changed. `--incremental` merges only
+the foods changed according to `food_update_log_entry` instead of replacing
+whole tables. `--loader local` writes the files to a directory instead, which
+is handy for trying the pipeline offline.
+
+After a BigQuery import or refresh the allergen index snapshot the agents load
+is brought up to date (`--allergen-index`, empty to skip).
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from ..allergen_index import publish_allergen_index
+from ..config import Config
+from .pipeline import BigQueryLoader, LocalLoader, TableLoader, run_import
+from .refresh import run_refresh, stamp_version
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ingest", description=__doc__)
+    parser.add_argument("--project", default=Config.GOOGLE_CLOUD_PROJECT)
+    parser.add_argument("--dataset", default=Config.DATASET_NAME)
+    parser.add_argument(
+        "--source",
+        default=Config.USDA_DOWNLOAD_URL,
+        help="Release URL or a local zip path.",
+    )
+    parser.add_argument("--work-dir", default=Config.INGEST_WORK_DIR)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--loader", choices=("bigquery", "local"), default="bigquery")
+    parser.add_argument("--local-dir", help="Target directory for --loader local.")
+    parser.add_argument(
+        "--no-parquet", action="store_true", help="Load the CSVs as they are."
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Reload tables even if unchanged."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="MERGE changed foods into the live tables instead of replacing them.",
+    )
+    parser.add_argument(
+        "--allergen-index",
+        default=Config.ALLERGEN_INDEX_PATH,
+        help="Allergen index snapshot to update (local path or gs:// URI).",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.incremental:
+        if args.loader != "bigquery" or args.force:
+            parser.error(
+                "--incremental only works with --loader bigquery and no --force"
+            )
+        refreshed = run_refresh(
+            args.source,
+            args.work_dir,
+            args.project,
+            args.dataset,
+            workers=args.workers,
+            use_parquet=not args.no_parquet,
+        )
+        print(
+            f"Merged {len(refreshed.changed_tables)} tables, "
+            f"{len(refreshed.changed_fdc_ids)} changed foods, "
+            f"dataset version {refreshed.version} in {refreshed.elapsed_s:.1f}s"
+        )
+        return _publish_allergen_index(args)
+
+    loader: TableLoader
+    if args.loader == "local":
+        if not args.local_dir:
+            parser.error("--loader local needs --local-dir")
+        loader = LocalLoader(args.local_dir)
+    else:
+        loader = BigQueryLoader(args.project, args.dataset)
+
+    result = run_import(
+        args.source,
+        args.work_dir,
+        loader,
+        workers=args.workers,
+        use_parquet=not args.no_parquet,
+        force=args.force,
+    )
+    if isinstance(loader, BigQueryLoader) and result.loaded:
+        # Whole tables were replaced: caches built from them start over.
+        stamp_version(
+            loader.client,
+            args.project,
+            args.dataset,
+            mode="full",
+            changed_tables=[summary["table"] for summary in result.loaded],
+        )
+    print(
+        f"Loaded {len(result.loaded)} tables, skipped {len(result.skipped)} unchanged, "
+        f"{len(result.failed)} failed in {result.elapsed_s:.1f}s"
+    )
+    for table_name, error in result.failed:
+        print(f"  {table_name}: {error}", file=sys.stderr)
+    if result.failed:
+        return 1
+    return _publish_allergen_index(args) if args.loader == "bigquery" else 0
+
+
+def _publish_allergen_index(args: argparse.Namespace) -> int:
+    if not args.allergen_index:
+        return 0
+    try:
+        publish_allergen_index(args.allergen_index, args.project, args.dataset)
+    except Exception as e:
+        logging.exception("Could not update the allergen index")
+        print(f"Allergen index not updated: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
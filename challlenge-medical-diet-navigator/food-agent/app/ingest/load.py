@@ -0,0 +1,183 @@
+"""Load FoodData Central CSVs into BigQuery with typed, clustered tables."""
+
+from __future__ import annotations
+
+import glob
+import logging
+import os
+from typing import Any
+
+from .schema import TABLES_BY_NAME, TableSpec
+
+# A rejected row is a missing food, nutrient or portion, so by default any
+# bad record fails the load. Callers may tolerate some; the load result then
+# reports how many rows were rejected.
+MAX_BAD_RECORDS = 0
+
+# Legacy names the API returns for standard SQL types.
+_API_TYPES = {"INTEGER": "INT64", "FLOAT": "FLOAT64", "BOOLEAN": "BOOL"}
+
+
+def find_data_dir(base_dir: str) -> str:
+    """The extracted zip nests the CSVs one folder down; find that folder."""
+    subdirs = [d for d in glob.glob(os.path.join(base_dir, "*")) if os.path.isdir(d)]
+    return subdirs[0] if subdirs else base_dir
+
+
+def ensure_dataset(
+    client: Any, project_id: str, dataset_name: str, location: str = "US"
+) -> Any:
+    """Create the dataset if it does not exist yet."""
+    from google.api_core.exceptions import NotFound
+    from google.cloud import bigquery
+
+    dataset_ref = bigquery.DatasetReference(project_id, dataset_name)
+    try:
+        return client.get_dataset(dataset_ref)
+    except NotFound:
+        dataset = bigquery.Dataset(dataset_ref)
+        dataset.location = location
+        logging.info(f"Creating dataset {project_id}.{dataset_name} in {location}")
+        return client.create_dataset(dataset)
+
+
+def load_job_config(
+    spec: TableSpec | None,
+    source_format: str = "CSV",
+    max_bad_records: int = MAX_BAD_RECORDS,
+) -> Any:
+    """
+    Load config with the table's explicit schema and clustering.
+
+    Known tables are created from their spec before the load (`_ensure_table`)
+    and loaded with WRITE_TRUNCATE_DATA, which keeps that schema. Plain
+    WRITE_TRUNCATE replaces it with the file's, and Parquet files carry no
+    REQUIRED modes.
+    """
+    from google.cloud import bigquery
+
+    config = bigquery.LoadJobConfig(
+        source_format=source_format,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+        if spec is None
+        else bigquery.WriteDisposition.WRITE_TRUNCATE_DATA,
+        max_bad_records=max_bad_records,
+    )
+    if source_format == bigquery.SourceFormat.CSV:
+        config.skip_leading_rows = 1
+        config.field_delimiter = ","
+        config.quote_character = '"'
+        config.allow_quoted_newlines = True
+        config.encoding = "UTF-8"
+    if spec is None:
+        # Not a table we know about: keep the old behaviour for it.
+        config.autodetect = source_format == bigquery.SourceFormat.CSV
+        return config
+    if source_format == bigquery.SourceFormat.CSV:
+        # Parquet files written by the pipeline already carry the column types.
+        config.schema = spec.bigquery_schema()
+    if spec.clustering:
+        config.clustering_fields = list(spec.clustering)
+    return config
+
+
+def _ensure_table(client: Any, table_id: str, spec: TableSpec | None) -> None:
+    """
+    Create the table from its spec, recreating it when the columns, their
+    modes or the clustering changed; a truncating load cannot change those.
+    """
+    from google.api_core.exceptions import NotFound
+    from google.cloud import bigquery
+
+    if spec is None:
+        return
+    wanted = spec.bigquery_schema()
+    try:
+        table = client.get_table(table_id)
+    except NotFound:
+        table = None
+    if table is not None:
+        current = [
+            (f.name, _API_TYPES.get(f.field_type, f.field_type), f.mode)
+            for f in table.schema
+        ]
+        if current == [(f.name, f.field_type, f.mode) for f in wanted] and list(
+            table.clustering_fields or []
+        ) == list(spec.clustering):
+            return
+        logging.info(f"Schema or clustering of {table_id} changed, recreating it")
+        client.delete_table(table_id)
+    table = bigquery.Table(table_id, schema=wanted)
+    if spec.clustering:
+        table.clustering_fields = list(spec.clustering)
+    client.create_table(table)
+
+
+def load_file(
+    client: Any,
+    path: str,
+    project_id: str,
+    dataset_name: str,
+    source_format: str = "CSV",
+    table_name: str | None = None,
+    max_bad_records: int = MAX_BAD_RECORDS,
+) -> dict[str, Any]:
+    """
+    Load one CSV or Parquet file into its table and wait for the job.
+
+    Fails when more than `max_bad_records` rows are rejected; tolerated
+    rejections are logged and returned as `rejected`.
+    """
+    table_name = table_name or os.path.splitext(os.path.basename(path))[0]
+    spec = TABLES_BY_NAME.get(table_name)
+    if spec is None:
+        logging.warning(f"No typed schema for {table_name}; falling back to autodetect")
+    table_id = f"{project_id}.{dataset_name}.{table_name}"
+    _ensure_table(client, table_id, spec)
+
+    job_config = load_job_config(
+        spec, source_format=source_format, max_bad_records=max_bad_records
+    )
+    with open(path, "rb") as f:
+        job = client.load_table_from_file(f, table_id, job_config=job_config)
+    job.result()
+    # job.errors lists only the first few bad records; the job statistics
+    # have the count.
+    stats = job._properties.get("statistics", {}).get("load", {})
+    rejected = int(stats.get("badRecords") or len(job.errors or []))
+    if rejected:
+        logging.warning(
+            f"{table_name}: {rejected} rows rejected, {job.output_rows} loaded, "
+            f"e.g. {(job.errors or [])[:3]}"
+        )
+    return {
+        "table": table_name,
+        "rows": job.output_rows,
+        "rejected": rejected,
+        "errors": len(job.errors or []),
+    }
+
+
+def load_csv(
+    client: Any,
+    csv_path: str,
+    project_id: str,
+    dataset_name: str,
+    max_bad_records: int = MAX_BAD_RECORDS,
+) -> dict[str, Any]:
+    """Load one CSV into the table named after the file and wait for it."""
+    return load_file(
+        client, csv_path, project_id, dataset_name, max_bad_records=max_bad_records
+    )
+
+
+def load_csv_directory(
+    client: Any, base_dir: str, project_id: str, dataset_name: str
+) -> list[dict[str, Any]]:
+    """Load every CSV in an extracted FoodData Central release."""
+    data_dir = find_data_dir(base_dir)
+    csv_paths = sorted(glob.glob(os.path.join(data_dir, "*.csv")))
+    if not csv_paths:
+        raise FileNotFoundError(f"No CSV files found in {data_dir}")
+    ensure_dataset(client, project_id, dataset_name)
+    return [load_csv(client, path, project_id, dataset_name) for path in csv_paths]
@@ -0,0 +1,329 @@
+"""
+Incremental refresh of the USDA dataset from a new FoodData Central release.
+
+Instead of truncating and reloading every table:
+1. Changed CSVs are loaded into a staging dataset (`{dataset}_staging`).
+2. `food_update_log_entry` is diffed against the current dataset, together
+   with foods added to or removed from `food`, to find the changed `fdc_id`s.
+3. Each staged table is MERGEd into its live table on its primary key. Tables
+   with an `fdc_id` column only touch the changed foods (and their clusters).
+   Other tables, and every table when the update log itself did not change,
+   are merged whole with a per-row change check.
+4. A new row in `_dataset_version` records what changed, so caches built from
+   the dataset (e.g. the allergen index) invalidate only those foods.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from .load import ensure_dataset
+from .pipeline import (
+    BigQueryLoader,
+    bigquery_destination,
+    record_tables,
+    run_import,
+)
+from .schema import INT64, TABLES_BY_NAME, VERSION_TABLE, TableSpec
+
+UPDATE_LOG_TABLE = "food_update_log_entry"
+CHANGED_IDS_PARAM = "changed_fdc_ids"
+
+
+@dataclass
+class DatasetVersion:
+    version: int
+    mode: str = "full"
+    changed_tables: list[str] = field(default_factory=list)
+    changed_fdc_ids: list[int] = field(default_factory=list)
+
+
+@dataclass
+class RefreshResult:
+    version: int | None = None
+    changed_tables: list[str] = field(default_factory=list)
+    changed_fdc_ids: list[int] = field(default_factory=list)
+    rows_affected: dict[str, int] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+
+
+def _q(column: str) -> str:
+    return f"`{column}`"
+
+
+def is_fdc_scoped(spec: TableSpec) -> bool:
+    return "fdc_id" in spec.column_names
+
+
+def _in_changed_ids(spec: TableSpec, column: str) -> str:
+    """`column IN UNNEST(@changed_fdc_ids)`, cast when fdc_id is not INT64."""
+    if next(f.type for f in spec.fields if f.name == "fdc_id") != INT64:
+        column = f"SAFE_CAST({column} AS INT64)"
+    return f"{column} IN UNNEST(@{CHANGED_IDS_PARAM})"
+
+
+def changed_fdc_ids_sql(
+    target: str, staging: str, staged_tables: set[str]
+) -> str | None:
+    """
+    SQL returning the `fdc_id`s changed between the live and staged tables:
+    new or re-dated update log entries, and foods added to or removed from
+    `food`. None when neither table was staged.
+    """
+    parts = []
+    if UPDATE_LOG_TABLE in staged_tables:
+        parts.append(
+            f"SELECT S.id AS fdc_id FROM `{staging}.{UPDATE_LOG_TABLE}` AS S\n"
+            f"LEFT JOIN `{target}.{UPDATE_LOG_TABLE}` AS T ON T.id = S.id\n"
+            "WHERE T.id IS NULL OR T.last_updated IS DISTINCT FROM S.last_updated"
+        )
+    if "food" in staged_tables:
+        parts.append(
+            f"SELECT S.fdc_id FROM `{staging}.food` AS S\n"
+            f"LEFT JOIN `{target}.food` AS T ON T.fdc_id = S.fdc_id\n"
+            "WHERE T.fdc_id IS NULL"
+        )
+        parts.append(
+            f"SELECT T.fdc_id FROM `{target}.food` AS T\n"
+            f"LEFT JOIN `{staging}.food` AS S ON S.fdc_id = T.fdc_id\n"
+            "WHERE S.fdc_id IS NULL"
+        )
+    if not parts:
+        return None
+    return "\nUNION DISTINCT\n".join(parts)
+
+
+def merge_sql(spec: TableSpec, target_id: str, staging_id: str, scoped: bool) -> str:
+    """
+    MERGE the staged table into the live one on its primary key.
+
+    `scoped` restricts both sides to `@changed_fdc_ids`, so rows of other
+    foods are neither read from staging nor deleted from the live table.
+    """
+    columns = spec.column_names
+    keys = spec.primary_key
+    values = [c for c in columns if c not in keys]
+    source = (
+        f"(SELECT * FROM `{staging_id}` WHERE {_in_changed_ids(spec, 'fdc_id')})"
+        if scoped
+        else f"`{staging_id}`"
+    )
+    lines = [
+        f"MERGE `{target_id}` AS T",
+        f"USING {source} AS S",
+        "ON " + " AND ".join(f"T.{_q(k)} = S.{_q(k)}" for k in keys),
+    ]
+    if values:
+        differs = " OR ".join(f"T.{_q(c)} IS DISTINCT FROM S.{_q(c)}" for c in values)
+        updates = ", ".join(f"{_q(c)} = S.{_q(c)}" for c in values)
+        lines.append(f"WHEN MATCHED AND ({differs}) THEN UPDATE SET {updates}")
+    lines.append(
+        f"WHEN NOT MATCHED BY TARGET THEN INSERT ({', '.join(_q(c) for c in columns)}) "
+        f"VALUES ({', '.join(f'S.{_q(c)}' for c in columns)})"
+    )
+    lines.append(
+        "WHEN NOT MATCHED BY SOURCE"
+        + (f" AND {_in_changed_ids(spec, 'T.fdc_id')}" if scoped else "")
+        + " THEN DELETE"
+    )
+    return "\n".join(lines)
+
+
+# =========================
+# Dataset version stamp
+# =========================
+def _version_table_id(project_id: str, dataset_name: str) -> str:
+    return f"{project_id}.{dataset_name}.{VERSION_TABLE.name}"
+
+
+def stamp_version(
+    client: Any,
+    project_id: str,
+    dataset_name: str,
+    mode: str,
+    changed_tables: list[str],
+    changed_fdc_ids: list[int] | None = None,
+) -> int:
+    """Append a `_dataset_version` row and return its version number."""
+    from google.cloud import bigquery
+
+    table_id = _version_table_id(project_id, dataset_name)
+    client.create_table(
+        bigquery.Table(table_id, schema=VERSION_TABLE.bigquery_schema()), exists_ok=True
+    )
+    sql = f"""
+INSERT `{table_id}` (version, refreshed_at, mode, changed_tables, changed_fdc_ids)
+SELECT COALESCE(MAX(version), 0) + 1, CURRENT_TIMESTAMP(), @mode, @tables, @fdc_ids
+FROM `{table_id}`
+"""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("mode", "STRING", mode),
+            bigquery.ArrayQueryParameter("tables", "STRING", sorted(changed_tables)),
+            bigquery.ArrayQueryParameter(
+                "fdc_ids", "INT64", sorted(changed_fdc_ids or [])
+            ),
+        ]
+    )
+    client.query(sql, job_config=job_config).result()
+    versions = read_versions(client, project_id, dataset_name)
+    return versions[-1].version if versions else 0
+
+
+def read_versions(
+    client: Any, project_id: str, dataset_name: str, after: int = 0
+) -> list[DatasetVersion]:
+    """Dataset versions newer than `after`, oldest first; [] if never stamped."""
+    from google.api_core.exceptions import NotFound
+    from google.cloud import bigquery
+
+    sql = f"""
+SELECT version, mode, changed_tables, changed_fdc_ids
+FROM `{_version_table_id(project_id, dataset_name)}`
+WHERE version > @after
+ORDER BY version
+"""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("after", "INT64", after)]
+    )
+    try:
+        rows = client.query(sql, job_config=job_config).result()
+    except NotFound:
+        return []
+    return [
+        DatasetVersion(
+            version=row["version"],
+            mode=row["mode"] or "full",
+            changed_tables=list(row["changed_tables"] or []),
+            changed_fdc_ids=list(row["changed_fdc_ids"] or []),
+        )
+        for row in rows
+    ]
+
+
+# =========================
+# Refresh
+# =========================
+def _merge_table(
+    client: Any,
+    spec: TableSpec,
+    target_id: str,
+    staging_id: str,
+    changed_fdc_ids: list[int] | None,
+) -> int:
+    from google.api_core.exceptions import NotFound
+    from google.cloud import bigquery
+
+    try:
+        client.get_table(target_id)
+    except NotFound:
+        # First load of this table: the staged copy is the live table.
+        client.copy_table(staging_id, target_id).result()
+        return client.get_table(target_id).num_rows or 0
+
+    scoped = changed_fdc_ids is not None and is_fdc_scoped(spec)
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter(
+                CHANGED_IDS_PARAM, "INT64", changed_fdc_ids or []
+            )
+        ]
+    )
+    job = client.query(
+        merge_sql(spec, target_id, staging_id, scoped), job_config=job_config
+    )
+    job.result()
+    return job.num_dml_affected_rows or 0
+
+
+def run_refresh(
+    source: str,
+    work_dir: str,
+    project_id: str,
+    dataset_name: str,
+    workers: int = 4,
+    use_parquet: bool = True,
+    client: Any = None,
+) -> RefreshResult:
+    """
+    Bring the live dataset up to date with `source` by merging changes only.
+
+    Tables whose CSV is unchanged since the last import are not even staged.
+    Tables without a typed schema cannot be merged and are skipped.
+    """
+    if client is None:
+        from google.cloud import bigquery
+
+        client = bigquery.Client(project=project_id)
+    start = time.perf_counter()
+    staging_name = f"{dataset_name}_staging"
+    target = f"{project_id}.{dataset_name}"
+    staging = f"{project_id}.{staging_name}"
+    ensure_dataset(client, project_id, dataset_name)
+
+    staged = run_import(
+        source,
+        work_dir,
+        BigQueryLoader(project_id, staging_name, client=client),
+        workers=workers,
+        use_parquet=use_parquet,
+        record_state=False,
+        # Staged tables count as imported once merged into the live dataset.
+        destination=bigquery_destination(project_id, dataset_name),
+    )
+    if staged.failed:
+        raise RuntimeError(f"Staging failed for {[name for name, _ in staged.failed]}")
+    staged_tables = {name for name in staged.fingerprints if name in TABLES_BY_NAME}
+    result = RefreshResult(changed_tables=sorted(staged_tables))
+    if not staged_tables:
+        logging.info("Release unchanged, nothing to refresh")
+        result.elapsed_s = time.perf_counter() - start
+        return result
+
+    # Without a new update log the changed foods are unknown, so every table
+    # is merged whole and the version carries no fdc_ids.
+    changed_fdc_ids: list[int] | None = None
+    if UPDATE_LOG_TABLE in staged_tables:
+        ids_sql = changed_fdc_ids_sql(target, staging, staged_tables)
+        assert ids_sql is not None
+        changed_fdc_ids = sorted(
+            int(row["fdc_id"]) for row in client.query(ids_sql).result()
+        )
+        result.changed_fdc_ids = changed_fdc_ids
+        logging.info(
+            f"{len(changed_fdc_ids)} foods changed according to the update log"
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: pool.submit(
+                _merge_table,
+                client,
+                TABLES_BY_NAME[name],
+                f"{target}.{name}",
+                f"{staging}.{name}",
+                changed_fdc_ids,
+            )
+            for name in sorted(staged_tables)
+        }
+        for name, future in futures.items():
+            result.rows_affected[name] = future.result()
+            logging.info(f"Merged {name}: {result.rows_affected[name]} rows affected")
+
+    result.version = stamp_version(
+        client,
+        project_id,
+        dataset_name,
+        mode="incremental",
+        changed_tables=result.changed_tables,
+        changed_fdc_ids=changed_fdc_ids,
+    )
+    record_tables(work_dir, staged.destination, staged.fingerprints)
+    for name in staged.fingerprints:
+        client.delete_table(f"{staging}.{name}", not_found_ok=True)
+    result.elapsed_s = time.perf_counter() - start
+    return result
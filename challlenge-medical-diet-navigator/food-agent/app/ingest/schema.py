@@ -0,0 +1,331 @@
+"""
+Typed BigQuery schemas for the FoodData Central (Foundation Foods) CSV tables.
+
+These replace `autodetect=True` loads, which left numeric columns such as
+`input_food.amount` as STRING and every table unclustered. Some of those
+columns hold values that are not numbers; they are loaded as NULL (see
+`FieldSpec.null_if_invalid`) instead of rejecting the row. `app/bq_schema.py`
+renders the agent's prompt schema from the same definitions.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+INT64 = "INT64"
+FLOAT64 = "FLOAT64"
+STRING = "STRING"
+DATE = "DATE"
+BOOL = "BOOL"
+TIMESTAMP = "TIMESTAMP"
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    type: str
+    mode: str = "NULLABLE"
+    # Load values that do not parse as `type` as NULL instead of rejecting
+    # the row. For number columns that autodetect had to keep as STRING.
+    null_if_invalid: bool = False
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """One FoodData Central table: columns in CSV order, clustering and key."""
+
+    name: str
+    fields: tuple[FieldSpec, ...]
+    clustering: tuple[str, ...] = ()
+    primary_key: tuple[str, ...] = ()
+    description: str = ""
+    # Extra columns that are not in the CSV (e.g. added by the refresh job).
+    extra_fields: tuple[FieldSpec, ...] = field(default=())
+
+    @property
+    def column_names(self) -> list[str]:
+        return [f.name for f in self.fields]
+
+    @property
+    def csv_filename(self) -> str:
+        return f"{self.name}.csv"
+
+    def bigquery_schema(self) -> list[Any]:
+        """`google.cloud.bigquery.SchemaField`s for load jobs and DDL."""
+        from google.cloud import bigquery
+
+        return [
+            bigquery.SchemaField(f.name, f.type, mode=f.mode)
+            for f in (*self.fields, *self.extra_fields)
+        ]
+
+
+def _f(name: str, type_: str, mode: str = "NULLABLE") -> FieldSpec:
+    return FieldSpec(name, type_, mode)
+
+
+def _key(name: str) -> FieldSpec:
+    return FieldSpec(name, INT64, "REQUIRED")
+
+
+def _lenient(name: str, type_: str) -> FieldSpec:
+    """A number column with some values that are not numbers."""
+    return FieldSpec(name, type_, null_if_invalid=True)
+
+
+TABLES: tuple[TableSpec, ...] = (
+    TableSpec(
+        "food",
+        (
+            _key("fdc_id"),
+            _f("data_type", STRING),
+            _f("description", STRING),
+            _f("food_category_id", INT64),
+            _f("publication_date", DATE),
+        ),
+        clustering=("food_category_id",),
+        primary_key=("fdc_id",),
+    ),
+    TableSpec(
+        "food_nutrient",
+        (
+            _key("id"),
+            _f("fdc_id", INT64),
+            _f("nutrient_id", INT64),
+            _f("amount", FLOAT64),
+            _f("data_points", INT64),
+            _f("derivation_id", INT64),
+            _f("min", FLOAT64),
+            _f("max", FLOAT64),
+            _f("median", FLOAT64),
+            _f("footnote", STRING),
+            _f("min_year_acquired", INT64),
+        ),
+        clustering=("fdc_id", "nutrient_id"),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "nutrient",
+        (
+            _key("id"),
+            _f("name", STRING),
+            _f("unit_name", STRING),
+            _f("nutrient_nbr", FLOAT64),
+            _f("rank", FLOAT64),
+        ),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "food_category",
+        (_key("id"), _f("code", INT64), _f("description", STRING)),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "input_food",
+        (
+            _key("id"),
+            _f("fdc_id", INT64),
+            _f("fdc_of_input_food", INT64),
+            _lenient("seq_num", INT64),
+            _lenient("amount", FLOAT64),
+            _f("ingredient_code", STRING),
+            _f("ingredient_description", STRING),
+            _f("unit", STRING),
+            _f("portion_code", STRING),
+            _f("portion_description", STRING),
+            _lenient("gram_weight", FLOAT64),
+            _f("retention_code", STRING),
+        ),
+        clustering=("fdc_id",),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "food_portion",
+        (
+            _key("id"),
+            _f("fdc_id", INT64),
+            _f("seq_num", INT64),
+            _f("amount", FLOAT64),
+            _f("measure_unit_id", INT64),
+            _f("portion_description", STRING),
+            _f("modifier", STRING),
+            _f("gram_weight", FLOAT64),
+            _f("data_points", INT64),
+            _f("footnote", STRING),
+            _f("min_year_acquired", INT64),
+        ),
+        clustering=("fdc_id",),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "measure_unit",
+        (_key("id"), _f("name", STRING)),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "food_attribute",
+        (
+            _key("id"),
+            _f("fdc_id", INT64),
+            _f("seq_num", INT64),
+            _f("food_attribute_type_id", INT64),
+            _f("name", STRING),
+            _f("value", STRING),
+        ),
+        clustering=("fdc_id",),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "food_attribute_type",
+        (_key("id"), _f("name", STRING), _f("description", STRING)),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "food_component",
+        (
+            _key("id"),
+            _lenient("fdc_id", INT64),
+            _f("name", STRING),
+            _f("pct_weight", FLOAT64),
+            _f("is_refuse", BOOL),
+            _f("gram_weight", FLOAT64),
+            _f("data_points", INT64),
+            # Misspelled in the FoodData Central CSV header.
+            _f("min_year_acqured", INT64),
+        ),
+        clustering=("fdc_id",),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "food_nutrient_conversion_factor",
+        (_key("id"), _f("fdc_id", INT64)),
+        clustering=("fdc_id",),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "food_protein_conversion_factor",
+        (_key("food_nutrient_conversion_factor_id"), _f("value", FLOAT64)),
+        primary_key=("food_nutrient_conversion_factor_id",),
+    ),
+    TableSpec(
+        "food_calorie_conversion_factor",
+        (
+            _key("food_nutrient_conversion_factor_id"),
+            _f("protein_value", FLOAT64),
+            _f("fat_value", FLOAT64),
+            _f("carbohydrate_value", FLOAT64),
+        ),
+        primary_key=("food_nutrient_conversion_factor_id",),
+    ),
+    TableSpec(
+        "foundation_food",
+        (_key("fdc_id"), _f("NDB_number", INT64), _f("footnote", STRING)),
+        primary_key=("fdc_id",),
+    ),
+    TableSpec(
+        "market_acquisition",
+        (
+            _key("fdc_id"),
+            _f("brand_description", STRING),
+            _f("expiration_date", DATE),
+            _lenient("label_weight", FLOAT64),
+            _f("location", STRING),
+            _f("acquisition_date", DATE),
+            _f("sales_type", STRING),
+            _f("sample_lot_nbr", STRING),
+            _f("sell_by_date", DATE),
+            _f("store_city", STRING),
+            _f("store_name", STRING),
+            _f("store_state", STRING),
+            _f("upc_code", STRING),
+        ),
+        primary_key=("fdc_id",),
+    ),
+    TableSpec(
+        "agricultural_samples",
+        (
+            _key("fdc_id"),
+            _f("acquisition_date", DATE),
+            _f("market_class", STRING),
+            _f("treatment", STRING),
+            _f("state", STRING),
+        ),
+        primary_key=("fdc_id",),
+    ),
+    TableSpec("sample_food", (_key("fdc_id"),), primary_key=("fdc_id",)),
+    TableSpec(
+        "sub_sample_food",
+        (_key("fdc_id"), _f("fdc_id_of_sample_food", INT64)),
+        primary_key=("fdc_id",),
+    ),
+    TableSpec(
+        "sub_sample_result",
+        (
+            _key("food_nutrient_id"),
+            _f("adjusted_amount", FLOAT64),
+            _f("lab_method_id", INT64),
+            _f("nutrient_name", STRING),
+        ),
+        primary_key=("food_nutrient_id",),
+    ),
+    TableSpec(
+        "acquisition_samples",
+        (_f("fdc_id_of_sample_food", INT64), _f("fdc_id_of_acquisition_food", INT64)),
+        primary_key=("fdc_id_of_sample_food", "fdc_id_of_acquisition_food"),
+    ),
+    TableSpec(
+        "lab_method",
+        (_key("id"), _f("description", STRING), _f("technique", STRING)),
+        primary_key=("id",),
+    ),
+    TableSpec(
+        "lab_method_code",
+        (_f("lab_method_id", INT64), _f("code", STRING)),
+        primary_key=("lab_method_id", "code"),
+    ),
+    TableSpec(
+        "lab_method_nutrient",
+        (_f("lab_method_id", INT64), _f("nutrient_id", INT64)),
+        primary_key=("lab_method_id", "nutrient_id"),
+    ),
+    TableSpec(
+        "food_update_log_entry",
+        (_key("id"), _f("description", STRING), _f("last_updated", DATE)),
+        primary_key=("id",),
+    ),
+)
+
+TABLES_BY_NAME: dict[str, TableSpec] = {t.name: t for t in TABLES}
+
+# One row per load or refresh of the dataset. Caches built from the dataset
+# remember the version they saw and invalidate only the foods changed since.
+VERSION_TABLE = TableSpec(
+    "_dataset_version",
+    (
+        _key("version"),
+        _f("refreshed_at", TIMESTAMP, "REQUIRED"),
+        _f("mode", STRING),
+        _f("changed_tables", STRING, "REPEATED"),
+        _f("changed_fdc_ids", INT64, "REPEATED"),
+    ),
+    primary_key=("version",),
+)
+
+
+def render_db_schema(tables: tuple[TableSpec, ...] = TABLES) -> str:
+    """The JSON schema description the BigQuery agent is prompted with."""
+    rendered = []
+    for table in tables:
+        entry: dict[str, Any] = {
+            "table_name": table.name,
+            "fields": [
+                {"column_name": f.name, "data_type": f.type}
+                for f in (*table.fields, *table.extra_fields)
+            ],
+        }
+        if table.clustering:
+            entry["clustered_by"] = list(table.clustering)
+        rendered.append(entry)
+    return json.dumps(rendered, indent=2)
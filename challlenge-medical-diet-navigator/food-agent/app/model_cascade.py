@@ -0,0 +1,317 @@
+"""
+Cheap-model-first cascade for the agents.
+
+Every agent used to send every turn to the same model with a 32k output
+budget, including transfers and one-line answers. `CascadeLlm` is a drop-in
+`model=` for an `Agent`. It asks the cheapest tier first and escalates to
+the next tier only when:
+
+- the previous tool call in the request returned an error (the turn starts
+  one tier up, since the cheaper model already got the call wrong),
+- the tier raised, returned an error code or an empty response,
+- the response fails validation: it calls a tool the agent does not have,
+  or leaves out a required argument,
+- the answer reads as low confidence ("I'm not sure", "I couldn't find").
+
+"Low confidence" is only a hedging regex: a cheap model that is confidently
+wrong is not caught. The cascade is therefore off by default and, when on,
+applies only to the agents in `Config.MODEL_CASCADE_AGENTS`, whose mistakes
+the tool and validation checks catch. Medical and allergy answers stay on
+`Config.MODEL`.
+
+When streaming, a cheaper tier's chunks are held only until its answer has
+passed `COMMIT_CHARS` characters without hedging; the rest streams through
+as it arrives and that tier answers the turn.
+
+Tiers are configured as "model[:max_output_tokens[:thinking_budget]]",
+cheapest first, in `Config.MODEL_TIERS` or `<AGENT_NAME>_MODEL_TIERS`.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+from typing import Any
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+from pydantic import PrivateAttr
+
+from .config import Config
+
+_LOW_CONFIDENCE = re.compile(
+    r"\b(i'?m not (sure|certain)|i am not (sure|certain)|"
+    r"i (don'?t|do not) (know|have (enough )?information)|"
+    r"i (couldn'?t|could not|can'?t|cannot|was unable to) (find|determine|answer|tell)|"
+    r"unable to (find|determine|answer))\b",
+    re.IGNORECASE,
+)
+_ERROR_STATUSES = {"error", "failed", "failure"}
+# Hedges open an answer, so a streamed answer that got this far without one
+# is passed through as it arrives.
+COMMIT_CHARS = 160
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    model: str
+    max_output_tokens: int | None = None
+    thinking_budget: int | None = None
+
+    @classmethod
+    def parse(cls, spec: str) -> ModelTier:
+        model, *budgets = spec.strip().split(":")
+        if not model:
+            raise ValueError(f"Empty model in tier spec {spec!r}")
+        max_tokens = int(budgets[0]) if budgets and budgets[0] else None
+        thinking = int(budgets[1]) if len(budgets) > 1 and budgets[1] else None
+        return cls(model, max_tokens, thinking)
+
+
+def parse_tiers(spec: str) -> list[ModelTier]:
+    return [ModelTier.parse(part) for part in spec.split(",") if part.strip()]
+
+
+class CascadeStats:
+    """How often each tier answered, and why turns escalated, per agent."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.answered: dict[str, Counter[str]] = defaultdict(Counter)
+        self.escalations: dict[str, Counter[str]] = defaultdict(Counter)
+
+    def record(self, name: str, model: str, reasons: list[str]) -> None:
+        with self._lock:
+            self.answered[name][model] += 1
+            self.escalations[name].update(reasons)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            stats = {}
+            for name, answered in self.answered.items():
+                total = sum(answered.values())
+                stats[name] = {
+                    "calls": total,
+                    "answered_by": dict(answered),
+                    "escalations": dict(self.escalations[name]),
+                    "escalation_rate": round(
+                        sum(self.escalations[name].values()) / total, 3
+                    ),
+                }
+            return stats
+
+
+STATS = CascadeStats()
+
+
+def _tool_error(llm_request: LlmRequest) -> bool:
+    """Whether the latest turn carries a failed function response."""
+    if not llm_request.contents:
+        return False
+    last = llm_request.contents[-1]
+    for part in last.parts or []:
+        response = part.function_response.response if part.function_response else None
+        if not isinstance(response, dict):
+            continue
+        status = str(response.get("status", "")).lower()
+        if (
+            status in _ERROR_STATUSES
+            or "error" in response
+            or "error_details" in response
+        ):
+            return True
+    return False
+
+
+def _invalid_call(call: types.FunctionCall, llm_request: LlmRequest) -> str | None:
+    tool = llm_request.tools_dict.get(call.name or "")
+    if tool is None:
+        return "unknown_tool"
+    try:
+        declaration = tool._get_declaration()
+    except Exception:
+        return None
+    required = (
+        declaration.parameters.required
+        if declaration is not None and declaration.parameters is not None
+        else None
+    )
+    if required and any(name not in (call.args or {}) for name in required):
+        return "missing_argument"
+    return None
+
+
+def escalation_reason(
+    responses: list[LlmResponse], llm_request: LlmRequest, finished: bool = True
+) -> str | None:
+    """
+    Why a tier's (possibly streamed) answer should go to the next tier.
+    With `finished=False` the chunks so far are checked, and no chunk yet is
+    not a reason.
+    """
+    final = [r for r in responses if not r.partial] if finished else []
+    final = final or responses
+    if any(r.error_code for r in final):
+        return "error"
+    parts = [p for r in final if r.content for p in r.content.parts or []]
+    if not parts:
+        return "empty" if finished else None
+    for part in parts:
+        if part.function_call:
+            reason = _invalid_call(part.function_call, llm_request)
+            if reason:
+                return reason
+    text = "".join(p.text for p in parts if p.text and not p.thought)
+    if text and _LOW_CONFIDENCE.search(text):
+        return "low_confidence"
+    return None
+
+
+class CascadeLlm(BaseLlm):
+    """
+    Tries `tiers` cheapest first. `model` is the strongest tier's name, so
+    built-in tools and caches keyed on the model see a real Gemini model.
+    """
+
+    name: str
+    tiers: list[ModelTier]
+    _llms: dict[str, BaseLlm] = PrivateAttr(default_factory=dict)
+
+    def _llm(self, model: str) -> BaseLlm:
+        if model not in self._llms:
+            self._llms[model] = LLMRegistry.new_llm(model)
+        return self._llms[model]
+
+    def _request_for(self, tier: ModelTier, llm_request: LlmRequest) -> LlmRequest:
+        request = llm_request.model_copy()
+        request.model = tier.model
+        request.contents = list(llm_request.contents)
+        config = (llm_request.config or types.GenerateContentConfig()).model_copy(
+            deep=True
+        )
+        if tier.max_output_tokens is not None:
+            # Never raise an agent's own, smaller budget.
+            config.max_output_tokens = min(
+                tier.max_output_tokens,
+                config.max_output_tokens or tier.max_output_tokens,
+            )
+        if tier.thinking_budget is not None:
+            config.thinking_config = types.ThinkingConfig(
+                thinking_budget=tier.thinking_budget
+            )
+        request.config = config
+        return request
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        reasons: list[str] = []
+        start = 0
+        if len(self.tiers) > 1 and _tool_error(llm_request):
+            reasons.append("tool_error")
+            start = 1
+
+        for i, tier in enumerate(self.tiers[start:], start=start):
+            request = self._request_for(tier, llm_request)
+            llm = self._llm(tier.model)
+            if i == len(self.tiers) - 1:
+                # Last tier: nothing to escalate to, so stream straight through.
+                STATS.record(self.name, tier.model, reasons)
+                async for response in llm.generate_content_async(
+                    request, stream=stream
+                ):
+                    yield _tag(response, tier, reasons)
+                return
+
+            # Cheaper tiers are held back so a rejected answer is never shown;
+            # a streamed answer is released once it is past COMMIT_CHARS.
+            responses: list[LlmResponse] = []
+            reason = None
+            committed = False
+            chunks = llm.generate_content_async(request, stream=stream)
+            try:
+                async for response in chunks:
+                    if committed:
+                        yield _tag(response, tier, reasons)
+                        continue
+                    responses.append(response)
+                    if not stream:
+                        continue
+                    reason = escalation_reason(responses, llm_request, finished=False)
+                    if reason is not None:
+                        break
+                    if _text_length(responses) >= COMMIT_CHARS:
+                        committed = True
+                        STATS.record(self.name, tier.model, reasons)
+                        for held in responses:
+                            yield _tag(held, tier, reasons)
+            except Exception as e:
+                if committed:
+                    raise
+                logging.warning(
+                    f"[cascade] {self.name}: {tier.model} failed ({e}), escalating"
+                )
+                reasons.append("exception")
+                continue
+            finally:
+                await chunks.aclose()
+            if committed:
+                return
+            reason = reason or escalation_reason(responses, llm_request)
+            if reason is None:
+                STATS.record(self.name, tier.model, reasons)
+                for response in responses:
+                    yield _tag(response, tier, reasons)
+                return
+            logging.info(f"[cascade] {self.name}: {tier.model} {reason}, escalating")
+            reasons.append(reason)
+
+
+def _text_length(responses: list[LlmResponse]) -> int:
+    return sum(
+        len(p.text)
+        for r in responses
+        if r.content
+        for p in r.content.parts or []
+        if p.text and not p.thought
+    )
+
+
+def _tag(response: LlmResponse, tier: ModelTier, reasons: list[str]) -> LlmResponse:
+    response.custom_metadata = {
+        **(response.custom_metadata or {}),
+        "model_tier": tier.model,
+        **({"escalations": list(reasons)} if reasons else {}),
+    }
+    return response
+
+
+def cascade_model(agent_name: str) -> BaseLlm | str:
+    """
+    The `model=` for `agent_name`: a `CascadeLlm` over its tiers, or just
+    `Config.MODEL` when the cascade is off or not enabled for that agent.
+    """
+    if (
+        not Config.MODEL_CASCADE_ENABLED
+        or agent_name not in Config.MODEL_CASCADE_AGENTS
+    ):
+        return Config.MODEL
+    tiers = parse_tiers(
+        os.getenv(f"{agent_name.upper()}_MODEL_TIERS", Config.MODEL_TIERS)
+    )
+    if not tiers:
+        raise ValueError(f"No model tiers configured for {agent_name}")
+    return CascadeLlm(model=tiers[-1].model, name=agent_name, tiers=tiers)
+
+
+def cascade_stats() -> dict[str, Any]:
+    """Aggregate per-process cascade statistics, per agent."""
+    return STATS.snapshot()
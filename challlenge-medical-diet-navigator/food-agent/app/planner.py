@@ -0,0 +1,216 @@
+"""
+Planner mode for compound data + allergy questions.
+
+"High-protein snacks that are safe for a sesame allergy" needs two independent
+lookups: nutrition data from BigQuery and allergy guidance. `main_agent`
+would run them one after the other (transfer, come back, call the allergen
+tool). `PlannerAgent` spots these questions locally and runs both lookups in
+a `ParallelAgent`, then merges the two answers. Everything else goes to
+`fallback` unchanged.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+
+from google.adk.agents import (
+    Agent,
+    BaseAgent,
+    LlmAgent,
+    ParallelAgent,
+    SequentialAgent,
+)
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.models.base_llm import BaseLlm
+
+from .allergen_index import MATCHER, allergen_names
+
+# Session state keys shared by the pipeline agents.
+QUESTION_KEY = "planner_question"
+DATA_TASK_KEY = "planner_data_task"
+ALLERGY_TASK_KEY = "planner_allergy_task"
+DATA_RESULT_KEY = "planner_data_result"
+ALLERGY_RESULT_KEY = "planner_allergy_result"
+
+# A nutrient, or an explicit ask for USDA data. "Foods", "snacks" or "recipe"
+# alone are not a data task: "what foods should I avoid with a peanut allergy"
+# is an allergy question only.
+_DATA_CUES = re.compile(
+    r"\b(calories|kcal|protein|fib(er|re)|sugars?|carbs?|carbohydrates?|fats?|"
+    r"sodium|iron|calcium|potassium|zinc|magnesium|cholesterol|vitamins?|"
+    r"nutrients?|macros?|usda|fooddata central|fdc_?id|nutrition (data|facts))\b",
+    re.IGNORECASE,
+)
+_ALLERGY_CUES = re.compile(
+    r"\b(allerg\w*|safe for|free of|without|avoid(ing)?|intoleran\w*|celiac|"
+    r"(\w+)-free)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class CompoundPlan:
+    """Independent sub-tasks of one user question."""
+
+    question: str
+    data_task: str
+    allergy_task: str
+
+
+def plan_compound(text: str) -> CompoundPlan | None:
+    """Split a question into a data task and an allergy task, if it has both."""
+    if not text or not _DATA_CUES.search(text) or not _ALLERGY_CUES.search(text):
+        return None
+    allergens = allergen_names(MATCHER.scan(text))
+    if not allergens and not re.search(r"\ballerg|\bceliac", text, re.IGNORECASE):
+        return None
+    names = ", ".join(a.replace("_", " ") for a in allergens) or "the mentioned"
+    return CompoundPlan(
+        question=text,
+        data_task=(
+            f"{text}\n\nOnly answer the nutrition data part using the USDA dataset. "
+            f"Another agent checks the {names} allergy, so list each candidate food's "
+            "description and fdc_id and do not filter for allergens yourself."
+        ),
+        allergy_task=(
+            f"For someone with a {names} allergy, list the foods, ingredients and "
+            "hidden sources to avoid, and any cross-contamination risks. "
+            f"The user asked: {text}"
+        ),
+    )
+
+
+MERGE_INSTRUCTIONS = f"""
+You combine the results of two helpers into one answer for the user.
+The user asked: {{{QUESTION_KEY}}}
+
+Nutrition data from the USDA dataset:
+{{{DATA_RESULT_KEY}}}
+
+Allergy guidance:
+{{{ALLERGY_RESULT_KEY}}}
+
+Keep only foods from the nutrition data that are compatible with the allergy guidance,
+say which ones you removed and why, and keep any sources the allergy guidance cited.
+"""
+
+
+def build_compound_pipeline(
+    data_agent: LlmAgent, allergy_agent: LlmAgent, model: str | BaseLlm
+) -> SequentialAgent:
+    """Run clones of the two lookup agents in parallel, then merge their answers."""
+    data_branch = data_agent.clone(
+        update={
+            "name": "planner_data_branch",
+            "instruction": f"{data_agent.instruction}\nYour task: {{{DATA_TASK_KEY}}}",
+            "output_key": DATA_RESULT_KEY,
+            # Not "none": that mode starts the turn at the latest reply from any
+            # other agent, so an allergy answer landing between this branch's
+            # tool call and its response drops the call. Sibling branches are
+            # filtered out by branch here either way.
+            "include_contents": "default",
+            "disallow_transfer_to_parent": True,
+            "disallow_transfer_to_peers": True,
+        }
+    )
+    allergy_branch = allergy_agent.clone(
+        update={
+            "name": "planner_allergy_branch",
+            "instruction": f"{allergy_agent.instruction}\nYour task: {{{ALLERGY_TASK_KEY}}}",
+            "output_key": ALLERGY_RESULT_KEY,
+            "include_contents": "none",
+            "disallow_transfer_to_parent": True,
+            "disallow_transfer_to_peers": True,
+        }
+    )
+    merger = Agent(
+        name="planner_merge_agent",
+        model=model,
+        description="Merges parallel nutrition and allergy lookups.",
+        instruction=MERGE_INSTRUCTIONS,
+        include_contents="none",
+        disallow_transfer_to_parent=True,
+        disallow_transfer_to_peers=True,
+    )
+    return SequentialAgent(
+        name="planner_compound_pipeline",
+        sub_agents=[
+            ParallelAgent(
+                name="planner_parallel_lookups",
+                sub_agents=[data_branch, allergy_branch],
+            ),
+            merger,
+        ],
+    )
+
+
+class PlannerAgent(BaseAgent):
+    """
+    Runs compound questions through the parallel pipeline.
+
+    Sub-agents are `[fallback, pipeline]`; see `build_planner_agent`.
+    """
+
+    @property
+    def fallback(self) -> BaseAgent:
+        return self.sub_agents[0]
+
+    @property
+    def pipeline(self) -> BaseAgent:
+        return self.sub_agents[1]
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        content = ctx.user_content
+        text = ""
+        if (
+            content
+            and content.parts
+            and not any(p.inline_data or p.file_data for p in content.parts)
+        ):
+            text = " ".join(p.text for p in content.parts if p.text)
+        plan = plan_compound(text)
+
+        if plan is None:
+            async for event in self.fallback.run_async(ctx):
+                yield event
+            return
+
+        # Publish the sub-tasks to session state before the branches start.
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(
+                state_delta={
+                    QUESTION_KEY: plan.question,
+                    DATA_TASK_KEY: plan.data_task,
+                    ALLERGY_TASK_KEY: plan.allergy_task,
+                    DATA_RESULT_KEY: "",
+                    ALLERGY_RESULT_KEY: "",
+                }
+            ),
+        )
+        async for event in self.pipeline.run_async(ctx):
+            yield event
+
+
+def build_planner_agent(
+    fallback: BaseAgent,
+    data_agent: LlmAgent,
+    allergy_agent: LlmAgent,
+    model: str | BaseLlm,
+) -> PlannerAgent:
+    """Wrap `fallback` with planner mode for compound questions."""
+    return PlannerAgent(
+        name="compound_planner",
+        description="Runs independent data and allergy lookups in parallel.",
+        sub_agents=[
+            fallback,
+            build_compound_pipeline(data_agent, allergy_agent, model),
+        ],
+    )
@@ -0,0 +1,465 @@
+"""
+Local intent router in front of the main agent.
+
+Routing a message through `main_agent` costs a full model call before any
+work starts. `IntentRouter` decides locally instead, using keyword rules plus
+a small naive Bayes classifier trained on logged transfers. Confident cases go
+straight to the right sub-agent or, for allergen questions about a USDA food
+the allergen index covers, a deterministic answer. Everything else falls back
+to `main_agent` unchanged.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import AsyncGenerator, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.genai import types
+from pydantic import Field
+
+from .allergen_index import (
+    Allergen,
+    allergen_names,
+    lookup_food_allergens,
+    parse_allergen,
+)
+from .config import Config
+
+USDA_AGENT = "usda_food_information_bigquery_agent"
+IMAGE_AGENT = "imagen_tool_agent"
+# Deterministic route: answered from the allergen index, no model call.
+ALLERGEN_SCAN = "allergen_scan"
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NUTRIENT = (
+    r"calories|kcal|energy|protein|fib(er|re)|fats?|carb(ohydrate)?s?|sugars?|"
+    r"sodium|potassium|calcium|iron|zinc|magnesium|cholesterol|caffeine|"
+    r"vitamin [a-z0-9]+|nutrients?|macros?"
+)
+
+# Keyword rules per target. A message routed by rules must match exactly one
+# target; anything ambiguous is left to the classifier or the main agent.
+ROUTE_RULES: dict[str, tuple[re.Pattern[str], ...]] = {
+    IMAGE_AGENT: (
+        re.compile(
+            r"\b(generate|create|draw|make|render|show me)\b.{0,40}"
+            r"\b(image|picture|photo|illustration|drawing)s?\b",
+            re.IGNORECASE,
+        ),
+    ),
+    USDA_AGENT: (
+        # An amount of a nutrient in a named food: "how much fiber is in oats".
+        re.compile(
+            rf"\b(how (much|many)|amount|grams?|mg|mcg)\b.{{0,40}}\b({_NUTRIENT})\b"
+            r".{0,30}\b(in|of)\s+(an?\s+|one\s+|\d+\s*\w*\s+)?[a-z]",
+            re.IGNORECASE,
+        ),
+        re.compile(
+            rf"\b(top \d+|highest|lowest|richest|rank(ed)?)\b.{{0,40}}"
+            rf"\b({_NUTRIENT}|foods?)\b",
+            re.IGNORECASE,
+        ),
+        re.compile(
+            r"\b(usda|fooddata central|fdc_?id|database|dataset|bigquery)\b",
+            re.IGNORECASE,
+        ),
+    ),
+}
+# Questions about the user's own intake ("how many calories should I eat per
+# day") mention nutrients but are not lookups in the USDA data.
+_PERSONAL_INTAKE = re.compile(
+    r"\b(should|do|can|must|may) (i|we|you|he|she|they)\b|"
+    r"\b(per|a|each) (day|week)\b|\bdaily\b",
+    re.IGNORECASE,
+)
+
+# "Does X contain Y?" questions. They are only answered locally when X names a
+# USDA food by fdc_id and the allergen index lists Y for it; words in free text
+# ("vegan butter", "dairy-free cheese") say nothing reliable about a product.
+_CONTAINS_QUESTION = re.compile(
+    r"^\s*(does|do|is there|are there|is)\s+(?P<food>.+?)\s+"
+    r"(contain|contains|have|has|include|includes|made with)\s+(?P<allergen>[a-z ]+?)\s*\??\s*$",
+    re.IGNORECASE,
+)
+_FDC_ID = re.compile(r"\bfdc[_ ]?id\b\s*(?:#|:|=)?\s*(\d+)", re.IGNORECASE)
+# Medical or research cues that always need the full agent.
+_NEEDS_AGENT = re.compile(
+    r"\b(allerg|anaphyla|reaction|symptom|safe|risk|cross.?contam|diagnos|doctor)\w*",
+    re.IGNORECASE,
+)
+
+
+def _parse_allergen(name: str) -> Allergen | None:
+    try:
+        return parse_allergen(name)
+    except ValueError:
+        return None
+
+
+def _tokens(text: str) -> list[str]:
+    words = _WORD.findall(text.lower())
+    return words + [f"{a}_{b}" for a, b in itertools.pairwise(words)]
+
+
+class NaiveBayesIntentClassifier:
+    """Multinomial naive Bayes over words and bigrams, trainable from logs."""
+
+    def __init__(self) -> None:
+        self.label_counts: Counter[str] = Counter()
+        self.token_counts: dict[str, Counter[str]] = defaultdict(Counter)
+        self.vocabulary: set[str] = set()
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.label_counts)
+
+    def fit(self, examples: Iterable[tuple[str, str]]) -> NaiveBayesIntentClassifier:
+        for text, label in examples:
+            tokens = _tokens(text)
+            self.label_counts[label] += 1
+            self.token_counts[label].update(tokens)
+            self.vocabulary.update(tokens)
+        return self
+
+    def predict_proba(self, text: str) -> dict[str, float]:
+        """Posterior probability per label."""
+        if not self.trained:
+            return {}
+        tokens = _tokens(text)
+        total = sum(self.label_counts.values())
+        vocab = len(self.vocabulary) + 1
+        scores: dict[str, float] = {}
+        for label, count in self.label_counts.items():
+            counts = self.token_counts[label]
+            denom = sum(counts.values()) + vocab
+            scores[label] = math.log(count / total) + sum(
+                math.log((counts[t] + 1) / denom) for t in tokens
+            )
+        top = max(scores.values())
+        exp = {label: math.exp(s - top) for label, s in scores.items()}
+        norm = sum(exp.values())
+        return {label: v / norm for label, v in exp.items()}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "label_counts": dict(self.label_counts),
+            "token_counts": {k: dict(v) for k, v in self.token_counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> NaiveBayesIntentClassifier:
+        clf = cls()
+        clf.label_counts = Counter(data["label_counts"])
+        for label, counts in data["token_counts"].items():
+            clf.token_counts[label] = Counter(counts)
+            clf.vocabulary.update(counts)
+        return clf
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> NaiveBayesIntentClassifier:
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_transfer_log(cls, path: str) -> NaiveBayesIntentClassifier:
+        """Train from the JSONL transfer log written by `IntentRouterAgent`."""
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return cls().fit((r["text"], r["target"]) for r in records)
+
+
+@dataclass
+class RouteDecision:
+    """Outcome of routing one message."""
+
+    target: str | None
+    confidence: float
+    source: str  # "rules", "classifier" or "fallback"
+    decision_ms: float = 0.0
+    details: dict[str, Any] = field(default_factory=dict)
+
+
+class IntentRouter:
+    """Rules first, then the classifier; below `threshold` nothing is routed."""
+
+    def __init__(
+        self,
+        classifier: NaiveBayesIntentClassifier | None = None,
+        threshold: float = 0.8,
+        rules: dict[str, tuple[re.Pattern[str], ...]] = ROUTE_RULES,
+    ) -> None:
+        self.classifier = classifier or NaiveBayesIntentClassifier()
+        self.threshold = threshold
+        self.rules = rules
+
+    def route(self, text: str) -> RouteDecision:
+        start = time.perf_counter()
+        decision = self._route(text or "")
+        decision.decision_ms = (time.perf_counter() - start) * 1000
+        return decision
+
+    def _route(self, text: str) -> RouteDecision:
+        if not text.strip():
+            return RouteDecision(None, 0.0, "fallback")
+
+        contains = _CONTAINS_QUESTION.match(text)
+        wanted = _parse_allergen(contains.group("allergen")) if contains else None
+        if contains and wanted:
+            if not _NEEDS_AGENT.search(text):
+                decision = self._route_allergen_question(contains.group("food"), wanted)
+                if decision is not None:
+                    return decision
+            # Allergen questions the index cannot confirm need the main agent.
+            return RouteDecision(None, 0.0, "fallback")
+
+        matched = {
+            target
+            for target, patterns in self.rules.items()
+            if any(p.search(text) for p in patterns)
+        }
+        if USDA_AGENT in matched and _PERSONAL_INTAKE.search(text):
+            matched.discard(USDA_AGENT)
+        if len(matched) == 1 and not _NEEDS_AGENT.search(text):
+            return RouteDecision(matched.pop(), 0.95, "rules")
+
+        proba = self.classifier.predict_proba(text)
+        if proba:
+            label, p = max(proba.items(), key=lambda kv: kv[1])
+            if p >= self.threshold and (not matched or label in matched):
+                return RouteDecision(label, p, "classifier")
+        return RouteDecision(None, 0.0, "fallback")
+
+    def _route_allergen_question(
+        self, food: str, wanted: Allergen
+    ) -> RouteDecision | None:
+        """
+        Answer "does fdc_id N contain Y?" from the allergen index. Only allergens
+        the index confirms for that food are answered; a miss says nothing
+        about the product, so those questions go to the agent.
+        """
+        fdc_id = _FDC_ID.search(food)
+        if fdc_id is None:
+            return None
+        found = lookup_food_allergens(int(fdc_id.group(1)))
+        if found["status"] != "success":
+            return None
+        listed = sum(Allergen[name.upper()] for name in found["contains"])
+        confirmed = Allergen(listed) & wanted
+        if not confirmed:
+            return None
+        return RouteDecision(
+            ALLERGEN_SCAN,
+            1.0,
+            "rules",
+            details={
+                "fdc_id": found["fdc_id"],
+                "description": found["description"],
+                "allergens": allergen_names(confirmed),
+            },
+        )
+
+
+class RouterStats:
+    """Thread-safe counters and saved-latency estimates for the router."""
+
+    def __init__(self, initial_hop_ms: float) -> None:
+        self._lock = threading.Lock()
+        self.routed: Counter[str] = Counter()
+        self.fallbacks = 0
+        # EWMA of how long main_agent takes to produce its routing decision.
+        self.hop_ms = initial_hop_ms
+        self.saved_ms_total = 0.0
+
+    def record_routed(self, target: str, decision_ms: float) -> float:
+        with self._lock:
+            saved = max(0.0, self.hop_ms - decision_ms)
+            self.routed[target] += 1
+            self.saved_ms_total += saved
+            return saved
+
+    def record_fallback(self, hop_ms: float | None) -> None:
+        with self._lock:
+            self.fallbacks += 1
+            if hop_ms is not None:
+                self.hop_ms = 0.8 * self.hop_ms + 0.2 * hop_ms
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            routed = sum(self.routed.values())
+            return {
+                "routed": dict(self.routed),
+                "fallbacks": self.fallbacks,
+                "routed_ratio": routed / ((routed + self.fallbacks) or 1),
+                "estimated_hop_ms": self.hop_ms,
+                "saved_ms_total": self.saved_ms_total,
+                "saved_ms_per_routed": self.saved_ms_total / routed if routed else 0.0,
+            }
+
+
+def _user_text(ctx: InvocationContext) -> str:
+    content = ctx.user_content
+    if not content or not content.parts:
+        return ""
+    if any(p.inline_data or p.file_data for p in content.parts):
+        # Images need the multimodal main agent.
+        return ""
+    return " ".join(p.text for p in content.parts if p.text)
+
+
+class IntentRouterAgent(BaseAgent):
+    """
+    Root agent that dispatches confident messages without a routing model hop.
+
+    `fallback` is the original root agent and must be the only sub-agent;
+    routed targets are looked up anywhere under it by name.
+    """
+
+    router: Any = Field(default_factory=IntentRouter)
+    stats: Any = Field(default_factory=lambda: RouterStats(initial_hop_ms=1500.0))
+    # JSONL file of (text, target) pairs taken from main_agent's own
+    # transfers, used to retrain the classifier.
+    transfer_log_path: str = ""
+
+    @property
+    def fallback(self) -> BaseAgent:
+        return self.sub_agents[0]
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        text = _user_text(ctx)
+        decision = self.router.route(text)
+
+        if decision.target == ALLERGEN_SCAN:
+            saved = self.stats.record_routed(ALLERGEN_SCAN, decision.decision_ms)
+            self._log_decision(decision, saved)
+            details = decision.details
+            names = ", ".join(details["allergens"]).replace("_", " ")
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                content=types.Content(
+                    role="model",
+                    parts=[
+                        types.Part.from_text(
+                            text=(
+                                f"{details['description']} (USDA fdc_id "
+                                f"{details['fdc_id']}) lists {names} in its "
+                                "description or ingredients."
+                            )
+                        )
+                    ],
+                ),
+                custom_metadata={"router": self._metadata(decision, saved)},
+            )
+            return
+
+        target = self.fallback.find_agent(decision.target) if decision.target else None
+        if target is not None:
+            saved = self.stats.record_routed(target.name, decision.decision_ms)
+            self._log_decision(decision, saved)
+            first = True
+            async for event in target.run_async(ctx):
+                if first:
+                    event.custom_metadata = {
+                        **(event.custom_metadata or {}),
+                        "router": self._metadata(decision, saved),
+                    }
+                    first = False
+                yield event
+            return
+
+        start = time.perf_counter()
+        hop_ms: float | None = None
+        async for event in self.fallback.run_async(ctx):
+            if hop_ms is None and (
+                event.actions.transfer_to_agent or event.get_function_calls()
+            ):
+                hop_ms = (time.perf_counter() - start) * 1000
+                self._log_transfer(text, event)
+            yield event
+        self.stats.record_fallback(hop_ms)
+
+    def _metadata(self, decision: RouteDecision, saved_ms: float) -> dict[str, Any]:
+        return {
+            "target": decision.target,
+            "source": decision.source,
+            "confidence": round(decision.confidence, 3),
+            "decision_ms": round(decision.decision_ms, 3),
+            "saved_ms": round(saved_ms, 1),
+        }
+
+    def _log_decision(self, decision: RouteDecision, saved_ms: float) -> None:
+        logging.info(
+            f"Routed to {decision.target} via {decision.source} "
+            f"(confidence={decision.confidence:.2f}, decision={decision.decision_ms:.2f} ms, "
+            f"saved~{saved_ms:.0f} ms)"
+        )
+
+    def _log_transfer(self, text: str, event: Event) -> None:
+        if not self.transfer_log_path or not text:
+            return
+        target = event.actions.transfer_to_agent
+        if not target:
+            return
+        try:
+            with open(self.transfer_log_path, "a") as f:
+                f.write(json.dumps({"text": text, "target": target}) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not log transfer: {e}")
+
+
+def build_intent_router(fallback: BaseAgent) -> IntentRouterAgent:
+    """Wrap `fallback` in a router configured from `Config`."""
+    classifier = None
+    if Config.ROUTER_MODEL_PATH:
+        try:
+            classifier = NaiveBayesIntentClassifier.load(Config.ROUTER_MODEL_PATH)
+        except OSError as e:
+            logging.warning(f"Router classifier not loaded, using rules only: {e}")
+    return IntentRouterAgent(
+        name="intent_router",
+        description="Routes confident requests straight to the right agent or tool.",
+        sub_agents=[fallback],
+        router=IntentRouter(classifier=classifier, threshold=Config.ROUTER_THRESHOLD),
+        transfer_log_path=Config.ROUTER_TRANSFER_LOG,
+    )
+
+
+def router_stats(agent: BaseAgent) -> dict[str, Any]:
+    """Routing counters and saved latency for a router root agent."""
+    if isinstance(agent, IntentRouterAgent):
+        return agent.stats.snapshot()
+    return {}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the intent router classifier")
+    parser.add_argument("--transfer-log", required=True, help="JSONL transfer log")
+    parser.add_argument("--out", required=True, help="Where to write the model JSON")
+    args = parser.parse_args()
+
+    clf = NaiveBayesIntentClassifier.from_transfer_log(args.transfer_log)
+    clf.save(args.out)
+    print(
+        f"Trained on {sum(clf.label_counts.values())} examples: {dict(clf.label_counts)}"
+    )
@@ -0,0 +1,463 @@
+"""
+Pre-execution cost governor for SQL generated by the USDA BigQuery agent.
+
+`WriteMode.BLOCKED` stops DDL/DML but not expensive reads. Every `execute_sql`
+call is parsed with sqlglot before it runs:
+
+- only a single SELECT over the configured dataset is allowed;
+- `SELECT *` / `alias.*` is rewritten to an explicit, pruned column list;
+- joins must follow a known key path (no cross or comma joins);
+- the outermost query gets a `LIMIT` of at most `Config.SQL_MAX_ROWS`.
+
+With BigQuery available the rewritten query is then dry-run, and queries that
+would scan more than `Config.SQL_MAX_BYTES_SCANNED` are rejected. Parsing and
+rewriting need no network, so they can be tested offline.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import sqlglot
+from sqlglot import exp
+
+from .config import Config
+from .ingest.schema import TABLES
+
+# table -> ordered column names, from the typed dataset schema
+TABLE_COLUMNS: dict[str, list[str]] = {t.name: t.column_names for t in TABLES}
+
+# Columns returned for `SELECT *` on wide tables. Other tables expand to all
+# of their columns, which costs the same but keeps the projection explicit.
+PRUNED_COLUMNS: dict[str, list[str]] = {
+    "food_nutrient": ["fdc_id", "nutrient_id", "amount"],
+    "food": ["fdc_id", "description", "food_category_id"],
+    "food_portion": [
+        "fdc_id",
+        "amount",
+        "measure_unit_id",
+        "portion_description",
+        "gram_weight",
+    ],
+    "input_food": [
+        "fdc_id",
+        "fdc_of_input_food",
+        "ingredient_description",
+        "amount",
+        "unit",
+        "gram_weight",
+    ],
+    "market_acquisition": ["fdc_id", "brand_description", "upc_code"],
+}
+
+# Columns that all hold an FDC food id; any two may be joined, including a
+# column with itself (e.g. two aliases of food_nutrient on fdc_id).
+_FDC_ID_COLUMNS = {
+    ("food", "fdc_id"),
+    ("food_nutrient", "fdc_id"),
+    ("food_portion", "fdc_id"),
+    ("food_attribute", "fdc_id"),
+    ("food_component", "fdc_id"),
+    ("food_nutrient_conversion_factor", "fdc_id"),
+    ("foundation_food", "fdc_id"),
+    ("input_food", "fdc_id"),
+    ("input_food", "fdc_of_input_food"),
+    ("market_acquisition", "fdc_id"),
+    ("sample_food", "fdc_id"),
+    ("sub_sample_food", "fdc_id"),
+    ("sub_sample_food", "fdc_id_of_sample_food"),
+    ("agricultural_samples", "fdc_id"),
+    ("acquisition_samples", "fdc_id_of_sample_food"),
+    ("acquisition_samples", "fdc_id_of_acquisition_food"),
+    ("food_update_log_entry", "id"),
+}
+
+# Other foreign key -> primary key paths of the FoodData Central schema.
+_KEY_PATHS = {
+    (("food", "food_category_id"), ("food_category", "id")),
+    (("food_nutrient", "nutrient_id"), ("nutrient", "id")),
+    (("food_nutrient", "id"), ("sub_sample_result", "food_nutrient_id")),
+    (("food_portion", "measure_unit_id"), ("measure_unit", "id")),
+    (("sub_sample_result", "lab_method_id"), ("lab_method", "id")),
+    (("lab_method_nutrient", "lab_method_id"), ("lab_method", "id")),
+    (("lab_method_nutrient", "nutrient_id"), ("nutrient", "id")),
+    (("lab_method_code", "lab_method_id"), ("lab_method", "id")),
+    (("food_attribute", "food_attribute_type_id"), ("food_attribute_type", "id")),
+    (
+        ("food_protein_conversion_factor", "food_nutrient_conversion_factor_id"),
+        ("food_nutrient_conversion_factor", "id"),
+    ),
+    (
+        ("food_calorie_conversion_factor", "food_nutrient_conversion_factor_id"),
+        ("food_nutrient_conversion_factor", "id"),
+    ),
+}
+ALLOWED_JOIN_KEYS: frozenset[frozenset[tuple[str, str]]] = frozenset(
+    [frozenset(path) for path in _KEY_PATHS]
+    + [frozenset({a, b}) for a in _FDC_ID_COLUMNS for b in _FDC_ID_COLUMNS]
+    # Self-joins on a primary key.
+    + [frozenset({pk}) for _, pk in _KEY_PATHS]
+)
+
+
+class QueryRejected(ValueError):
+    """Raised when a query violates the governor's rules."""
+
+
+@dataclass
+class GovernedQuery:
+    """A query accepted by the governor, possibly rewritten."""
+
+    original: str
+    sql: str
+    rewrites: list[str] = field(default_factory=list)
+    estimated_bytes: int | None = None
+
+
+def _from_clause(select: exp.Select) -> exp.From | None:
+    return select.args.get("from") or select.args.get("from_")
+
+
+def _sources(select: exp.Select) -> dict[str, str | None]:
+    """Map alias -> dataset table name (None for subqueries, CTEs and UNNEST)."""
+    nodes = []
+    from_ = _from_clause(select)
+    if from_ is not None:
+        nodes.append(from_.this)
+    nodes.extend(j.this for j in select.args.get("joins") or [])
+    sources: dict[str, str | None] = {}
+    for node in nodes:
+        if isinstance(node, exp.Table) and node.name in TABLE_COLUMNS:
+            sources[node.alias_or_name] = node.name
+        else:
+            sources[node.alias_or_name] = None
+    return sources
+
+
+def _check_tables(tree: exp.Query, project_id: str, dataset_name: str) -> None:
+    cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    for table in tree.find_all(exp.Table):
+        if not table.name or table.name in cte_names:
+            continue
+        if table.db and table.db != dataset_name:
+            raise QueryRejected(
+                f"Only tables in `{project_id}.{dataset_name}` may be queried."
+            )
+        if table.catalog and table.catalog != project_id:
+            raise QueryRejected(
+                f"Only tables in `{project_id}.{dataset_name}` may be queried."
+            )
+        if table.db and table.name not in TABLE_COLUMNS:
+            raise QueryRejected(f"Unknown table `{table.name}`.")
+
+
+def _expand_stars(select: exp.Select, rewrites: list[str]) -> None:
+    sources = _sources(select)
+    projections: list[exp.Expression] = []
+    changed = False
+    for projection in select.expressions:
+        if isinstance(projection, exp.Star):
+            if len(sources) != 1:
+                raise QueryRejected(
+                    "SELECT * over a join is not allowed; list the columns you need."
+                )
+            alias = next(iter(sources))
+            qualifier = None
+        elif isinstance(projection, exp.Column) and isinstance(
+            projection.this, exp.Star
+        ):
+            alias = projection.table
+            qualifier = alias
+        else:
+            projections.append(projection)
+            continue
+
+        table = sources.get(alias)
+        if table is None:
+            # Stars over subqueries and CTEs are bounded by their own projection.
+            projections.append(projection)
+            continue
+        columns = PRUNED_COLUMNS.get(table, TABLE_COLUMNS[table])
+        projections.extend(exp.column(c, table=qualifier) for c in columns)
+        rewrites.append(f"expanded {qualifier + '.' if qualifier else ''}* on {table}")
+        changed = True
+    if changed:
+        select.set("expressions", projections)
+
+
+def _column_source(
+    column: exp.Column, sources: dict[str, str | None]
+) -> tuple[str, str, str] | None:
+    """(alias, table, column) that `column` refers to, if unambiguous."""
+    if column.table:
+        alias = column.table
+    else:
+        owners = [
+            a
+            for a, t in sources.items()
+            if t and column.name in TABLE_COLUMNS.get(t, [])
+        ]
+        if len(owners) != 1:
+            return None
+        alias = owners[0]
+    table = sources.get(alias)
+    return (alias, table, column.name) if table else None
+
+
+def _conjuncts(condition: exp.Expression) -> list[exp.Expression]:
+    """The top-level AND terms of a condition; `(a AND b) OR c` is one term."""
+    if isinstance(condition, exp.Paren):
+        return _conjuncts(condition.this)
+    if isinstance(condition, exp.And):
+        return _conjuncts(condition.this) + _conjuncts(condition.expression)
+    return [condition]
+
+
+def _check_joins(select: exp.Select) -> None:
+    sources = _sources(select)
+    for join in select.args.get("joins") or []:
+        if isinstance(join.this, exp.Unnest):
+            continue
+        on = join.args.get("on")
+        using = join.args.get("using")
+        if using:
+            if any(u.name != "fdc_id" for u in using):
+                raise QueryRejected("JOIN ... USING is only allowed on fdc_id.")
+            continue
+        if on is None:
+            raise QueryRejected(
+                "Cross and comma joins are not allowed; join on a key such as fdc_id."
+            )
+        # The key equality must hold for every joined row, so it has to be an
+        # AND term of the condition; `ON a.fdc_id = b.fdc_id OR TRUE` is a
+        # cross join.
+        equalities = [c for c in _conjuncts(on) if isinstance(c, exp.EQ)]
+        if not equalities:
+            raise QueryRejected("Joins must use an equality on a known key column.")
+        joined = join.this.alias_or_name
+        if sources.get(joined) is None:
+            # Derived tables: require an equality but key paths are unknown.
+            continue
+        for eq in equalities:
+            left, right = eq.this, eq.expression
+            if not (isinstance(left, exp.Column) and isinstance(right, exp.Column)):
+                continue
+            a, b = _column_source(left, sources), _column_source(right, sources)
+            if not (a and b) or a[0] == b[0] or joined not in (a[0], b[0]):
+                # Must link the joined table to another one, not to itself.
+                continue
+            if frozenset({a[1:], b[1:]}) in ALLOWED_JOIN_KEYS:
+                break
+        else:
+            raise QueryRejected(
+                f"Join on `{join.this.alias_or_name}` does not follow a known key path "
+                "(e.g. food.fdc_id = food_nutrient.fdc_id, "
+                "food_nutrient.nutrient_id = nutrient.id)."
+            )
+
+
+def _enforce_limit(tree: exp.Query, max_rows: int, rewrites: list[str]) -> None:
+    limit = tree.args.get("limit")
+    if limit is None:
+        tree.set("limit", exp.Limit(expression=exp.Literal.number(max_rows)))
+        rewrites.append(f"added LIMIT {max_rows}")
+        return
+    value = limit.expression
+    if (
+        not (isinstance(value, exp.Literal) and value.is_int)
+        or int(value.this) > max_rows
+    ):
+        limit.set("expression", exp.Literal.number(max_rows))
+        rewrites.append(f"capped LIMIT at {max_rows}")
+
+
+def govern_sql(
+    sql: str,
+    project_id: str = Config.GOOGLE_CLOUD_PROJECT,
+    dataset_name: str = Config.DATASET_NAME,
+    max_rows: int = Config.SQL_MAX_ROWS,
+) -> GovernedQuery:
+    """Validate and rewrite one query. Raises `QueryRejected` on violations."""
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="bigquery") if s is not None]
+    except sqlglot.errors.ParseError as e:
+        raise QueryRejected(f"Could not parse SQL: {e}") from e
+    if len(statements) != 1:
+        raise QueryRejected("Exactly one SELECT statement is allowed.")
+    tree = statements[0]
+    if not isinstance(tree, exp.Query):
+        raise QueryRejected("Only SELECT queries are allowed.")
+
+    _check_tables(tree, project_id, dataset_name)
+    rewrites: list[str] = []
+    for select in list(tree.find_all(exp.Select)):
+        _check_joins(select)
+        _expand_stars(select, rewrites)
+    _enforce_limit(tree, max_rows, rewrites)
+    return GovernedQuery(
+        original=sql, sql=tree.sql(dialect="bigquery"), rewrites=rewrites
+    )
+
+
+def dry_run_bytes(client: Any, sql: str) -> int:
+    """Bytes BigQuery would scan for `sql`, via a dry-run job."""
+    from google.cloud import bigquery
+
+    job = client.query(
+        sql, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    )
+    return int(job.total_bytes_processed or 0)
+
+
+class GovernorStats:
+    """Counters for governed queries, logged per query and in aggregate."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.rejected = 0
+        self.dry_run_errors = 0
+        self.rewritten = 0
+        self.estimated_bytes_total = 0
+
+    def record(
+        self,
+        *,
+        rejected: bool,
+        rewritten: bool,
+        estimated_bytes: int | None,
+        dry_run_error: bool = False,
+    ) -> None:
+        with self._lock:
+            self.queries += 1
+            self.rejected += int(rejected)
+            self.dry_run_errors += int(dry_run_error)
+            self.rewritten += int(rewritten)
+            self.estimated_bytes_total += estimated_bytes or 0
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "rejected": self.rejected,
+                "dry_run_errors": self.dry_run_errors,
+                "rewritten": self.rewritten,
+                "estimated_bytes_total": self.estimated_bytes_total,
+            }
+
+
+STATS = GovernorStats()
+_bq_client: Any = None
+# function_call_id -> start time of accepted queries. The after callback pops
+# its entry, but it never runs when the tool raises or another callback
+# answers first, so entries older than this are dropped on every insert.
+_STARTED_TTL_S = 600.0
+_started: dict[str, float] = {}
+
+
+def _mark_started(call_id: str) -> None:
+    now = time.perf_counter()
+    for stale in [k for k, t in _started.items() if now - t > _STARTED_TTL_S]:
+        del _started[stale]
+    _started[call_id] = now
+
+
+def _get_bq_client(project_id: str) -> Any:
+    global _bq_client
+    if _bq_client is None:
+        from google.cloud import bigquery
+
+        _bq_client = bigquery.Client(project=project_id)
+    return _bq_client
+
+
+def before_execute_sql(
+    tool: Any, args: dict[str, Any], tool_context: Any
+) -> dict | None:
+    """
+    `before_tool_callback` for the BigQuery agent.
+
+    Rewrites `args["query"]` in place, or returns an error result that the
+    model sees instead of running the query.
+    """
+    if tool.name != "execute_sql":
+        return None
+    project_id = args.get("project_id") or Config.GOOGLE_CLOUD_PROJECT
+    try:
+        governed = govern_sql(args.get("query", ""), project_id=project_id)
+        if Config.SQL_DRY_RUN:
+            governed.estimated_bytes = dry_run_bytes(
+                _get_bq_client(project_id), governed.sql
+            )
+            if governed.estimated_bytes > Config.SQL_MAX_BYTES_SCANNED:
+                raise QueryRejected(
+                    f"Query would scan {governed.estimated_bytes:,} bytes, over the "
+                    f"{Config.SQL_MAX_BYTES_SCANNED:,} byte budget. Select fewer "
+                    "columns or filter on fdc_id / nutrient_id."
+                )
+    except QueryRejected as e:
+        STATS.record(rejected=True, rewritten=False, estimated_bytes=None)
+        logging.info(json.dumps({"sql_governor": "rejected", "reason": str(e)}))
+        return {
+            "status": "ERROR",
+            "error_details": f"Query rejected by cost governor: {e}",
+        }
+    except Exception as e:
+        # Dry-run failures (bad column names, etc.) are surfaced to the model.
+        # They say nothing about cost, so they are not counted as rejections.
+        STATS.record(
+            rejected=False, rewritten=False, estimated_bytes=None, dry_run_error=True
+        )
+        logging.info(json.dumps({"sql_governor": "dry_run_error", "reason": str(e)}))
+        return {"status": "ERROR", "error_details": str(e)}
+
+    args["query"] = governed.sql
+    STATS.record(
+        rejected=False,
+        rewritten=bool(governed.rewrites),
+        estimated_bytes=governed.estimated_bytes,
+    )
+    if tool_context is not None and getattr(tool_context, "function_call_id", None):
+        _mark_started(tool_context.function_call_id)
+    logging.info(
+        json.dumps(
+            {
+                "sql_governor": "accepted",
+                "rewrites": governed.rewrites,
+                "estimated_bytes": governed.estimated_bytes,
+            }
+        )
+    )
+    return None
+
+
+def after_execute_sql(
+    tool: Any, args: dict[str, Any], tool_context: Any, tool_response: Any
+) -> dict | None:
+    """`after_tool_callback` logging duration and returned rows per query."""
+    if tool.name != "execute_sql":
+        return None
+    started = _started.pop(getattr(tool_context, "function_call_id", None) or "", None)
+    rows = tool_response.get("rows") if isinstance(tool_response, dict) else None
+    logging.info(
+        json.dumps(
+            {
+                "sql_governor": "executed",
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+                if started
+                else None,
+                "rows_returned": len(rows) if isinstance(rows, list) else None,
+            }
+        )
+    )
+    return None
+
+
+def sql_governor_stats() -> dict[str, Any]:
+    """Aggregate per-process governor statistics."""
+    return STATS.snapshot()
@@ -0,0 +1,573 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import wait as wait_futures
+from typing import Any
+
+from google.adk.artifacts import BaseArtifactService
+from google.genai import types
+
+from app.config import Config
+from app.utils.image_jobs import JobRunner
+
+# Artifact versions are immutable once written, so a (file, version) pair can
+# be cached indefinitely. Only "which versions exist" can change behind our
+# back (another replica saves or deletes); that list is cached for
+# ARTIFACT_VERSIONS_TTL_SECONDS and entries for versions that disappear from
+# it are dropped from both tiers.
+
+# (app_name, user_id, session_id or "user", filename)
+FileKey = tuple[str, str, str, str]
+EntryKey = tuple[str, str, str, str, int]
+Blob = tuple[bytes, str]  # data, mime type
+
+
+def file_key(app_name: str, user_id: str, session_id: str, filename: str) -> FileKey:
+    """User-namespaced files ("user:...") are shared by all sessions of the user."""
+    scope = "user" if filename.startswith("user:") else session_id
+    return (app_name, user_id, scope, filename)
+
+
+def _blob(artifact: types.Part) -> Blob | None:
+    """The bytes and mime type of an inline artifact; None for other parts."""
+    inline = artifact.inline_data
+    if inline is None or inline.data is None:
+        return None
+    return (inline.data, inline.mime_type or "application/octet-stream")
+
+
+class ArtifactCacheStats:
+    """Where artifact loads were served from, and how writes went."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: dict[str, int] = dict.fromkeys(
+            (
+                "memory_hits",
+                "disk_hits",
+                "backend_loads",
+                "version_lists",
+                "saves",
+                "uploads",
+                "upload_failures",
+                "write_through",
+                "version_conflicts",
+                "invalidated",
+            ),
+            0,
+        )
+
+    def add(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] += n
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            stats: dict[str, Any] = dict(self.counts)
+        loads = stats["memory_hits"] + stats["disk_hits"] + stats["backend_loads"]
+        stats["hit_rate"] = (
+            round((loads - stats["backend_loads"]) / loads, 3) if loads else 0.0
+        )
+        return stats
+
+
+STATS = ArtifactCacheStats()
+
+
+class MemoryTier:
+    """LRU of artifact bytes, bounded by their total size."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[EntryKey, Blob] = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: EntryKey) -> Blob | None:
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+            return blob
+
+    def put(self, key: EntryKey, blob: Blob) -> None:
+        if len(blob[0]) > self.max_bytes:
+            return
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = blob
+            self._bytes += len(blob[0])
+            while self._bytes > self.max_bytes:
+                _, (data, _) = self._entries.popitem(last=False)
+                self._bytes -= len(data)
+
+    def delete(self, key: EntryKey) -> None:
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None:
+                self._bytes -= len(old[0])
+
+
+class DiskTier:
+    """
+    Artifact bytes in a local directory, shared by the workers on a host.
+    Files are written atomically; past `max_bytes` the least recently read
+    are removed, and entries older than `ttl_seconds` are not served.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl_seconds: float) -> None:
+        """
+        :param root: Cache directory; created if missing.
+        :param max_bytes: Upper bound on the size of the cached files.
+        :param ttl_seconds: Entries are re-read from the backend after this long.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._bytes: int | None = None
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: EntryKey) -> str:
+        digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, key: EntryKey) -> Blob | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        if time.time() - header["written"] > self.ttl_seconds:
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)  # recency for eviction
+        except OSError:
+            pass
+        return data, header["mime_type"]
+
+    def put(self, key: EntryKey, blob: Blob) -> None:
+        data, mime_type = blob
+        path = self._path(key)
+        header = json.dumps({"mime_type": mime_type, "written": time.time()}).encode()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(header + b"\n" + data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.warning(f"Artifact disk cache write failed: {e}")
+            return
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += len(header) + 1 + len(data)
+        self._evict()
+
+    def delete(self, key: EntryKey) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _files(self) -> list[tuple[float, int, str]]:
+        files = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._files())
+            if self._bytes <= self.max_bytes:
+                return
+            # Other workers write here too, so recount before evicting down to 90%.
+            files = sorted(self._files())
+            self._bytes = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if self._bytes <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._bytes -= size
+
+
+class TieredArtifactService(BaseArtifactService):
+    """
+    `BaseArtifactService` with a memory LRU and a local-disk tier in front of
+    `backend` (a `GcsArtifactService` in production).
+
+    Loads are served from memory, then disk, then the backend. A save of a
+    session file this worker has written recently, with a fresh version
+    list, returns as soon as both local tiers hold the bytes; the backend
+    write happens in the background, in order per file. Other saves (a
+    file's first save here, user-namespaced files other sessions may write,
+    non-inline parts, a full upload queue) write through and return the
+    backend's version number. A worker that dies before its pending uploads
+    finish loses them; `flush()` runs at exit.
+    """
+
+    def __init__(
+        self,
+        backend: BaseArtifactService,
+        cache_dir: str = Config.ARTIFACT_CACHE_DIR,
+        memory_bytes: int = Config.ARTIFACT_CACHE_MEMORY_BYTES,
+        disk_bytes: int = Config.ARTIFACT_CACHE_DISK_BYTES,
+        disk_ttl_seconds: float = Config.ARTIFACT_CACHE_DISK_TTL_SECONDS,
+        versions_ttl_seconds: float = Config.ARTIFACT_VERSIONS_TTL_SECONDS,
+        upload_workers: int = Config.ARTIFACT_UPLOAD_WORKERS,
+        max_pending_uploads: int = Config.ARTIFACT_UPLOAD_MAX_PENDING,
+    ) -> None:
+        """
+        :param backend: The durable artifact service.
+        :param cache_dir: Directory of the disk tier.
+        :param memory_bytes: Size bound of the memory tier.
+        :param disk_bytes: Size bound of the disk tier.
+        :param disk_ttl_seconds: Age after which disk entries are not served.
+        :param versions_ttl_seconds: How long a file's version list is trusted.
+        :param upload_workers: Backend writes that may run at once.
+        :param max_pending_uploads: Beyond this, saves write through.
+        """
+        self.backend = backend
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = DiskTier(cache_dir, disk_bytes, disk_ttl_seconds)
+        self.versions_ttl_seconds = versions_ttl_seconds
+        self._uploads = JobRunner(
+            upload_workers, max_pending_uploads, name="artifact-uploads"
+        )
+        self._lock = threading.Lock()
+        # file -> (versions the backend listed, when)
+        self._versions: dict[FileKey, tuple[list[int], float]] = {}
+        # file -> versions saved here but not yet in the backend
+        self._pending: dict[FileKey, dict[int, Future | None]] = {}
+        self._uploaded_at: dict[FileKey, float] = {}
+        self._file_locks: dict[FileKey, asyncio.Lock] = {}
+        atexit.register(self.flush)
+
+    # -- version bookkeeping ---------------------------------------------------
+
+    def _known_versions(self, key: FileKey) -> list[int] | None:
+        with self._lock:
+            cached = self._versions.get(key)
+            if (
+                cached is None
+                or time.monotonic() - cached[1] > self.versions_ttl_seconds
+            ):
+                return None
+            return sorted(set(cached[0]) | set(self._pending.get(key, ())))
+
+    def _holds(self, key: FileKey) -> bool:
+        """
+        Whether the version number of a new save of `key` can be chosen here:
+        a session file whose version list is fresh and which this worker has
+        saved to the backend since that list was read.
+        """
+        if key[2] == "user":
+            return False
+        with self._lock:
+            cached = self._versions.get(key)
+            return (
+                cached is not None
+                and time.monotonic() - cached[1] <= self.versions_ttl_seconds
+                and self._uploaded_at.get(key, -1.0) >= cached[1]
+            )
+
+    def _set_backend_versions(
+        self, key: FileKey, versions: list[int], listed: float
+    ) -> None:
+        """Record a listing started at `listed` and drop cached versions that are gone."""
+        with self._lock:
+            previous = self._versions.get(key)
+            if self._uploaded_at.get(key, 0.0) > listed and previous is not None:
+                # An upload finished during the listing, which may not show it.
+                versions = sorted(set(versions) | set(previous[0]))
+            self._versions[key] = (list(versions), listed)
+            pending = set(self._pending.get(key, ()))
+        if previous is not None:
+            gone = set(previous[0]) - set(versions) - pending
+            for version in gone:
+                self._drop((*key, version))
+            STATS.add("invalidated", len(gone))
+
+    async def _list_versions(self, key: FileKey) -> list[int]:
+        if (known := self._known_versions(key)) is not None:
+            return known
+        app_name, user_id, scope, filename = key
+        STATS.add("version_lists")
+        listed = time.monotonic()
+        versions = await self.backend.list_versions(
+            app_name=app_name, user_id=user_id, session_id=scope, filename=filename
+        )
+        self._set_backend_versions(key, versions, listed)
+        with self._lock:
+            return sorted(set(versions) | set(self._pending.get(key, ())))
+
+    # -- tiers -----------------------------------------------------------------
+
+    async def _get(self, key: EntryKey) -> Blob | None:
+        if (blob := self.memory.get(key)) is not None:
+            STATS.add("memory_hits")
+            return blob
+        if (blob := await asyncio.to_thread(self.disk.get, key)) is not None:
+            STATS.add("disk_hits")
+            self.memory.put(key, blob)
+            return blob
+        return None
+
+    async def _put(self, key: EntryKey, blob: Blob) -> None:
+        self.memory.put(key, blob)
+        await asyncio.to_thread(self.disk.put, key, blob)
+
+    def _drop(self, key: EntryKey) -> None:
+        self.memory.delete(key)
+        self.disk.delete(key)
+
+    # -- write-behind ----------------------------------------------------------
+
+    def _file_lock(self, key: FileKey) -> asyncio.Lock:
+        # Only used on the upload loop, so creation needs no lock.
+        if key not in self._file_locks:
+            self._file_locks[key] = asyncio.Lock()
+        return self._file_locks[key]
+
+    async def _upload(self, key: FileKey, version: int, artifact: types.Part) -> None:
+        app_name, user_id, scope, filename = key
+        try:
+            async with self._file_lock(key):
+                saved = await self.backend.save_artifact(
+                    app_name=app_name,
+                    user_id=user_id,
+                    session_id=scope,
+                    filename=filename,
+                    artifact=artifact,
+                )
+        except Exception:
+            STATS.add("upload_failures")
+            with self._lock:
+                self._pending.get(key, {}).pop(version, None)
+                self._uploaded_at.pop(key, None)
+            raise
+        STATS.add("uploads")
+        self._uploaded(key, version, saved, artifact)
+
+    def _uploaded(
+        self, key: FileKey, version: int, saved: int, artifact: types.Part
+    ) -> None:
+        with self._lock:
+            self._pending.get(key, {}).pop(version, None)
+            self._uploaded_at[key] = time.monotonic()
+            if key in self._versions:
+                versions, listed = self._versions[key]
+                self._versions[key] = (sorted(set(versions) | {saved}), listed)
+        if saved != version:
+            # Another replica saved this file meanwhile; the backend's number wins.
+            STATS.add("version_conflicts")
+            logging.warning(
+                json.dumps(
+                    {
+                        "artifact_cache": "version_conflict",
+                        "filename": key[3],
+                        "expected": version,
+                        "saved": saved,
+                    }
+                )
+            )
+            self._drop((*key, version))
+            with self._lock:
+                self._versions.pop(key, None)
+                self._uploaded_at.pop(key, None)
+            if (blob := _blob(artifact)) is not None:
+                self.memory.put((*key, saved), blob)
+
+    async def _wait_for_uploads(self, key: FileKey) -> None:
+        with self._lock:
+            futures = [f for f in self._pending.get(key, {}).values() if f is not None]
+        for future in futures:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass  # logged by the job runner
+
+    def flush(self, timeout_s: float | None = 30.0) -> bool:
+        """Wait for pending backend writes; False if some were still running."""
+        with self._lock:
+            futures = [
+                f for p in self._pending.values() for f in p.values() if f is not None
+            ]
+        if not futures:
+            return True
+        _, not_done = wait_futures(futures, timeout=timeout_s)
+        return not not_done
+
+    # -- BaseArtifactService ---------------------------------------------------
+
+    async def save_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        artifact: types.Part,
+    ) -> int:
+        key = file_key(app_name, user_id, session_id, filename)
+        blob = _blob(artifact)
+        held = blob is not None and self._holds(key)
+        versions = await self._list_versions(key)
+        with self._lock:
+            pending = self._pending.setdefault(key, {})
+            version = max([*versions, *pending, -1]) + 1
+            pending[version] = None
+        STATS.add("saves")
+
+        future = None
+        if held and blob is not None:
+            await self._put((*key, version), blob)
+            future = self._uploads.submit(lambda: self._upload(key, version, artifact))
+        if future is None:
+            # The number picked here may already be taken elsewhere, or the
+            # upload queue is full: write through, so the caller gets the
+            # number the backend actually stored.
+            STATS.add("write_through")
+            await self._wait_for_uploads(key)
+            try:
+                saved = await self.backend.save_artifact(
+                    app_name=app_name,
+                    user_id=user_id,
+                    session_id=session_id,
+                    filename=filename,
+                    artifact=artifact,
+                )
+            except Exception:
+                with self._lock:
+                    pending.pop(version, None)
+                raise
+            self._uploaded(key, version, saved, artifact)
+            if blob is not None:
+                await self._put((*key, saved), blob)
+            return saved
+        with self._lock:
+            if version in pending:
+                pending[version] = future
+        return version
+
+    async def load_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        version: int | None = None,
+    ) -> types.Part | None:
+        key = file_key(app_name, user_id, session_id, filename)
+        if version is None:
+            versions = await self._list_versions(key)
+            if not versions:
+                return None
+            version = versions[-1]
+        if (blob := await self._get((*key, version))) is not None:
+            return types.Part.from_bytes(data=blob[0], mime_type=blob[1])
+        STATS.add("backend_loads")
+        artifact = await self.backend.load_artifact(
+            app_name=app_name,
+            user_id=user_id,
+            session_id=session_id,
+            filename=filename,
+            version=version,
+        )
+        if artifact is not None and (blob := _blob(artifact)) is not None:
+            await self._put((*key, version), blob)
+        return artifact
+
+    async def list_artifact_keys(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> list[str]:
+        filenames = set(
+            await self.backend.list_artifact_keys(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+        )
+        with self._lock:
+            for key, pending in self._pending.items():
+                if (
+                    pending
+                    and key[:2] == (app_name, user_id)
+                    and key[2] in (session_id, "user")
+                ):
+                    filenames.add(key[3])
+        return sorted(filenames)
+
+    async def delete_artifact(
+        self, *, app_name: str, user_id: str, session_id: str, filename: str
+    ) -> None:
+        key = file_key(app_name, user_id, session_id, filename)
+        # Let queued writes land first, or they would recreate the file.
+        await self._wait_for_uploads(key)
+        versions = await self.backend.list_versions(
+            app_name=app_name, user_id=user_id, session_id=session_id, filename=filename
+        )
+        await self.backend.delete_artifact(
+            app_name=app_name, user_id=user_id, session_id=session_id, filename=filename
+        )
+        with self._lock:
+            cached = self._versions.get(key, ([], 0.0))[0]
+            self._versions[key] = ([], time.monotonic())
+        for version in set(versions) | set(cached):
+            self._drop((*key, version))
+
+    async def list_versions(
+        self, *, app_name: str, user_id: str, session_id: str, filename: str
+    ) -> list[int]:
+        return await self._list_versions(
+            file_key(app_name, user_id, session_id, filename)
+        )
+
+
+def build_artifact_service(bucket_name: str) -> BaseArtifactService:
+    """The Agent Engine artifact service: GCS, behind the local tiers when enabled."""
+    from google.adk.artifacts import GcsArtifactService
+
+    backend = GcsArtifactService(bucket_name=bucket_name)
+    if not Config.ARTIFACT_CACHE_ENABLED:
+        return backend
+    return TieredArtifactService(backend)
+
+
+def artifact_cache_stats() -> dict[str, Any]:
+    """Aggregate per-process artifact cache statistics."""
+    return STATS.snapshot()
@@ -0,0 +1,170 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any
+
+
+class SqliteTTLCache:
+    """
+    A small persistent key/value cache backed by a local SQLite file.
+
+    Entries expire after `ttl_seconds` and the least recently used entries are
+    evicted past `max_entries`. Every worker process on the host that points at
+    the same file shares entries and hit/miss counters. Several caches can live
+    in one file under different namespaces.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        ttl_seconds: float,
+        max_entries: int = 10_000,
+    ) -> None:
+        """
+        :param path: SQLite file path (":memory:" keeps the cache per process)
+        :param namespace: Logical cache name inside the file
+        :param ttl_seconds: Time to live for each entry
+        :param max_entries: Upper bound on entries kept for this namespace
+        """
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            if self.path == ":memory:":
+                self._create_tables(conn)
+        return conn
+
+    def _init_schema(self) -> None:
+        self._create_tables(self._conn())
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_stats ("
+            " namespace TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0,"
+            " misses INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def _count(self, column: str) -> None:
+        self._conn().execute(
+            f"INSERT INTO cache_stats (namespace, {column}) VALUES (?, 1) "
+            f"ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + 1",
+            (self.namespace,),
+        )
+
+    def get(self, key: str) -> Any | None:
+        """Return the cached value for `key`, or None when missing or expired."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries "
+                "WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    conn.execute(
+                        "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                        (self.namespace, key),
+                    )
+                self._count("misses")
+                return None
+            conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? "
+                "WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            self._count("hits")
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logging.warning(f"Cache read failed for {self.namespace}: {e}")
+            return None
+
+    def set(self, key: str, value: Any, ttl_seconds: float | None = None) -> None:
+        """Store a JSON-serializable value, evicting the LRU entries if full."""
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries "
+                "(namespace, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now + ttl, now),
+            )
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                " SELECT key FROM cache_entries WHERE namespace = ?"
+                " ORDER BY (expires_at < ?) ASC, accessed_at DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, now, self.max_entries),
+            )
+        except sqlite3.Error as e:
+            logging.warning(f"Cache write failed for {self.namespace}: {e}")
+
+    def delete(self, key: str) -> None:
+        self._conn().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        )
+
+    def clear(self) -> None:
+        """Drop every entry and counter for this namespace."""
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+        conn.execute("DELETE FROM cache_stats WHERE namespace = ?", (self.namespace,))
+
+    def stats(self) -> dict[str, Any]:
+        """Return entry count, hits, misses and hit rate across all workers."""
+        conn = self._conn()
+        (entries,) = conn.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        row = conn.execute(
+            "SELECT hits, misses FROM cache_stats WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        hits, misses = row or (0, 0)
+        lookups = hits + misses
+        return {
+            "namespace": self.namespace,
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
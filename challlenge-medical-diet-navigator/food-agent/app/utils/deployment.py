@@ -0,0 +1,116 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Iterable
+from typing import Any
+
+from google.genai import errors
+
+METADATA_FILE = "deployment_metadata.json"
+
+# Build and editor output that does not change what is deployed.
+_IGNORED_DIRS = frozenset(
+    {"__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache"}
+)
+_IGNORED_SUFFIXES = (".pyc", ".pyo", ".DS_Store")
+
+
+def _package_files(path: str) -> Iterable[tuple[str, str]]:
+    """(name in the hash, file path) for a file or every file under a directory."""
+    if os.path.isfile(path):
+        yield os.path.basename(path), path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if d not in _IGNORED_DIRS)
+        for filename in sorted(filenames):
+            if filename.endswith(_IGNORED_SUFFIXES):
+                continue
+            full = os.path.join(dirpath, filename)
+            yield os.path.relpath(full, path).replace(os.sep, "/"), full
+
+
+def content_hash(
+    extra_packages: list[str],
+    requirements: list[str],
+    env_vars: dict[str, str],
+    settings: dict[str, Any],
+) -> str:
+    """
+    SHA-256 over everything a deploy uploads or configures.
+
+    :param extra_packages: Files and directories shipped with the agent (./app).
+    :param requirements: Requirement lines; order and blank lines do not matter.
+    :param env_vars: Environment variables of the engine.
+    :param settings: Other deploy settings (name, service account, region, ...).
+    """
+    digest = hashlib.sha256()
+    for package in sorted(extra_packages):
+        for name, path in _package_files(package):
+            digest.update(f"file:{package}:{name}\0".encode())
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    lines = sorted({line.strip() for line in requirements if line.strip()})
+    digest.update(json.dumps(lines).encode())
+    digest.update(json.dumps(env_vars, sort_keys=True).encode())
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def read_metadata(path: str = METADATA_FILE) -> dict[str, Any]:
+    """The last deploy's metadata, or {} when there is none."""
+    try:
+        with open(path) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def write_metadata(path: str, remote_agent_engine_id: str, digest: str) -> None:
+    metadata = {
+        "remote_agent_engine_id": remote_agent_engine_id,
+        "deployment_timestamp": datetime.datetime.now().isoformat(),
+        "content_hash": digest,
+    }
+    with open(path, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def find_agent_engine(
+    client: Any, display_name: str | None, engine_id: str | None = None
+) -> Any | None:
+    """
+    The engine to update: `engine_id` (from the metadata file) if it still
+    exists under this name, else the first engine filtered by display name.
+    Neither lists every engine in the project.
+    """
+    if engine_id:
+        try:
+            engine = client.agent_engines.get(name=engine_id)
+        except errors.ClientError as e:
+            if e.code not in (403, 404):
+                raise
+            logging.info(f"Agent engine {engine_id} not found; looking up by name")
+        else:
+            if engine.api_resource.display_name == display_name:
+                return engine
+    if not display_name:
+        return None
+    name_filter = f'display_name="{display_name}"'
+    return next(iter(client.agent_engines.list(config={"filter": name_filter})), None)
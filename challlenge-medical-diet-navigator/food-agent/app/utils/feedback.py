@@ -0,0 +1,214 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+import logging
+import signal
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from types import FrameType
+from typing import Any
+
+from app.utils.typing import Feedback
+
+
+@dataclass
+class ScoreAggregate:
+    count: int = 0
+    total: float = 0.0
+    min: float | None = None
+    max: float | None = None
+
+    def add(self, score: float) -> None:
+        self.count += 1
+        self.total += score
+        self.min = score if self.min is None else min(self.min, score)
+        self.max = score if self.max is None else max(self.max, score)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "mean": self.total / self.count if self.count else None}
+
+
+# Writers with entries that may still need writing when SIGTERM arrives.
+_open_writers: "weakref.WeakSet[FeedbackWriter]" = weakref.WeakSet()
+_previous_sigterm: Any = signal.SIG_DFL
+
+
+def _on_sigterm(signum: int, frame: FrameType | None) -> None:
+    """Flush open writers, then handle SIGTERM as before they were created."""
+    # atexit does not run when the process dies of SIGTERM, which is how
+    # serving containers are stopped. Close on another thread so a lock held
+    # by the interrupted code cannot hang shutdown past the grace period.
+    for writer in list(_open_writers):
+        closer = threading.Thread(target=writer.close, name="feedback-sigterm")
+        closer.start()
+        closer.join(timeout=writer.flush_interval_s + 5)
+    if callable(_previous_sigterm):
+        _previous_sigterm(signum, frame)
+    elif _previous_sigterm != signal.SIG_IGN:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.raise_signal(signal.SIGTERM)
+
+
+def _install_sigterm_flush() -> None:
+    global _previous_sigterm
+    # Handlers can only be installed from the main thread.
+    if threading.current_thread() is not threading.main_thread():
+        return
+    current = signal.getsignal(signal.SIGTERM)
+    if current is not _on_sigterm:
+        _previous_sigterm = current
+        signal.signal(signal.SIGTERM, _on_sigterm)
+
+
+class FeedbackWriter:
+    """
+    Buffers feedback log entries and writes them as batched Cloud Logging
+    requests: when `batch_size` entries are waiting, every
+    `flush_interval_s`, and at shutdown (exit or SIGTERM). Also keeps
+    per-invocation and per-user score aggregates in memory.
+    """
+
+    def __init__(
+        self,
+        logger: Any,
+        batch_size: int = 50,
+        flush_interval_s: float = 5.0,
+        max_buffered: int = 5000,
+        max_aggregates: int = 10_000,
+    ) -> None:
+        """
+        :param logger: A `google.cloud.logging` Logger.
+        :param batch_size: Entries that trigger a flush.
+        :param flush_interval_s: Longest time an entry waits before it is written.
+        :param max_buffered: Entries kept when writes fail; the oldest are dropped beyond this.
+        :param max_aggregates: Invocations and users tracked, least recently scored dropped first.
+        """
+        self.logger = logger
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_buffered = max_buffered
+        self.max_aggregates = max_aggregates
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer: list[dict[str, Any]] = []
+        self._by_invocation: OrderedDict[str, ScoreAggregate] = OrderedDict()
+        self._by_user: OrderedDict[str, ScoreAggregate] = OrderedDict()
+        self._overall = ScoreAggregate()
+        self._dropped = 0
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="feedback-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+        _open_writers.add(self)
+        _install_sigterm_flush()
+
+    def add(self, feedback: Feedback) -> None:
+        """Queue one validated feedback entry; returns without any network call."""
+        score = float(feedback.score)
+        with self._lock:
+            self._buffer.append(feedback.model_dump())
+            self._overall.add(score)
+            self._score(self._by_invocation, feedback.invocation_id, score)
+            if feedback.user_id:
+                self._score(self._by_user, feedback.user_id, score)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _score(
+        self, table: OrderedDict[str, ScoreAggregate], key: str, score: float
+    ) -> None:
+        aggregate = table.pop(key, None) or ScoreAggregate()
+        aggregate.add(score)
+        table[key] = aggregate
+        if len(table) > self.max_aggregates:
+            table.popitem(last=False)
+
+    def flush(self, full_batches_only: bool = False) -> int:
+        """
+        Write what is buffered; returns the number of entries written.
+
+        :param full_batches_only: Leave a trailing partial batch for later.
+        """
+        with self._flush_lock:
+            with self._lock:
+                take = len(self._buffer)
+                if full_batches_only:
+                    take -= take % self.batch_size
+                entries, self._buffer = self._buffer[:take], self._buffer[take:]
+            if not entries:
+                return 0
+            try:
+                for start in range(0, len(entries), self.batch_size):
+                    batch = self.logger.batch()
+                    for entry in entries[start : start + self.batch_size]:
+                        batch.log_struct(entry, severity="INFO")
+                    batch.commit()
+            except Exception as e:
+                logging.warning(f"Failed to write feedback, will retry: {e}")
+                # Earlier batches were written; requeue the rest in order.
+                unwritten = entries[start:]
+                with self._lock:
+                    self._buffer[:0] = unwritten
+                    overflow = len(self._buffer) - self.max_buffered
+                    if overflow > 0:
+                        del self._buffer[:overflow]
+                        self._dropped += overflow
+                return len(entries) - len(unwritten)
+            return len(entries)
+
+    def _run(self) -> None:
+        while not self._closed:
+            # Woken early by a full batch: write full batches only, so a
+            # burst does not turn into many small writes.
+            full = self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            self.flush(full_batches_only=full and not self._closed)
+
+    def close(self) -> None:
+        """Stop the background thread and write what is left."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval_s + 5)
+        self.flush()
+        atexit.unregister(self.close)
+        _open_writers.discard(self)
+
+    def summary(
+        self, invocation_id: str | None = None, user_id: str | None = None
+    ) -> dict[str, Any]:
+        """
+        Score aggregates: overall, or for one invocation and/or user.
+        Counts cover this process since it started.
+        """
+        with self._lock:
+            result: dict[str, Any] = {
+                "overall": self._overall.as_dict(),
+                "buffered": len(self._buffer),
+                "dropped": self._dropped,
+            }
+            if invocation_id is not None:
+                aggregate = self._by_invocation.get(invocation_id, ScoreAggregate())
+                result["invocation"] = aggregate.as_dict()
+            if user_id is not None:
+                result["user"] = self._by_user.get(user_id, ScoreAggregate()).as_dict()
+            return result
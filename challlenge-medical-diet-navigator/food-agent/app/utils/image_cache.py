@@ -0,0 +1,79 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+from typing import Any
+
+from app.config import Config
+from app.utils.cache_store import SqliteTTLCache
+from app.utils.search_cache import normalize_query
+
+# Generated images are stored once in GCS under the hash of their bytes; this
+# cache maps a normalized prompt + generation config to those objects, so a
+# repeat prompt returns the existing URLs and markdown without a model call.
+
+_IMAGE_FILLER_WORDS = frozenset(
+    "generate create draw make render show give me an image picture photo "
+    "photograph illustration drawing of for".split()
+)
+
+
+def normalize_image_prompt(prompt: str) -> str:
+    """`normalize_query` plus the "generate an image of" phrasing."""
+    return " ".join(
+        w for w in normalize_query(prompt).split() if w not in _IMAGE_FILLER_WORDS
+    )
+
+
+def image_cache_key(prompt: str, model: str, options: dict[str, Any]) -> str | None:
+    """
+    Key on model, generation options and normalized prompt.
+
+    :param prompt: The prompt passed to the image model.
+    :param model: The image model name.
+    :param options: Everything else that changes the output (config, n, bucket).
+    :return: A hex digest, or None for prompts with no content words.
+    """
+    normalized = normalize_image_prompt(prompt)
+    if not normalized:
+        return None
+    raw = f"{model}|{json.dumps(options, sort_keys=True, default=str)}|{normalized}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def content_address(data: bytes) -> str:
+    """Object name stem for image bytes; identical images share one object."""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+_cache: SqliteTTLCache | None = None
+
+
+def get_image_cache() -> SqliteTTLCache:
+    """Return the process-wide generated image cache."""
+    global _cache
+    if _cache is None:
+        _cache = SqliteTTLCache(
+            path=Config.IMAGE_CACHE_PATH,
+            namespace="generated_images",
+            ttl_seconds=Config.IMAGE_CACHE_TTL_SECONDS,
+            max_entries=Config.IMAGE_CACHE_MAX_ENTRIES,
+        )
+    return _cache
+
+
+def image_cache_stats() -> dict[str, Any]:
+    """Hit-rate statistics for the generated image cache, shared by all workers."""
+    return get_image_cache().stats()
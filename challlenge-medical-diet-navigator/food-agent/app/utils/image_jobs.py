@@ -0,0 +1,84 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from typing import Any
+
+# Background jobs outlive the chat turn that started them, and the event loop
+# of that turn may be closed as soon as the reply is sent. Jobs therefore run
+# on a private loop in a daemon thread, a bounded number at a time.
+
+
+class JobRunner:
+    """Runs coroutines on a private event loop, `max_concurrent` at a time."""
+
+    def __init__(
+        self, max_concurrent: int, max_pending: int, name: str = "jobs"
+    ) -> None:
+        """
+        :param max_concurrent: Jobs that may run at once; the rest wait their turn.
+        :param max_pending: Running plus waiting jobs; `submit` refuses beyond this.
+        :param name: Name of the loop thread.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name=self.name, daemon=True
+                ).start()
+                self._semaphore = asyncio.Semaphore(self.max_concurrent)
+                self._loop = loop
+            return self._loop
+
+    def submit(self, job: Callable[[], Awaitable[Any]]) -> Future | None:
+        """
+        Schedule `job()` and return its future, or None when the queue is full.
+        Safe to call from any thread or event loop.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+        return asyncio.run_coroutine_threadsafe(self._run(job), self._get_loop())
+
+    async def _run(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        assert self._semaphore is not None
+        try:
+            async with self._semaphore:
+                return await job()
+        except Exception:
+            # Nobody may ever look at the future, so make failures visible.
+            logging.exception(f"[{self.name}] background job failed")
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
@@ -0,0 +1,123 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+import re
+from typing import Any
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from app.config import Config
+from app.utils.cache_store import SqliteTTLCache
+
+# `google_search` is a built-in Gemini tool: the search runs inside the model
+# call, so the cache sits on the model call of the agent that owns the tool.
+# The stored response keeps its grounding metadata, so citations survive a hit.
+
+_FILLER_WORDS = frozenset(
+    "a an the please can could you tell me about is are does do what whats".split()
+)
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and filler words, collapse whitespace."""
+    words = _NON_ALNUM.sub(" ", text.lower()).split()
+    return " ".join(w for w in words if w not in _FILLER_WORDS)
+
+
+_cache: SqliteTTLCache | None = None
+
+
+def get_search_cache() -> SqliteTTLCache:
+    """Return the process-wide search result cache."""
+    global _cache
+    if _cache is None:
+        _cache = SqliteTTLCache(
+            path=Config.SEARCH_CACHE_PATH,
+            namespace="google_search",
+            ttl_seconds=Config.SEARCH_CACHE_TTL_SECONDS,
+            max_entries=Config.SEARCH_CACHE_MAX_ENTRIES,
+        )
+    return _cache
+
+
+def _cache_key(llm_request: LlmRequest) -> str | None:
+    """Key single-question requests on model + normalized question text."""
+    if not llm_request.contents:
+        return None
+    last = llm_request.contents[-1]
+    if last.role != "user" or not last.parts:
+        return None
+    if any(p.function_response or p.function_call for p in last.parts):
+        return None
+    text = " ".join(p.text for p in last.parts if p.text)
+    normalized = normalize_query(text)
+    if not normalized:
+        return None
+    # The instruction is part of the key: the same question asked with a
+    # different task (e.g. by the planner) gets its own entry.
+    config = llm_request.config
+    instruction = str(config.system_instruction or "") if config else ""
+    raw = f"{llm_request.model}|{instruction}|{normalized}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def before_model_search_cache(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> LlmResponse | None:
+    """Serve a stored grounded answer instead of calling the model."""
+    key = _cache_key(llm_request)
+    callback_context.state["temp:search_cache_key"] = key
+    if key is None:
+        return None
+    cached = get_search_cache().get(key)
+    if cached is None:
+        return None
+    logging.info(f"Search cache hit for {callback_context.agent_name}")
+    response = LlmResponse.model_validate(cached)
+    response.custom_metadata = {
+        **(response.custom_metadata or {}),
+        "search_cache": "hit",
+    }
+    return response
+
+
+def after_model_search_cache(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> LlmResponse | None:
+    """Store complete, successful answers together with their citations."""
+    key = callback_context.state.get("temp:search_cache_key")
+    if (
+        not key
+        or llm_response.partial
+        or llm_response.error_code
+        or not llm_response.content
+        or (llm_response.custom_metadata or {}).get("search_cache") == "hit"
+    ):
+        return None
+    parts = llm_response.content.parts or []
+    if not any(p.text for p in parts) or any(p.function_call for p in parts):
+        return None
+    payload = llm_response.model_dump(mode="json", exclude_none=True)
+    get_search_cache().set(key, payload)
+    return None
+
+
+def search_cache_stats() -> dict[str, Any]:
+    """Hit-rate statistics for the search result cache, shared by all workers."""
+    return get_search_cache().stats()
@@ -0,0 +1,191 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.trace import StatusCode
+
+# Head sampling has to decide before anything interesting has happened. This
+# processor holds a trace's spans until its local root span ends, then either
+# forwards all of them to the wrapped processor or drops all of them, so kept
+# traces are always complete.
+
+_TRACE_ID_BOUND = 1 << 64
+
+
+@dataclass
+class _PendingTrace:
+    first_seen: float
+    spans: list[ReadableSpan] = field(default_factory=list)
+    reason: str | None = None
+    start_ns: int | None = None
+    end_ns: int | None = None
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """
+    Buffers spans per trace and, when the trace's local root ends, always
+    keeps it if it errored, was slow or ran one of `keep_tools`; other traces
+    are kept at `sample_rate`. Kept traces go to `next_processor`.
+    """
+
+    def __init__(
+        self,
+        next_processor: SpanProcessor,
+        sample_rate: float = 0.1,
+        slow_ms: float = 5000,
+        keep_tools: Iterable[str] = (),
+        max_traces: int = 2000,
+        timeout_s: float = 120.0,
+    ) -> None:
+        """
+        :param next_processor: Receives the spans of kept traces, e.g. a BatchSpanProcessor.
+        :param sample_rate: Share of fast, successful traces to keep (0..1).
+        :param slow_ms: Traces at least this long are always kept.
+        :param keep_tools: Tool names whose traces are always kept.
+        :param max_traces: Traces buffered at once; the oldest is decided early beyond this.
+        :param timeout_s: A trace whose root has not ended after this long is decided early.
+        """
+        self.next_processor = next_processor
+        self.sample_rate = sample_rate
+        self.slow_ns = int(slow_ms * 1e6)
+        self.keep_tools = frozenset(keep_tools)
+        self.max_traces = max_traces
+        self.timeout_s = timeout_s
+        self._lock = threading.Lock()
+        self._pending: OrderedDict[int, _PendingTrace] = OrderedDict()
+        # Spans that end after their trace was decided follow that decision.
+        self._decided: OrderedDict[int, bool] = OrderedDict()
+        self._kept_traces: Counter[str] = Counter()
+        self._dropped_traces = 0
+        self._kept_spans = 0
+        self._dropped_spans = 0
+
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
+        self.next_processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        now = time.monotonic()
+        decided: list[tuple[int, _PendingTrace]] = []
+        late: bool | None = None
+        with self._lock:
+            if trace_id in self._decided:
+                late = self._decided[trace_id]
+            else:
+                pending = self._pending.get(trace_id)
+                if pending is None:
+                    pending = self._pending[trace_id] = _PendingTrace(first_seen=now)
+                self._add(pending, span)
+                if span.parent is None or span.parent.is_remote:
+                    decided.append((trace_id, self._pending.pop(trace_id)))
+                # Bound memory: decide traces whose root never ended (or ended
+                # in another process) with what has been seen so far.
+                while self._pending:
+                    oldest_id, oldest = next(iter(self._pending.items()))
+                    if (
+                        len(self._pending) <= self.max_traces
+                        and now - oldest.first_seen < self.timeout_s
+                    ):
+                        break
+                    decided.append((oldest_id, self._pending.pop(oldest_id)))
+        if late is not None:
+            self._record_late(span, late)
+            return
+        for decided_id, pending in decided:
+            self._finish(decided_id, pending)
+
+    def _add(self, pending: _PendingTrace, span: ReadableSpan) -> None:
+        pending.spans.append(span)
+        if span.start_time is not None:
+            pending.start_ns = min(pending.start_ns or span.start_time, span.start_time)
+        if span.end_time is not None:
+            pending.end_ns = max(pending.end_ns or span.end_time, span.end_time)
+        if pending.reason == "error":
+            return
+        if span.status.status_code is StatusCode.ERROR:
+            pending.reason = "error"
+        elif pending.reason is None and span.attributes:
+            tool = span.attributes.get("gen_ai.tool.name")
+            if tool in self.keep_tools:
+                pending.reason = "tool"
+
+    def _keep(self, trace_id: int, pending: _PendingTrace) -> str | None:
+        if pending.reason:
+            return pending.reason
+        if (
+            pending.start_ns is not None
+            and pending.end_ns is not None
+            and pending.end_ns - pending.start_ns >= self.slow_ns
+        ):
+            return "slow"
+        # Deterministic in the trace id, like TraceIdRatioBased.
+        if (trace_id & (_TRACE_ID_BOUND - 1)) < self.sample_rate * _TRACE_ID_BOUND:
+            return "sampled"
+        return None
+
+    def _finish(self, trace_id: int, pending: _PendingTrace) -> None:
+        reason = self._keep(trace_id, pending)
+        with self._lock:
+            self._decided[trace_id] = reason is not None
+            while len(self._decided) > 4 * self.max_traces:
+                self._decided.popitem(last=False)
+            if reason is None:
+                self._dropped_traces += 1
+                self._dropped_spans += len(pending.spans)
+            else:
+                self._kept_traces[reason] += 1
+                self._kept_spans += len(pending.spans)
+        if reason is not None:
+            for span in pending.spans:
+                self.next_processor.on_end(span)
+
+    def _record_late(self, span: ReadableSpan, keep: bool) -> None:
+        with self._lock:
+            if keep:
+                self._kept_spans += 1
+            else:
+                self._dropped_spans += 1
+        if keep:
+            self.next_processor.on_end(span)
+
+    def stats(self) -> dict[str, Any]:
+        """Kept and dropped counts since start, with why traces were kept."""
+        with self._lock:
+            return {
+                "kept_spans": self._kept_spans,
+                "dropped_spans": self._dropped_spans,
+                "kept_traces": dict(self._kept_traces),
+                "dropped_traces": self._dropped_traces,
+                "pending_traces": len(self._pending),
+            }
+
+    def shutdown(self) -> None:
+        """Decide every buffered trace, then shut the wrapped processor down."""
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+        for trace_id, trace in pending:
+            self._finish(trace_id, trace)
+        self.next_processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.next_processor.force_flush(timeout_millis)
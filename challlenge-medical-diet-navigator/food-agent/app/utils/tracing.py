@@ -12,16 +12,90 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gzip
+import hashlib
 import json
 import logging
+import threading
+import time
+from collections import Counter, OrderedDict
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import google.cloud.storage as storage
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud import logging as google_cloud_logging
 from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+from opentelemetry.sdk import util
+from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import ReadableSpan
 from opentelemetry.sdk.trace.export import SpanExportResult
+from opentelemetry.trace import format_span_id, format_trace_id
+
+MAX_LOG_ATTRIBUTES_BYTES = 255 * 1024
+# Attribute values larger than this are moved to GCS, leaving a preview.
+OFFLOAD_ATTRIBUTE_BYTES = 32 * 1024
+PREVIEW_CHARS = 512
+# Offloaded values are stored as gzip-compressed chunks named by their hash,
+# so payloads that share a prefix (system instruction, schema) share chunks.
+CHUNK_BYTES = 64 * 1024
+CHUNK_PREFIX = "span-chunks"
+# Hashes of chunks this process has stored, to skip re-uploading them.
+STORED_CHUNKS_MAX = 20_000
+# Cloud Logging accepts up to 10 MB per write; stay well below it.
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+# A missing bucket is re-checked after this long; an existing one never is.
+BUCKET_MISSING_RECHECK_S = 300.0
+LOG_LABELS = {
+    "type": "agent_telemetry",
+    "service_name": "my-agent-in-agent-engine",
+}
+
+
+def _json_value(value: Any) -> Any:
+    # Sequence attributes are tuples, which the Struct conversion rejects.
+    return list(value) if isinstance(value, tuple) else value
+
+
+def _format_attributes(attributes: Any) -> dict[str, Any]:
+    if not attributes:
+        return {}
+    return {key: _json_value(value) for key, value in attributes.items()}
+
+
+def _format_context(context: Any) -> dict[str, str]:
+    return {
+        "trace_id": f"0x{format_trace_id(context.trace_id)}",
+        "span_id": f"0x{format_span_id(context.span_id)}",
+        "trace_state": repr(context.trace_state),
+    }
+
+
+def attribute_size_bounds(attributes: dict[str, Any]) -> tuple[int, int]:
+    """
+    Cheap lower and upper bounds on the UTF-8 size of `attributes` as JSON,
+    from string lengths alone. Only when the limit falls between the two does
+    the exporter pay for an exact `json.dumps`.
+    """
+    chars = strings = scalars = 0
+    for key, value in attributes.items():
+        chars += len(key)
+        strings += 1
+        if isinstance(value, str):
+            chars += len(value)
+            strings += 1
+        elif isinstance(value, list | tuple):
+            for item in value:
+                if isinstance(item, str):
+                    chars += len(item)
+                    strings += 1
+                else:
+                    scalars += 1
+        else:
+            scalars += 1
+    # A character is at most 6 bytes once escaped; a scalar at most ~24.
+    return chars + scalars, 6 * chars + 4 * strings + 26 * scalars + 2
 
 
 class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
@@ -31,6 +105,11 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
 
     This class helps bypass the 256 character limit of Cloud Trace for attribute values
     by leveraging Cloud Logging (which has a 256KB limit) and Cloud Storage for larger payloads.
+
+    Log entries for one export call are written as a few batched requests, and
+    large attribute values are uploaded on a worker pool as compressed,
+    deduplicated chunks, so `export` only blocks on the batched log writes and
+    the Cloud Trace call.
     """
 
     def __init__(
@@ -39,6 +118,11 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         storage_client: storage.Client | None = None,
         bucket_name: str | None = None,
         debug: bool = False,
+        upload_workers: int = 4,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        offload_attribute_bytes: int = OFFLOAD_ATTRIBUTE_BYTES,
+        preview_chars: int = PREVIEW_CHARS,
+        chunk_bytes: int = CHUNK_BYTES,
         **kwargs: Any,
     ) -> None:
         """
@@ -48,6 +132,11 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         :param storage_client: Google Cloud Storage client
         :param bucket_name: Name of the GCS bucket to store large payloads
         :param debug: Enable debug mode for additional logging
+        :param upload_workers: Threads uploading large payloads to GCS
+        :param max_batch_bytes: Approximate size at which a log batch is written
+        :param offload_attribute_bytes: Attribute values above this go to GCS
+        :param preview_chars: Characters of an offloaded value kept in the log
+        :param chunk_bytes: Size of the content-hashed chunks stored in GCS
         :param kwargs: Additional arguments to pass to the parent class
         """
         super().__init__(**kwargs)
@@ -61,6 +150,69 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
             bucket_name or f"{self.project_id}-my-agent-in-agent-engine-logs-data"
         )
         self.bucket = self.storage_client.bucket(self.bucket_name)
+        self.max_batch_bytes = max_batch_bytes
+        self.offload_attribute_bytes = offload_attribute_bytes
+        self.preview_chars = preview_chars
+        self.chunk_bytes = chunk_bytes
+        self._stats_lock = threading.Lock()
+        self._stored_chunks: OrderedDict[str, None] = OrderedDict()
+        self._uploading: set[str] = set()
+        self._offload_stats: Counter[str] = Counter()
+        self._upload_pool = ThreadPoolExecutor(
+            max_workers=upload_workers, thread_name_prefix="span-payloads"
+        )
+        self._bucket_lock = threading.Lock()
+        self._bucket_exists: bool | None = None
+        self._bucket_checked_at = 0.0
+        self._resource: tuple[Resource, dict[str, Any]] | None = None
+
+    def _resource_dict(self, resource: Resource) -> dict[str, Any]:
+        # Every span of a process shares one Resource; format it once.
+        if self._resource is None or self._resource[0] is not resource:
+            self._resource = (
+                resource,
+                json.loads(resource.to_json(indent=None)),
+            )
+        return self._resource[1]
+
+    def span_to_dict(self, span: ReadableSpan) -> dict[str, Any]:
+        """
+        The fields of `json.loads(span.to_json())`, built directly from the
+        span instead of through a JSON string.
+        """
+        status: dict[str, Any] = {"status_code": span.status.status_code.name}
+        if span.status.description:
+            status["description"] = span.status.description
+        return {
+            "name": span.name,
+            "context": _format_context(span.context) if span.context else None,
+            "kind": str(span.kind),
+            "parent_id": f"0x{format_span_id(span.parent.span_id)}"
+            if span.parent
+            else None,
+            "start_time": util.ns_to_iso_str(span.start_time)
+            if span.start_time
+            else None,
+            "end_time": util.ns_to_iso_str(span.end_time) if span.end_time else None,
+            "status": status,
+            "attributes": _format_attributes(span.attributes),
+            "events": [
+                {
+                    "name": event.name,
+                    "timestamp": util.ns_to_iso_str(event.timestamp),
+                    "attributes": _format_attributes(event.attributes),
+                }
+                for event in span.events
+            ],
+            "links": [
+                {
+                    "context": _format_context(link.context),
+                    "attributes": _format_attributes(link.attributes),
+                }
+                for link in span.links
+            ],
+            "resource": self._resource_dict(span.resource),
+        }
 
     def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
         """
@@ -69,11 +221,13 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         :param spans: A sequence of spans to export
         :return: The result of the export operation
         """
+        batch = self.logger.batch()
+        batch_bytes = 0
         for span in spans:
             span_context = span.get_span_context()
             trace_id = format(span_context.trace_id, "x")
             span_id = format(span_context.span_id, "x")
-            span_dict = json.loads(span.to_json())
+            span_dict = self.span_to_dict(span)
 
             span_dict["trace"] = f"projects/{self.project_id}/traces/{trace_id}"
             span_dict["span_id"] = span_id
@@ -85,67 +239,212 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
             if self.debug:
                 print(span_dict)
 
-            # Log the span data to Google Cloud Logging
-            self.logger.log_struct(
-                span_dict,
-                labels={
-                    "type": "agent_telemetry",
-                    "service_name": "my-agent-in-agent-engine",
-                },
-                severity="INFO",
-            )
+            # Write what is batched before this entry would push it over the
+            # limit, so an oversized entry is sent alone and only it can fail.
+            entry_bytes = self._entry_bytes(span_dict)
+            if batch_bytes + entry_bytes > self.max_batch_bytes:
+                self._commit(batch)
+                batch = self.logger.batch()
+                batch_bytes = 0
+            batch.log_struct(span_dict, labels=LOG_LABELS, severity="INFO")
+            batch_bytes += entry_bytes
+        self._commit(batch)
         # Export spans to Google Cloud Trace using the parent class method
         return super().export(spans)
 
-    def store_in_gcs(self, content: str, span_id: str) -> str:
-        """
-        Initiate storing large content in Google Cloud Storage/
+    def _entry_bytes(self, span_dict: dict[str, Any]) -> int:
+        """Size of a log entry: estimated, or exact when it may be near the limit."""
+        # Attributes dominate an entry; add a little for the envelope.
+        low, high = attribute_size_bounds(span_dict["attributes"])
+        if high + 1024 < self.max_batch_bytes:
+            return low + 1024
+        return (
+            len(json.dumps(span_dict, ensure_ascii=False, default=str).encode()) + 1024
+        )
 
-        :param content: The content to store
-        :param span_id: The ID of the span
-        :return: The  GCS URI of the stored content
-        """
-        if not self.storage_client.bucket(self.bucket_name).exists():
+    def _commit(self, batch: Any) -> None:
+        if not batch.entries:
+            return
+        try:
+            batch.commit()
+        except Exception as e:
+            # Losing the log copy must not stop the spans reaching Cloud Trace.
             logging.warning(
-                f"Bucket {self.bucket_name} not found. "
-                "Unable to store span attributes in GCS."
+                f"Failed to write {len(batch.entries)} span log entries: {e}"
             )
-            return "GCS bucket not found"
 
-        blob_name = f"spans/{span_id}.json"
-        blob = self.bucket.blob(blob_name)
+    def shutdown(self) -> None:
+        """Wait for pending payload uploads."""
+        self._upload_pool.shutdown(wait=True)
+        super().shutdown()
+
+    def bucket_exists(self) -> bool:
+        """Whether the payload bucket exists, checked once and then cached."""
+        with self._bucket_lock:
+            now = time.monotonic()
+            if self._bucket_exists is None or (
+                not self._bucket_exists
+                and now - self._bucket_checked_at > BUCKET_MISSING_RECHECK_S
+            ):
+                self._bucket_exists = self.bucket.exists()
+                self._bucket_checked_at = now
+                if not self._bucket_exists:
+                    logging.warning(
+                        f"Bucket {self.bucket_name} not found. "
+                        "Unable to store span attributes in GCS."
+                    )
+            return bool(self._bucket_exists)
+
+    def store_chunks(self, data: bytes, content_type: str) -> list[str]:
+        """
+        Split `data` into fixed-size chunks and store each gzip-compressed
+        under the hash of its bytes. Chunks already stored (e.g. the schema
+        and instructions every prompt starts with) are not uploaded again.
+        Uploads run on a worker pool; a chunk counts as stored only once its
+        upload succeeded, so a failed one is retried by the next export.
+
+        :param data: The payload to store
+        :param content_type: Content type of the payload
+        :return: The chunk hashes, in order
+        """
+        hashes = []
+        for start in range(0, len(data), self.chunk_bytes):
+            chunk = data[start : start + self.chunk_bytes]
+            digest = hashlib.sha256(chunk).hexdigest()[:32]
+            hashes.append(digest)
+            with self._stats_lock:
+                known = digest in self._stored_chunks or digest in self._uploading
+                if known:
+                    if digest in self._stored_chunks:
+                        self._stored_chunks.move_to_end(digest)
+                    self._offload_stats["chunks_deduplicated"] += 1
+                else:
+                    self._uploading.add(digest)
+            if not known:
+                self._upload_pool.submit(
+                    self._upload_chunk, chunk, digest, content_type
+                )
+        return hashes
+
+    def _upload_chunk(self, chunk: bytes, digest: str, content_type: str) -> None:
+        blob_name = f"{CHUNK_PREFIX}/{digest}.gz"
+        try:
+            compressed = gzip.compress(chunk, compresslevel=6, mtime=0)
+            blob = self.bucket.blob(blob_name)
+            # Served decompressed to clients that do not accept gzip.
+            blob.content_encoding = "gzip"
+            try:
+                blob.upload_from_string(
+                    compressed, content_type=content_type, if_generation_match=0
+                )
+            except PreconditionFailed:
+                pass  # Stored by an earlier export or another worker.
+            with self._stats_lock:
+                self._stored_chunks[digest] = None
+                if len(self._stored_chunks) > STORED_CHUNKS_MAX:
+                    self._stored_chunks.popitem(last=False)
+                self._offload_stats["chunks_uploaded"] += 1
+                self._offload_stats["stored_bytes"] += len(compressed)
+        except Exception as e:
+            logging.warning(f"Failed to store span payload chunk {blob_name}: {e}")
+        finally:
+            with self._stats_lock:
+                self._uploading.discard(digest)
+
+    def _offload(self, key: str, value: Any) -> dict[str, Any]:
+        """Store one attribute value in GCS and return its manifest."""
+        if isinstance(value, str):
+            data, content_type = value.encode(), "text/plain; charset=utf-8"
+        else:
+            data, content_type = json.dumps(value).encode(), "application/json"
+        chunks = self.store_chunks(data, content_type)
+        with self._stats_lock:
+            self._offload_stats["attributes_offloaded"] += 1
+            self._offload_stats["offloaded_bytes"] += len(data)
+        return {
+            "key": key,
+            "bytes": len(data),
+            "content_type": content_type,
+            "chunk_prefix": f"gs://{self.bucket_name}/{CHUNK_PREFIX}/",
+            "chunks": chunks,
+        }
 
-        blob.upload_from_string(content, "application/json")
-        return f"gs://{self.bucket_name}/{blob_name}"
+    def offload_stats(self) -> dict[str, int]:
+        """Bytes moved out of log entries and bytes actually written to GCS."""
+        with self._stats_lock:
+            return dict(self._offload_stats)
 
     def _process_large_attributes(self, span_dict: dict, span_id: str) -> dict:
         """
-        Process large attribute values by storing them in GCS if they exceed the size
-        limit of Google Cloud Logging.
+        Move oversized attribute values to GCS and keep a short preview of
+        each in the log entry, so entries stay far below the Cloud Logging
+        limit. A value is offloaded when it is larger than
+        `offload_attribute_bytes`; if the rest still exceeds the limit, the
+        largest remaining values follow.
 
         :param span_dict: The span data dictionary
-        :param trace_id: The trace ID
         :param span_id: The span ID
         :return: The updated span dictionary
         """
         attributes = span_dict["attributes"]
-        if len(json.dumps(attributes).encode()) > 255 * 1024:  # 250 KB
-            # Separate large payload from other attributes
-            attributes_payload = dict(attributes.items())
-            attributes_retain = dict(attributes.items())
-
-            # Store large payload in GCS
-            gcs_uri = self.store_in_gcs(json.dumps(attributes_payload), span_id)
-            attributes_retain["uri_payload"] = gcs_uri
-            attributes_retain["url_payload"] = (
-                f"https://storage.mtls.cloud.google.com/"
-                f"{self.bucket_name}/spans/{span_id}.json"
-            )
+        low, high = attribute_size_bounds(attributes)
+        if high <= self.offload_attribute_bytes:
+            return span_dict
 
-            span_dict["attributes"] = attributes_retain
-            logging.info(
-                "Length of payload span above 250 KB, storing attributes in GCS "
-                "to avoid large log entry errors"
+        sizes = {}
+        for key, value in attributes.items():
+            # Values near the preview length gain nothing from offloading.
+            if attribute_size_bounds({key: value})[1] <= 4 * self.preview_chars:
+                continue
+            sizes[key] = (
+                len(value.encode())
+                if isinstance(value, str)
+                else len(json.dumps(value, ensure_ascii=False).encode())
             )
+        oversized = {
+            k for k, size in sizes.items() if size > self.offload_attribute_bytes
+        }
+        remaining = low - sum(sizes[k] for k in oversized)
+        for key in sorted(sizes, key=sizes.__getitem__, reverse=True):
+            if remaining <= MAX_LOG_ATTRIBUTES_BYTES:
+                break
+            if key not in oversized:
+                oversized.add(key)
+                remaining -= sizes[key]
+        if not oversized or not self.bucket_exists():
+            return span_dict
 
+        retained = dict(attributes)
+        manifests = []
+        for key in sorted(oversized):
+            value = attributes[key]
+            manifests.append(self._offload(key, value))
+            text = value if isinstance(value, str) else json.dumps(value)
+            retained[key] = text[: self.preview_chars] + "…"
+        retained["offloaded_attributes"] = manifests
+        span_dict["attributes"] = retained
+        logging.debug(
+            f"Offloaded {len(manifests)} large attribute(s) of span {span_id} to GCS"
+        )
         return span_dict
+
+
+def load_offloaded_attribute(
+    storage_client: storage.Client, manifest: dict[str, Any]
+) -> str:
+    """
+    Reassemble an attribute value from its `offloaded_attributes` manifest:
+    the string itself, or the JSON text of any other value. The chunks are concatenated gzip members, so `gsutil cat` of the chunk
+    objects piped through `gunzip` gives the same result.
+    """
+    bucket_name, _, prefix = (
+        manifest["chunk_prefix"].removeprefix("gs://").partition("/")
+    )
+    bucket = storage_client.bucket(bucket_name)
+    data = b"".join(
+        gzip.decompress(
+            bucket.blob(f"{prefix}{digest}.gz").download_as_bytes(raw_download=True)
+        )
+        for digest in manifest["chunks"]
+    )
+    return data.decode()
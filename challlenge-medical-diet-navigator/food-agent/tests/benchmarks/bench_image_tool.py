@@ -0,0 +1,89 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark `generate_image_tool` against the previous flow with fake clients.
+
+The baseline replays what the tool did before: construct `genai.Client`
+twice and `storage.Client` once per image, read one stream, and upload each
+image inline before reading on. The current tool reuses pooled clients,
+runs one async stream per image and uploads on a worker pool.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any
+
+from app import image_agent
+from app.config import Config
+from tests.benchmarks.fakes import FakeGenaiClient, FakeStorageClient
+
+
+def baseline(prompt: str, n: int, args: argparse.Namespace) -> list[Any]:
+    FakeGenaiClient(construct_s=args.construct_s)
+    client = FakeGenaiClient(args.generate_s, construct_s=args.construct_s)
+    outputs = []
+    for _ in range(n):  # The model returns one image per stream.
+        for chunk in client.models.generate_content_stream(
+            model=image_agent.IMAGE_MODEL
+        ):
+            for part in chunk.candidates[0].content.parts:
+                storage_client = FakeStorageClient(args.upload_s, args.construct_s)
+                storage_client.bucket("b").blob(
+                    part.inline_data.data
+                ).upload_from_string(part.inline_data.data)
+                outputs.append(part)
+    return outputs
+
+
+def current(prompt: str, n: int, args: argparse.Namespace) -> list[Any]:
+    result = asyncio.run(image_agent.generate_image_tool(prompt, n=n, fresh=True))
+    assert result["status"] == "success", result
+    return result["images"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=3, help="Images per call")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--generate-s", type=float, default=0.5)
+    parser.add_argument("--upload-s", type=float, default=0.3)
+    parser.add_argument("--construct-s", type=float, default=0.05)
+    args = parser.parse_args()
+
+    Config.IMAGE_CACHE_ENABLED = False
+    image_agent._genai_client = FakeGenaiClient(args.generate_s, args.construct_s)  # type: ignore[assignment]
+    image_agent._storage_client = FakeStorageClient(args.upload_s, args.construct_s)
+
+    print(
+        f"n={args.n} generate={args.generate_s}s upload={args.upload_s}s "
+        f"client construction={args.construct_s}s, {args.runs} runs"
+    )
+    for name, fn in (("baseline", baseline), ("pooled+concurrent", current)):
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            images = fn("a healthy Mediterranean breakfast plate", args.n, args)
+            timings.append(time.perf_counter() - start)
+            assert len(images) == args.n
+        print(
+            f"{name:>18}: median {statistics.median(timings):.3f}s  "
+            f"min {min(timings):.3f}s  max {max(timings):.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
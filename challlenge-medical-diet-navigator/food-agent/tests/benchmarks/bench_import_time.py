@@ -0,0 +1,99 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cold import time of the `app` package, measured with `python -X importtime`
+in fresh interpreters.
+
+`import app` and utility imports such as `app.utils.tracing` no longer build
+the agent graph; `from app.agent import root_agent` still does, on first
+access. Each statement runs in its own subprocess, so nothing is shared
+between measurements. The top modules by self time show where the rest of a
+cold start goes.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+STATEMENTS = (
+    "import app",
+    "import app.utils.tracing",
+    "import app.agent",
+    "from app.agent import root_agent",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+_ROOT = Path(__file__).resolve().parents[2]
+
+
+def import_times(statement: str) -> tuple[float, Counter[str]]:
+    """Wall time in seconds, and self time in microseconds per top-level package."""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    env.setdefault("GOOGLE_CLOUD_PROJECT", "bench")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        cwd=_ROOT,
+        env=env,
+        check=True,
+    )
+    total_us = 0
+    self_us: Counter[str] = Counter()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, module = match.groups()
+        self_us[".".join(module.split(".")[:2])] += int(own)
+        # Top-level imports are indented by one space.
+        if len(indent) == 1:
+            total_us += int(cumulative)
+    return total_us / 1e6, self_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--top", type=int, default=5, help="modules listed per statement"
+    )
+    args = parser.parse_args()
+
+    print(f"{args.runs} runs per statement, {sys.executable}")
+    for statement in STATEMENTS:
+        totals = []
+        self_us: Counter[str] = Counter()
+        for _ in range(args.runs):
+            total, own = import_times(statement)
+            totals.append(total)
+            self_us = own
+        top = ", ".join(
+            f"{name} {us / 1e3:.0f}ms" for name, us in self_us.most_common(args.top)
+        )
+        print(
+            f"{statement:>34}: median {statistics.median(totals):.2f}s  "
+            f"min {min(totals):.2f}s  max {max(totals):.2f}s"
+        )
+        print(f"{'':>34}  {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-turn orchestration overhead of `root_agent`, driven through `Runner`.
+
+Every model is a `ScriptedLlm` that replays a fixed script per agent, the
+BigQuery toolset, dry-run client, Cloud Storage and image model are fakes,
+and sessions and artifacts are kept in memory. The scenario corpus covers a
+direct answer, routed and transferred BigQuery questions, the local allergen
+scan, the allergy research tool, image generation, the compound planner and
+a multi-turn conversation. Overhead is the turn's wall time minus the
+simulated model and query latency. A second pass under `tracemalloc` reports
+peak and retained memory per turn. A turn that calls an agent off-script, or
+leaves part of its script unused, fails the run, so the same corpus catches
+orchestration changes.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app import allergen_index, image_agent, sql_governor
+from app.config import Config
+from app.utils import search_cache
+from tests.benchmarks.fakes import (
+    FakeBigQueryClient,
+    FakeBigQueryToolset,
+    FakeGenaiClient,
+    FakeStorageClient,
+    ScriptedLlm,
+    call_response,
+    text_response,
+)
+
+MAIN = "main_agent"
+USDA = "usda_food_information_bigquery_agent"
+ALLERGY = "allergy_research_agent"
+IMAGE = "imagen_tool_agent"
+
+
+@dataclass
+class Turn:
+    prompt: str
+    script: dict[str, list[LlmResponse]]
+    # For subtracting simulated latency: BigQuery queries on the critical
+    # path, and model calls that overlap others (parallel branches).
+    queries: int = 0
+    parallel_model_calls: int = 0
+
+
+@dataclass
+class Scenario:
+    name: str
+    turns: list[Turn]
+
+
+def _sql(table: str, where: str) -> LlmResponse:
+    project, dataset = Config.GOOGLE_CLOUD_PROJECT, Config.DATASET_NAME
+    return call_response(
+        "execute_sql",
+        project_id=project,
+        query=f"SELECT fdc_id, description FROM `{project}.{dataset}.{table}` WHERE {where}",
+    )
+
+
+def scenarios() -> list[Scenario]:
+    """The fixed corpus; scripts list each agent's model responses in order."""
+    return [
+        Scenario(
+            "direct_answer",
+            [
+                Turn(
+                    "What is a balanced breakfast for someone with type 2 diabetes?",
+                    {MAIN: [text_response("Oats, eggs and berries.")]},
+                )
+            ],
+        ),
+        Scenario(
+            "routed_bigquery",
+            [
+                Turn(
+                    "How much protein per 100 g is in cooked lentils?",
+                    {
+                        USDA: [
+                            _sql("food", "description LIKE '%lentil%'"),
+                            text_response("About 9 g per 100 g."),
+                        ]
+                    },
+                    queries=1,
+                )
+            ],
+        ),
+        Scenario(
+            "transfer_bigquery",
+            [
+                Turn(
+                    "Which cheeses are good sources of calcium?",
+                    {
+                        MAIN: [call_response("transfer_to_agent", agent_name=USDA)],
+                        USDA: [
+                            _sql("food", "description LIKE '%cheese%'"),
+                            text_response("Parmesan and Gruyere."),
+                        ],
+                    },
+                    queries=1,
+                )
+            ],
+        ),
+        Scenario(
+            "allergen_scan",
+            [Turn("Does fdc_id 1 contain peanuts?", {})],
+        ),
+        Scenario(
+            "allergy_tool",
+            [
+                Turn(
+                    "Is it safe to eat oats if I have celiac disease?",
+                    {
+                        MAIN: [
+                            call_response(ALLERGY, request="oats and celiac disease"),
+                            text_response("Only certified gluten-free oats."),
+                        ],
+                        ALLERGY: [text_response("Oats are often cross-contaminated.")],
+                    },
+                )
+            ],
+        ),
+        Scenario(
+            "image",
+            [
+                Turn(
+                    "Generate an image of a colourful quinoa salad",
+                    {
+                        IMAGE: [
+                            call_response(
+                                image_agent.image_tool.__name__, prompt="quinoa salad"
+                            ),
+                            text_response("Here is your salad."),
+                        ]
+                    },
+                )
+            ],
+        ),
+        Scenario(
+            "compound_planner",
+            [
+                Turn(
+                    "List the top 5 high-protein snacks that are safe for someone "
+                    "with a peanut allergy",
+                    {
+                        "planner_data_branch": [
+                            _sql("food", "description LIKE '%snack%'"),
+                            text_response("Greek yogurt, jerky, edamame."),
+                        ],
+                        "planner_allergy_branch": [
+                            text_response("Avoid peanuts and satay.")
+                        ],
+                        "planner_merge_agent": [
+                            text_response("Greek yogurt, jerky, edamame.")
+                        ],
+                    },
+                    queries=1,
+                    parallel_model_calls=1,
+                )
+            ],
+        ),
+        Scenario(
+            "conversation",
+            [
+                Turn(prompt, {MAIN: [text_response(answer)]})
+                for prompt, answer in (
+                    (
+                        "What is a balanced breakfast for someone with type 2 diabetes?",
+                        "Oats.",
+                    ),
+                    ("And what about a light dinner?", "Grilled fish and greens."),
+                    (
+                        "Could I swap the fish for something vegetarian?",
+                        "Tofu or tempeh.",
+                    ),
+                    ("Thanks, anything to drink with it?", "Water or unsweetened tea."),
+                )
+            ],
+        ),
+    ]
+
+
+@dataclass
+class TurnResult:
+    elapsed_s: list[float] = field(default_factory=list)
+    overhead_s: list[float] = field(default_factory=list)
+    events: int = 0
+    model_calls: int = 0
+    function_calls: int = 0
+    peak_bytes: int = 0
+    retained_bytes: int = 0
+
+
+def build_root_agent(query_s: float, rows: int) -> Any:
+    """The real agent graph, wired to fakes."""
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", Config.GOOGLE_CLOUD_PROJECT)
+    from app import agent, bq_agent
+
+    # The graph is built lazily, so the toolset getter can be swapped first.
+    bq_agent.get_bq_tools = lambda: FakeBigQueryToolset(query_s, rows)  # type: ignore[assignment]
+    sql_governor._bq_client = FakeBigQueryClient()
+    image_agent._genai_client = FakeGenaiClient(0.0)  # type: ignore[assignment]
+    image_agent._storage_client = FakeStorageClient(0.0, exists_s=0.0)
+    allergen_index._index = allergen_index.AllergenIndex.from_rows(
+        [{"fdc_id": 1, "description": "Peanut butter, smooth style"}]
+    )
+    Config.IMAGE_CACHE_ENABLED = False
+    Config.IMAGE_VARIANTS_ENABLED = False
+    return agent.get_root_agent()
+
+
+async def run_turn(
+    runner: Runner, session_id: str, turn: Turn, scenario: str
+) -> tuple[float, int, int]:
+    """Elapsed seconds, events and function calls for one turn."""
+    ScriptedLlm.load(turn.script)
+    message = types.Content(role="user", parts=[types.Part.from_text(text=turn.prompt)])
+    events = calls = 0
+    start = time.perf_counter()
+    async for event in runner.run_async(
+        user_id="bench", session_id=session_id, new_message=message
+    ):
+        events += 1
+        calls += len(event.get_function_calls())
+    elapsed = time.perf_counter() - start
+    if ScriptedLlm.unscripted or ScriptedLlm.remaining():
+        raise AssertionError(
+            f"{scenario}: turn {turn.prompt!r} left script {ScriptedLlm.remaining()} "
+            f"and made unscripted calls {dict(ScriptedLlm.unscripted)}"
+        )
+    return elapsed, events, calls
+
+
+async def run_pass(
+    root_agent: Any,
+    args: argparse.Namespace,
+    results: dict[tuple[str, int], TurnResult] | None,
+    trace_memory: bool = False,
+) -> None:
+    # A fresh search cache per pass, so allergy answers are never cache hits.
+    with tempfile.TemporaryDirectory() as cache_dir:
+        Config.SEARCH_CACHE_PATH = os.path.join(cache_dir, "search.sqlite3")
+        search_cache._cache = None
+        runner = Runner(
+            app_name="bench",
+            agent=root_agent,
+            session_service=InMemorySessionService(),
+            artifact_service=InMemoryArtifactService(),
+        )
+        for scenario in scenarios():
+            session = await runner.session_service.create_session(
+                app_name="bench", user_id="bench"
+            )
+            for index, turn in enumerate(scenario.turns):
+                if trace_memory:
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                elapsed, events, calls = await run_turn(
+                    runner, session.id, turn, scenario.name
+                )
+                if results is None:
+                    continue
+                result = results[(scenario.name, index)]
+                if trace_memory:
+                    current, peak = tracemalloc.get_traced_memory()
+                    result.peak_bytes = peak - before
+                    result.retained_bytes = current - before
+                    continue
+                model_calls = sum(ScriptedLlm.calls.values())
+                simulated = (model_calls - turn.parallel_model_calls) * args.llm_s
+                simulated += turn.queries * args.query_s
+                result.elapsed_s.append(elapsed)
+                result.overhead_s.append(elapsed - simulated)
+                result.events, result.function_calls = events, calls
+                result.model_calls = model_calls
+        search_cache._cache = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--llm-s", type=float, default=0.0, help="simulated latency per model call"
+    )
+    parser.add_argument(
+        "--query-s", type=float, default=0.0, help="simulated BigQuery latency"
+    )
+    parser.add_argument("--rows", type=int, default=10, help="rows per query result")
+    args = parser.parse_args()
+
+    # ADK's ParallelAgent ends some spans from another task's context; OTel
+    # logs each one as an error, which would bury the table.
+    logging.getLogger("opentelemetry.context").setLevel(logging.CRITICAL)
+    ScriptedLlm.install(args.llm_s)
+    root_agent = build_root_agent(args.query_s, args.rows)
+    results: dict[tuple[str, int], TurnResult] = defaultdict(TurnResult)
+
+    async def measure() -> None:
+        for _ in range(args.warmup):
+            await run_pass(root_agent, args, None)
+        for _ in range(args.runs):
+            await run_pass(root_agent, args, results)
+        tracemalloc.start()
+        try:
+            await run_pass(root_agent, args, results, trace_memory=True)
+        finally:
+            tracemalloc.stop()
+
+    asyncio.run(measure())
+    # Image jobs finish on their own thread after the turn has replied.
+    jobs = image_agent._get_job_runner()
+    while jobs.pending:
+        time.sleep(0.01)
+
+    print(
+        f"root_agent={root_agent.name}; {args.runs} runs after {args.warmup} warmup; "
+        f"model {args.llm_s}s/call, query {args.query_s}s"
+    )
+    print(
+        f"{'scenario':<22}{'turn':>5}{'events':>8}{'model':>7}{'fcalls':>8}"
+        f"{'overhead ms':>13}{'p95 ms':>9}{'peak KiB':>10}{'kept KiB':>10}"
+    )
+    for (name, index), result in results.items():
+        overhead = sorted(result.overhead_s)
+        p95 = overhead[min(len(overhead) - 1, round(0.95 * (len(overhead) - 1)))]
+        print(
+            f"{name:<22}{index:>5}{result.events:>8}{result.model_calls:>7}"
+            f"{result.function_calls:>8}{statistics.median(overhead) * 1e3:>13.2f}"
+            f"{p95 * 1e3:>9.2f}{result.peak_bytes / 1024:>10.0f}"
+            f"{result.retained_bytes / 1024:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
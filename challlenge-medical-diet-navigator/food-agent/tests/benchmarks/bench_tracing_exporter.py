@@ -0,0 +1,162 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Spans/sec through `CloudTraceLoggingSpanExporter.export` with fake clients.
+
+The baseline replays the original per-span path: a `to_json()` round trip, a
+full `json.dumps` to measure size, one `log_struct` request per span, and a
+`bucket.exists()` plus inline upload of all attributes for every large span,
+which also stay in the log entry. The current exporter builds dicts
+directly, writes batched log requests, and uploads only oversized values,
+gzip-compressed and deduplicated by chunk hash, on a worker pool. Both pay
+the same (fake) Cloud Trace call per export. Log and GCS bytes are totals
+for one pass over the spans.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import string
+import time
+from collections.abc import Sequence
+
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+
+from app.utils.tracing import CloudTraceLoggingSpanExporter
+from tests.benchmarks.fakes import FakeLoggingClient, FakeStorageClient, FakeTraceClient
+
+_VOCABULARY = [
+    "".join(random.Random(i).choices(string.ascii_lowercase, k=3 + i % 8))
+    for i in range(2000)
+]
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(_VOCABULARY) for _ in range(count))
+
+
+def synthetic_spans(count: int, large_every: int, seed: int = 0) -> list[ReadableSpan]:
+    """
+    Agent-like spans: LLM requests of a few KB, and every Nth one ~300 KB
+    that starts with the same instructions and schema, like the BigQuery
+    agent's requests do.
+    """
+    rng = random.Random(seed)
+    schema = _words(random.Random(-1), 40_000)
+    tracer = TracerProvider().get_tracer("bench")
+    spans: list[ReadableSpan] = []
+    for i in range(count):
+        if large_every and i % large_every == 0:
+            request = schema + _words(rng, 2_000)
+        else:
+            request = _words(rng, rng.randint(150, 1_200))
+        with tracer.start_as_current_span(f"call_llm {i}") as span:
+            span.set_attribute("gen_ai.system", "gcp.vertex.agent")
+            span.set_attribute("gen_ai.request.model", "gemini-2.5-flash")
+            span.set_attribute("gcp.vertex.agent.llm_request", request)
+            span.set_attribute("gcp.vertex.agent.event_id", f"evt-{i}")
+            span.set_attribute("tools", ("execute_sql", "get_table_info"))
+            span.add_event("llm_response", {"tokens": 128})
+        assert isinstance(span, ReadableSpan)
+        spans.append(span)
+    return spans
+
+
+class BaselineExporter(CloudTraceLoggingSpanExporter):
+    """The exporter as it was before batching and chunked offload."""
+
+    def export(self, spans: Sequence[ReadableSpan]):  # type: ignore[no-untyped-def]
+        for span in spans:
+            span_context = span.get_span_context()
+            assert span_context is not None
+            trace_id = format(span_context.trace_id, "x")
+            span_id = format(span_context.span_id, "x")
+            span_dict = json.loads(span.to_json())
+            span_dict["trace"] = f"projects/{self.project_id}/traces/{trace_id}"
+            span_dict["span_id"] = span_id
+            attributes = span_dict["attributes"]
+            if len(json.dumps(attributes).encode()) > 255 * 1024:
+                if self.storage_client.bucket(self.bucket_name).exists():
+                    self.bucket.blob(f"spans/{span_id}.json").upload_from_string(
+                        json.dumps(attributes), "application/json"
+                    )
+                attributes["uri_payload"] = (
+                    f"gs://{self.bucket_name}/spans/{span_id}.json"
+                )
+            self.logger.log_struct(span_dict, labels={}, severity="INFO")
+        return super(CloudTraceLoggingSpanExporter, self).export(spans)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spans", type=int, default=2048)
+    parser.add_argument(
+        "--batch-size", type=int, default=512, help="BatchSpanProcessor default"
+    )
+    parser.add_argument(
+        "--large-every", type=int, default=50, help="0 disables large spans"
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--log-write-s", type=float, default=0.005)
+    parser.add_argument("--trace-write-s", type=float, default=0.02)
+    parser.add_argument("--upload-s", type=float, default=0.05)
+    parser.add_argument("--exists-s", type=float, default=0.02)
+    args = parser.parse_args()
+
+    spans = synthetic_spans(args.spans, args.large_every)
+    batches = [
+        spans[i : i + args.batch_size] for i in range(0, len(spans), args.batch_size)
+    ]
+    print(
+        f"{args.spans} spans in batches of {args.batch_size}, large every {args.large_every}; "
+        f"log write {args.log_write_s}s, trace write {args.trace_write_s}s, "
+        f"upload {args.upload_s}s, exists {args.exists_s}s; {args.runs} runs"
+    )
+    for name, cls in (
+        ("baseline", BaselineExporter),
+        ("current", CloudTraceLoggingSpanExporter),
+    ):
+        rates = []
+        for run in range(args.runs + 1):
+            # The last run only counts bytes; serializing entries would skew timing.
+            sizing = run == args.runs
+            logging_client = FakeLoggingClient(args.log_write_s, count_bytes=sizing)
+            storage_client = FakeStorageClient(args.upload_s, exists_s=args.exists_s)
+            exporter = cls(
+                project_id="bench",
+                client=FakeTraceClient(args.trace_write_s),
+                logging_client=logging_client,  # type: ignore[arg-type]
+                storage_client=storage_client,
+                bucket_name="bench-logs",
+            )
+            start = time.perf_counter()
+            for batch in batches:
+                exporter.export(batch)
+            # Time on the export thread; pending uploads finish in the background.
+            elapsed = time.perf_counter() - start
+            exporter.shutdown()
+            if not sizing:
+                rates.append(len(spans) / elapsed)
+        print(
+            f"{name:>9}: median {statistics.median(rates):,.0f} spans/s  "
+            f"min {min(rates):,.0f}  max {max(rates):,.0f}  "
+            f"log {logging_client.written_bytes / 2**20:.1f} MiB  "
+            f"GCS {storage_client.stored_bytes / 2**20:.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
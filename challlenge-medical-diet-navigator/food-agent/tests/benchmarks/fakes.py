@@ -0,0 +1,423 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Latency-simulating stand-ins for the Google Cloud clients and the model."""
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
+from types import SimpleNamespace
+from typing import Any, ClassVar
+
+from google.adk.artifacts import BaseArtifactService
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.adk.tools import BaseTool, FunctionTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.genai import errors, types
+
+_counter = itertools.count()
+
+
+def _image_chunk() -> Any:
+    part = types.Part.from_bytes(
+        data=f"img-{next(_counter)}".encode(), mime_type="image/png"
+    )
+    return SimpleNamespace(
+        candidates=[SimpleNamespace(content=types.Content(role="model", parts=[part]))]
+    )
+
+
+class FakeGenaiClient:
+    """`genai.Client` whose image streams take `generate_s` to produce an image."""
+
+    def __init__(self, generate_s: float = 0.5, construct_s: float = 0.0) -> None:
+        time.sleep(construct_s)
+        self.generate_s = generate_s
+        self.models = SimpleNamespace(generate_content_stream=self._stream)
+        self.aio = SimpleNamespace(
+            models=SimpleNamespace(generate_content_stream=self._astream)
+        )
+
+    def _stream(self, **kwargs: Any) -> Iterator[Any]:
+        time.sleep(self.generate_s)
+        yield _image_chunk()
+
+    async def _astream(self, **kwargs: Any) -> AsyncIterator[Any]:
+        async def stream() -> AsyncIterator[Any]:
+            await asyncio.sleep(self.generate_s)
+            yield _image_chunk()
+
+        return stream()
+
+
+class FakeBlob:
+    def __init__(
+        self, upload_s: float, client: "FakeStorageClient | None" = None
+    ) -> None:
+        self.upload_s = upload_s
+        self.client = client
+
+    def upload_from_string(self, data: bytes | str, *args: Any, **kwargs: Any) -> None:
+        time.sleep(self.upload_s)
+        if self.client is not None:
+            self.client.stored_bytes += len(data)
+
+
+class FakeStorageClient:
+    """`storage.Client` whose uploads block for `upload_s`, bucket lookups for `exists_s`."""
+
+    def __init__(
+        self, upload_s: float = 0.3, construct_s: float = 0.0, exists_s: float = 0.02
+    ) -> None:
+        time.sleep(construct_s)
+        self.upload_s = upload_s
+        self.exists_s = exists_s
+        self.stored_bytes = 0
+
+    def _exists(self) -> bool:
+        time.sleep(self.exists_s)
+        return True
+
+    def bucket(self, name: str) -> Any:
+        return SimpleNamespace(
+            name=name,
+            blob=lambda blob_name: FakeBlob(self.upload_s, self),
+            exists=self._exists,
+        )
+
+
+class FakeLogBatch:
+    def __init__(self, client: "FakeLoggingClient") -> None:
+        self.client = client
+        self.entries: list[Any] = []
+
+    def log_struct(self, info: dict, **kwargs: Any) -> None:
+        self.entries.append(info)
+
+    def commit(self, **kwargs: Any) -> None:
+        for entry in self.entries:
+            self.client.write(entry, sleep=False)
+        time.sleep(self.client.write_s)
+        self.entries = []
+
+
+class FakeLoggingClient:
+    """
+    `logging.Client` whose every write request (single or batch) takes
+    `write_s`. With `count_bytes`, the JSON size of the entries is summed.
+    """
+
+    def __init__(self, write_s: float = 0.005, count_bytes: bool = False) -> None:
+        self.write_s = write_s
+        self.count_bytes = count_bytes
+        self.written_bytes = 0
+
+    def write(self, info: dict, sleep: bool = True) -> None:
+        if self.count_bytes:
+            self.written_bytes += len(json.dumps(info))
+        if sleep:
+            time.sleep(self.write_s)
+
+    def logger(self, name: str) -> Any:
+        return SimpleNamespace(
+            log_struct=lambda info, **kwargs: self.write(info),
+            batch=lambda: FakeLogBatch(self),
+        )
+
+
+class FakeTraceClient:
+    """`TraceServiceClient` whose `batch_write_spans` takes `write_s`."""
+
+    def __init__(self, write_s: float = 0.02) -> None:
+        self.write_s = write_s
+
+    def batch_write_spans(self, **kwargs: Any) -> None:
+        time.sleep(self.write_s)
+
+
+_AGENT_NAME = re.compile(r'Your internal name is "([^"]+)"')
+
+
+def text_response(text: str) -> LlmResponse:
+    return LlmResponse(
+        content=types.Content(role="model", parts=[types.Part.from_text(text=text)])
+    )
+
+
+def call_response(name: str, **args: Any) -> LlmResponse:
+    return LlmResponse(
+        content=types.Content(
+            role="model", parts=[types.Part.from_function_call(name=name, args=args)]
+        )
+    )
+
+
+class ScriptedLlm(BaseLlm):
+    """
+    Model that replays scripted responses per agent, taking `latency_s` per
+    call. The calling agent is read from the identity line ADK puts in the
+    system instruction. `install()` serves every `gemini-*` model with it,
+    including the tiers behind `CascadeLlm`.
+    """
+
+    latency_s: ClassVar[float] = 0.0
+    _script: ClassVar[dict[str, deque[LlmResponse]]] = {}
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+    calls: ClassVar[Counter[str]] = Counter()
+    unscripted: ClassVar[Counter[str]] = Counter()
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        # Same pattern as Gemini, so registering replaces it.
+        return [r"gemini-.*"]
+
+    @classmethod
+    def install(cls, latency_s: float = 0.0) -> None:
+        cls.latency_s = latency_s
+        LLMRegistry.register(cls)
+        LLMRegistry.resolve.cache_clear()
+
+    @classmethod
+    def load(cls, script: dict[str, list[LlmResponse]]) -> None:
+        """Queue responses per agent name, replacing what is left."""
+        with cls._lock:
+            cls._script = {
+                agent: deque(responses) for agent, responses in script.items()
+            }
+            cls.calls.clear()
+            cls.unscripted.clear()
+
+    @classmethod
+    def remaining(cls) -> dict[str, int]:
+        with cls._lock:
+            return {agent: len(queue) for agent, queue in cls._script.items() if queue}
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        config = llm_request.config
+        instruction = config.system_instruction if config else None
+        match = _AGENT_NAME.search(str(instruction or ""))
+        agent = match.group(1) if match else "?"
+        with self._lock:
+            self.calls[agent] += 1
+            queue = self._script.get(agent)
+            response = queue.popleft() if queue else None
+            if response is None:
+                self.unscripted[agent] += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        if response is None:
+            response = text_response(f"(unscripted reply from {agent})")
+        yield response.model_copy(deep=True)
+
+
+class FakeBigQueryClient:
+    """`bigquery.Client` for the governor's dry runs; every query scans `bytes_scanned`."""
+
+    def __init__(self, bytes_scanned: int = 10 * 1024**2) -> None:
+        self.bytes_scanned = bytes_scanned
+
+    def query(self, sql: str, job_config: Any = None) -> Any:
+        return SimpleNamespace(total_bytes_processed=self.bytes_scanned)
+
+
+class FakeBigQueryToolset(BaseToolset):
+    """
+    The BigQuery toolset's tool names and signatures, answering with canned
+    rows after `query_s`.
+    """
+
+    def __init__(self, query_s: float = 0.0, rows: int = 10) -> None:
+        super().__init__()
+        self.query_s = query_s
+        self.rows = rows
+
+    async def get_tools(self, readonly_context: Any = None) -> list[BaseTool]:
+        def execute_sql(project_id: str, query: str) -> dict:
+            """Run a BigQuery SQL query in the project and return the result."""
+            time.sleep(self.query_s)
+            return {
+                "status": "SUCCESS",
+                "rows": [
+                    {"fdc_id": 1000 + i, "description": f"food {i}"}
+                    for i in range(self.rows)
+                ],
+            }
+
+        def list_table_ids(project_id: str, dataset_id: str) -> list[str]:
+            """List table ids in a BigQuery dataset."""
+            return ["food", "food_nutrient", "nutrient"]
+
+        def get_table_info(project_id: str, dataset_id: str, table_id: str) -> dict:
+            """Get metadata information about a BigQuery table."""
+            return {"table_id": table_id, "num_rows": 1000}
+
+        return [FunctionTool(f) for f in (execute_sql, list_table_ids, get_table_info)]
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalArtifactService(BaseArtifactService):
+    """
+    `GcsArtifactService` on a local directory: same object layout
+    (`app/user/{session|user}/filename/version`), `latency_s` per call and a
+    count of calls per method.
+    """
+
+    def __init__(self, root: str, latency_s: float = 0.0) -> None:
+        self.root = root
+        self.latency_s = latency_s
+        self.calls: Counter[str] = Counter()
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+    def _dir(self, app_name: str, user_id: str, session_id: str, filename: str) -> str:
+        scope = "user" if filename.startswith("user:") else session_id
+        return os.path.join(self.root, app_name, user_id, scope, filename)
+
+    def _versions(self, path: str) -> list[int]:
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(name) for name in os.listdir(path) if name.isdigit())
+
+    async def save_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        artifact: types.Part,
+    ) -> int:
+        await self._call("save_artifact")
+        inline = artifact.inline_data
+        if inline is None or inline.data is None:
+            raise ValueError("only inline artifacts are supported")
+        path = self._dir(app_name, user_id, session_id, filename)
+        versions = self._versions(path)
+        version = max(versions) + 1 if versions else 0
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"{version}.mime"), "w") as f:
+            f.write(inline.mime_type or "")
+        with open(os.path.join(path, str(version)), "wb") as f:
+            f.write(inline.data)
+        return version
+
+    async def load_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        version: int | None = None,
+    ) -> types.Part | None:
+        await self._call("load_artifact")
+        path = self._dir(app_name, user_id, session_id, filename)
+        versions = self._versions(path)
+        if version is None:
+            if not versions:
+                return None
+            version = versions[-1]
+        if version not in versions:
+            return None
+        with open(os.path.join(path, f"{version}.mime")) as f:
+            mime_type = f.read()
+        with open(os.path.join(path, str(version)), "rb") as f:
+            return types.Part.from_bytes(data=f.read(), mime_type=mime_type)
+
+    async def list_artifact_keys(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> list[str]:
+        await self._call("list_artifact_keys")
+        filenames: set[str] = set()
+        for scope in (session_id, "user"):
+            path = os.path.join(self.root, app_name, user_id, scope)
+            if os.path.isdir(path):
+                filenames.update(
+                    n for n in os.listdir(path) if self._versions(os.path.join(path, n))
+                )
+        return sorted(filenames)
+
+    async def delete_artifact(
+        self, *, app_name: str, user_id: str, session_id: str, filename: str
+    ) -> None:
+        await self._call("delete_artifact")
+        path = self._dir(app_name, user_id, session_id, filename)
+        for name in os.listdir(path) if os.path.isdir(path) else []:
+            os.remove(os.path.join(path, name))
+
+    async def list_versions(
+        self, *, app_name: str, user_id: str, session_id: str, filename: str
+    ) -> list[int]:
+        await self._call("list_versions")
+        return self._versions(self._dir(app_name, user_id, session_id, filename))
+
+
+class FakeAgentEngines:
+    """`vertexai.Client().agent_engines`: engines in a dict, calls counted per method."""
+
+    def __init__(self) -> None:
+        self.engines: dict[str, Any] = {}
+        self.calls: Counter[str] = Counter()
+        self.filters: list[str | None] = []
+
+    def _engine(self, name: str, display_name: str | None) -> Any:
+        engine = SimpleNamespace(
+            api_resource=SimpleNamespace(name=name, display_name=display_name)
+        )
+        self.engines[name] = engine
+        return engine
+
+    def get(self, *, name: str, config: Any = None) -> Any:
+        self.calls["get"] += 1
+        if name not in self.engines:
+            raise errors.ClientError(
+                404, {"error": {"code": 404, "status": "NOT_FOUND"}}
+            )
+        return self.engines[name]
+
+    def list(self, *, config: dict | None = None) -> Iterator[Any]:
+        self.calls["list"] += 1
+        name_filter = (config or {}).get("filter")
+        self.filters.append(name_filter)
+        for engine in list(self.engines.values()):
+            if (
+                not name_filter
+                or name_filter == f'display_name="{engine.api_resource.display_name}"'
+            ):
+                yield engine
+
+    def create(self, *, agent: Any, config: Any) -> Any:
+        self.calls["create"] += 1
+        name = f"projects/p/locations/l/reasoningEngines/{len(self.engines) + 1}"
+        return self._engine(name, config.display_name)
+
+    def update(self, *, name: str, agent: Any, config: Any) -> Any:
+        self.calls["update"] += 1
+        return self._engine(name, config.display_name)
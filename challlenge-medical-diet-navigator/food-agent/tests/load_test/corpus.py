@@ -0,0 +1,85 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Weighted prompt mix for the load tests, by the route each prompt exercises."""
+
+import random
+
+# (category, weight, prompts). Weights are relative; change them to match
+# the traffic you expect. Categories label the latency percentiles.
+CORPUS: list[tuple[str, float, tuple[str, ...]]] = [
+    (
+        "diet",
+        0.35,
+        (
+            "What is a balanced breakfast for someone with type 2 diabetes?",
+            "Can you suggest a low-sodium dinner for someone with high blood pressure?",
+            "What should I eat before a long run?",
+            "Is intermittent fasting safe if I am pregnant?",
+            "Give me a vegetarian meal plan with enough iron for a week.",
+            "What are good snacks for someone trying to lower their cholesterol?",
+        ),
+    ),
+    (
+        "allergy",
+        0.25,
+        (
+            "Does peanut butter contain peanuts?",
+            "Is it safe to eat oats if I have celiac disease?",
+            "What hidden sources of soy should I watch for in processed food?",
+            "Can someone with a shellfish allergy eat fish sauce?",
+            "Does pesto usually contain tree nuts?",
+            "What are common cross-contamination risks for a sesame allergy when eating out?",
+        ),
+    ),
+    (
+        "bigquery",
+        0.25,
+        (
+            "How much protein per 100 g is in cooked lentils?",
+            "List the top 10 foods highest in vitamin C in the USDA database.",
+            "How many calories are in 100 g of raw spinach?",
+            "Which cheeses have the most calcium per 100 g?",
+            "Compare the fiber content of brown rice and quinoa.",
+            "What is the potassium content of a medium banana?",
+        ),
+    ),
+    (
+        "image",
+        0.10,
+        (
+            "Generate an image of a colourful quinoa salad.",
+            "Create a picture of a heart-healthy Mediterranean dinner plate.",
+            "Draw an illustration of a gluten-free breakfast.",
+        ),
+    ),
+    (
+        "compound",
+        0.05,
+        (
+            "List the top 5 high-protein snacks that are safe for someone with a peanut allergy.",
+            "Which high-fiber breakfast cereals are safe for someone with a wheat allergy?",
+        ),
+    ),
+]
+
+
+def pick_prompt(rng: random.Random | None = None) -> tuple[str, str]:
+    """A (category, prompt) pair drawn by category weight."""
+    rng = rng or random.Random()
+    categories = [c for c, _, _ in CORPUS]
+    weights = [w for _, w, _ in CORPUS]
+    (category,) = rng.choices(categories, weights=weights)
+    prompts = next(p for c, _, p in CORPUS if c == category)
+    return category, rng.choice(prompts)
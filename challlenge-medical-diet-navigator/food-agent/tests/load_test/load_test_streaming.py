@@ -0,0 +1,270 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming-aware load test with a realistic prompt mix.
+
+Each simulated user has its own user id and session, asks prompts drawn from
+`corpus.py` by weight, and records time to first event, the gaps between
+events and total time per prompt category. Pick the tier with
+LOAD_TEST_TARGET:
+
+- `agent_engine` (default): the deployed Agent Engine `streamQuery` endpoint,
+  from `deployment_metadata.json`. Needs `_AUTH_TOKEN`.
+- `adk`: a local `adk api_server` (`/run_sse`), the agent tier without
+  Agent Engine in front. Pass `--host http://localhost:8000`.
+- `flask`: the web app's `/chat` endpoint, i.e. web tier plus whatever agent
+  it is configured with. Pass `--host http://localhost:8080`. `/chat` answers
+  in one piece, so time to first event is time to the reply. Image jobs are
+  polled until their image is ready.
+
+Percentiles per metric and category are printed when the test stops and,
+with LOAD_TEST_SUMMARY=<path>, written as JSON.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from abc import abstractmethod
+from typing import Any
+
+from corpus import pick_prompt
+from locust import HttpUser, between, events, task
+from metrics import LatencySummary, StreamTimer
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+TARGET = os.getenv("LOAD_TEST_TARGET", "agent_engine")
+# A new session after this many turns, so history does not grow without bound.
+TURNS_PER_SESSION = int(os.getenv("LOAD_TEST_TURNS_PER_SESSION", "5"))
+SEED = os.getenv("LOAD_TEST_SEED")
+ADK_APP_NAME = os.getenv("ADK_APP_NAME", "app")
+IMAGE_JOB_TIMEOUT_S = float(os.getenv("LOAD_TEST_IMAGE_JOB_TIMEOUT_SECONDS", "180"))
+
+_IMAGE_JOB = re.compile(r'data-image-job="([0-9a-f]{32})"')
+
+SUMMARY = LatencySummary()
+
+
+@events.test_stop.add_listener
+def _print_summary(environment: Any, **kwargs: Any) -> None:
+    logger.info("Streaming latency (ms; events are counts):\n%s", SUMMARY.format())
+    if path := os.getenv("LOAD_TEST_SUMMARY"):
+        SUMMARY.write_json(path)
+
+
+AGENT_ENGINE_HOST = QUERY_PATH = STREAM_PATH = ""
+if TARGET == "agent_engine":
+    with open("deployment_metadata.json") as f:
+        remote_agent_engine_id = json.load(f)["remote_agent_engine_id"]
+    location = remote_agent_engine_id.split("/")[3]
+    AGENT_ENGINE_HOST = f"https://{location}-aiplatform.googleapis.com"
+    QUERY_PATH = f"/v1/{remote_agent_engine_id}:query"
+    STREAM_PATH = f"/v1/{remote_agent_engine_id}:streamQuery"
+    logger.info("Using remote agent engine ID: %s", remote_agent_engine_id)
+
+
+class StreamingChatUser(HttpUser):
+    """One end user: own id, own session, prompts from the weighted corpus."""
+
+    abstract = True
+    wait_time = between(1, 3)
+
+    def on_start(self) -> None:
+        self.rng = random.Random(f"{SEED}-{id(self)}") if SEED else random.Random()
+        self.user_id = f"load-{uuid.uuid4().hex[:12]}"
+        self.session_id: str | None = None
+        self.turns = 0
+
+    @task
+    def ask(self) -> None:
+        if self.session_id is None or self.turns >= TURNS_PER_SESSION:
+            self.session_id = self.new_session()
+            self.turns = 0
+        category, prompt = pick_prompt(self.rng)
+        self.turns += 1
+        self.stream(category, prompt)
+
+    # Locust's user metaclass is not ABCMeta, so these are not enforced at
+    # runtime; `abstract = True` keeps Locust from spawning this class.
+    @abstractmethod
+    def new_session(self) -> str | None:
+        """Start a conversation on the target; its session id, or None on failure."""
+
+    @abstractmethod
+    def stream(self, category: str, prompt: str) -> None:
+        """Send one prompt and record its streamed reply."""
+
+    def _read_stream(self, response: Any, timer: StreamTimer) -> bool:
+        """Time each non-empty line as one event; False on an in-stream error."""
+        ok = True
+        for line in response.iter_lines():
+            if not line:
+                continue
+            timer.event()
+            if b"429 Too Many Requests" in line or b'"error' in line:
+                ok = False
+        return ok
+
+    def _fire(
+        self, name: str, ms: float, length: int = 0, exception: Exception | None = None
+    ) -> None:
+        self.environment.events.request.fire(
+            request_type="STREAM",
+            name=name,
+            response_time=ms,
+            response_length=length,
+            exception=exception,
+            context={},
+        )
+
+    def _record(self, category: str, timer: StreamTimer, ok: bool) -> None:
+        total_s = timer.finish()
+        SUMMARY.record_stream(category, timer, total_s)
+        if timer.ttft_s is not None:
+            self._fire(f"{category} first event", timer.ttft_s * 1000)
+        self._fire(
+            f"{category} total",
+            total_s * 1000,
+            timer.events,
+            None if ok else RuntimeError("error event in stream"),
+        )
+
+
+class AgentEngineUser(StreamingChatUser):
+    abstract = TARGET != "agent_engine"
+    host = AGENT_ENGINE_HOST or None
+
+    def on_start(self) -> None:
+        super().on_start()
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {os.environ['_AUTH_TOKEN']}",
+        }
+
+    def new_session(self) -> str | None:
+        response = self.client.post(
+            QUERY_PATH,
+            headers=self.headers,
+            json={
+                "class_method": "async_create_session",
+                "input": {"user_id": self.user_id},
+            },
+            name="create session",
+        )
+        return (response.json().get("output") or {}).get("id") if response.ok else None
+
+    def stream(self, category: str, prompt: str) -> None:
+        data = {
+            "class_method": "async_stream_query",
+            "input": {
+                "user_id": self.user_id,
+                "session_id": self.session_id,
+                "message": prompt,
+            },
+        }
+        timer = StreamTimer()
+        with self.client.post(
+            STREAM_PATH,
+            headers=self.headers,
+            json=data,
+            params={"alt": "sse"},
+            stream=True,
+            catch_response=True,
+            name="streamQuery",
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"Unexpected status code: {response.status_code}")
+                return
+            self._record(category, timer, self._read_stream(response, timer))
+
+
+class AdkApiServerUser(StreamingChatUser):
+    abstract = TARGET != "adk"
+
+    def new_session(self) -> str | None:
+        response = self.client.post(
+            f"/apps/{ADK_APP_NAME}/users/{self.user_id}/sessions",
+            json={},
+            name="create session",
+        )
+        return response.json().get("id") if response.ok else None
+
+    def stream(self, category: str, prompt: str) -> None:
+        data = {
+            "app_name": ADK_APP_NAME,
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "new_message": {"role": "user", "parts": [{"text": prompt}]},
+            "streaming": False,
+        }
+        timer = StreamTimer()
+        with self.client.post(
+            "/run_sse", json=data, stream=True, catch_response=True, name="run_sse"
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"Unexpected status code: {response.status_code}")
+                return
+            self._record(category, timer, self._read_stream(response, timer))
+
+
+class FlaskChatUser(StreamingChatUser):
+    abstract = TARGET != "flask"
+
+    def new_session(self) -> str | None:
+        # The web app keeps the agent session in its cookie; GET / starts a new one.
+        self.client.cookies.clear()
+        self.client.get("/", name="home")
+        return self.user_id
+
+    def stream(self, category: str, prompt: str) -> None:
+        timer = StreamTimer()
+        with self.client.post(
+            "/chat", json={"prompt": prompt}, catch_response=True, name="chat"
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"Unexpected status code: {response.status_code}")
+                return
+            timer.event()
+            reply = (response.json() or {}).get("reply", "")
+        self._record(category, timer, True)
+        if job := _IMAGE_JOB.search(reply):
+            self._wait_for_image(category, job.group(1), timer)
+
+    def _wait_for_image(self, category: str, job_id: str, timer: StreamTimer) -> None:
+        """Poll the job like the page does; records time from the prompt to the image."""
+        delay = 1.0
+        while time.perf_counter() - timer.start < IMAGE_JOB_TIMEOUT_S:
+            time.sleep(delay)
+            response = self.client.get(f"/image-jobs/{job_id}", name="image job status")
+            status = response.json().get("status") if response.ok else "error"
+            if status != "pending":
+                ms = (time.perf_counter() - timer.start) * 1000
+                SUMMARY.record("image", category, ms)
+                error = (
+                    None if status == "done" else RuntimeError(f"image job {status}")
+                )
+                self._fire("image ready", ms, exception=error)
+                return
+            delay = min(delay * 1.5, 5.0)
+        self._fire(
+            "image ready", IMAGE_JOB_TIMEOUT_S * 1000, exception=TimeoutError(job_id)
+        )
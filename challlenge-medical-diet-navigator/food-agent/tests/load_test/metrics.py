@@ -0,0 +1,117 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming latency bookkeeping for the load tests; no Locust dependency."""
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from typing import Any
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """Nearest-rank percentile; NaN for no values."""
+    ordered = sorted(values)
+    if not ordered:
+        return math.nan
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StreamTimer:
+    """Time to first event, gaps between events and total time of one response."""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self._clock = clock
+        self.start = clock()
+        self.first: float | None = None
+        self.last: float | None = None
+        self.gaps_s: list[float] = []
+        self.events = 0
+
+    def event(self) -> None:
+        now = self._clock()
+        if self.first is None:
+            self.first = now
+        else:
+            self.gaps_s.append(now - (self.last or now))
+        self.last = now
+        self.events += 1
+
+    def finish(self) -> float:
+        """Total seconds from the request to now."""
+        return self._clock() - self.start
+
+    @property
+    def ttft_s(self) -> float | None:
+        return None if self.first is None else self.first - self.start
+
+
+class LatencySummary:
+    """Thread-safe samples per (metric, category), summarized as percentiles."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: dict[tuple[str, str], list[float]] = defaultdict(list)
+
+    def record(self, metric: str, category: str, value_ms: float) -> None:
+        with self._lock:
+            self._samples[(metric, category)].append(value_ms)
+
+    def record_stream(self, category: str, timer: StreamTimer, total_s: float) -> None:
+        if timer.ttft_s is not None:
+            self.record("ttft", category, timer.ttft_s * 1000)
+        for gap in timer.gaps_s:
+            self.record("gap", category, gap * 1000)
+        self.record("total", category, total_s * 1000)
+        self.record("events", category, timer.events)
+
+    def rows(self) -> list[dict[str, Any]]:
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+        rows = []
+        for (metric, category), values in sorted(samples.items()):
+            row: dict[str, Any] = {
+                "metric": metric,
+                "category": category,
+                "count": len(values),
+            }
+            for q in PERCENTILES:
+                row[f"p{q}"] = percentile(values, q)
+            row["max"] = max(values)
+            rows.append(row)
+        return rows
+
+    def format(self) -> str:
+        lines = [
+            f"{'metric':<8}{'category':<12}{'count':>7}"
+            + "".join(f"{f'p{q}':>10}" for q in PERCENTILES)
+            + f"{'max':>10}"
+        ]
+        for row in self.rows():
+            lines.append(
+                f"{row['metric']:<8}{row['category']:<12}{row['count']:>7}"
+                + "".join(f"{row[f'p{q}']:>10.0f}" for q in PERCENTILES)
+                + f"{row['max']:>10.0f}"
+            )
+        return "\n".join(lines)
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.rows(), f, indent=2)
@@ -0,0 +1,145 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+
+import pytest
+
+from app import allergen_index
+from app.allergen_index import (
+    MATCHER,
+    Allergen,
+    AllergenIndex,
+    allergen_names,
+    parse_allergen,
+)
+
+
+def test_matcher_finds_synonyms_on_word_boundaries() -> None:
+    """Synonyms match whole words only."""
+    mask = MATCHER.scan("Whole wheat bread with sesame seeds and WHEY protein")
+    assert mask & Allergen.WHEAT
+    assert mask & Allergen.GLUTEN  # implied by wheat
+    assert mask & Allergen.SESAME
+    assert mask & Allergen.MILK
+    assert MATCHER.scan("buckwheat, nutmeg, eggplant, butternut squash") == 0
+
+
+def test_matcher_prefers_longest_match() -> None:
+    """Longer terms shadow the allergen terms they contain."""
+    assert MATCHER.scan("peanut butter") == Allergen.PEANUTS
+    assert MATCHER.scan("coconut milk, cocoa butter") == 0
+    assert MATCHER.scan("almond milk and butter") == Allergen.TREE_NUTS | Allergen.MILK
+
+
+def test_index_from_rows_merges_sources() -> None:
+    """Description, ingredients and category all feed the bitmap."""
+    index = AllergenIndex.from_rows(
+        [
+            {
+                "fdc_id": 1,
+                "description": "Cookies, chocolate chip",
+                "food_category": "Baked Products",
+                "ingredients": ["Flour, wheat", "Butter, salted", "Eggs, whole"],
+            },
+            {
+                "fdc_id": 2,
+                "description": "Cheese, cheddar",
+                "food_category": "Dairy and Egg Products",
+                "ingredients": [],
+            },
+        ]
+    )
+    cookie = index.get(1)
+    assert cookie is not None
+    assert set(allergen_names(cookie.contains)) == {"milk", "egg", "wheat", "gluten"}
+    cheese = index.get(2)
+    assert cheese is not None
+    assert allergen_names(cheese.contains) == ["milk"]
+    assert allergen_names(cheese.possible) == ["egg"]
+    assert index.get(3) is None
+
+
+def test_index_snapshot_round_trip(tmp_path: Path) -> None:
+    """Snapshots reload to the same entries."""
+    index = AllergenIndex.from_rows(
+        [
+            {
+                "fdc_id": 7,
+                "description": "Tahini",
+                "food_category": "",
+                "ingredients": [],
+            },
+            {"fdc_id": 3, "description": "Crème brûlée", "food_category": ""},
+        ]
+    )
+    index.version = 4
+    path = str(tmp_path / "allergens.bin")
+    index.save(path)
+    loaded = AllergenIndex.load(path)
+    assert loaded.entries() == index.entries()
+    assert loaded.version == 4
+    assert 3 in loaded and 5 not in loaded
+
+    (tmp_path / "old.json").write_text('{"7": ["Tahini", 256, 0]}')
+    with pytest.raises(ValueError):
+        AllergenIndex.load(str(tmp_path / "old.json"))
+
+
+def test_runtime_only_loads_the_snapshot(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Workers never scan the dataset; without a snapshot the tool says so."""
+    monkeypatch.setattr(allergen_index, "_index", None)
+    monkeypatch.setattr(allergen_index, "_index_error", None)
+    monkeypatch.setattr(AllergenIndex, "from_bigquery", pytest.fail, raising=True)
+    path = tmp_path / "allergens.bin"
+    monkeypatch.setattr(allergen_index.Config, "ALLERGEN_INDEX_PATH", str(path))
+
+    result = allergen_index.lookup_food_allergens(7)
+    assert result["status"] == "error"
+    assert "research the food instead" in result["error_message"]
+
+    AllergenIndex.from_rows(
+        [{"fdc_id": 7, "description": "Tahini", "food_category": "", "ingredients": []}]
+    ).save(str(path))
+    monkeypatch.setattr(allergen_index, "_index_error", None)  # skip the retry wait
+    assert allergen_index.lookup_food_allergens(7)["contains"] == ["sesame"]
+
+
+def test_lookup_tool(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The lookup tool answers from the index and reports misses."""
+    index = AllergenIndex.from_rows(
+        [
+            {
+                "fdc_id": 9,
+                "description": "Shrimp, raw",
+                "food_category": "",
+                "ingredients": [],
+            }
+        ]
+    )
+    monkeypatch.setattr(allergen_index, "_index", index)
+    result = allergen_index.lookup_food_allergens(9)
+    assert result["status"] == "success"
+    assert result["contains"] == ["shellfish"]
+    assert allergen_index.lookup_food_allergens(10)["status"] == "not_found"
+
+
+def test_parse_allergen() -> None:
+    """Family names and synonyms both parse."""
+    assert parse_allergen("tree nuts") == Allergen.TREE_NUTS
+    assert parse_allergen("tahini") == Allergen.SESAME
+    with pytest.raises(ValueError):
+        parse_allergen("kryptonite")
@@ -0,0 +1,171 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from pathlib import Path
+from typing import Any, TypedDict
+
+from google.adk.artifacts import BaseArtifactService
+from google.genai import types
+
+from app.utils.artifact_cache import STATS, DiskTier, MemoryTier, TieredArtifactService
+from tests.benchmarks.fakes import LocalArtifactService
+
+
+class Ids(TypedDict):
+    app_name: str
+    user_id: str
+    session_id: str
+
+
+IDS: Ids = {"app_name": "app", "user_id": "u1", "session_id": "s1"}
+
+
+def _part(data: bytes) -> types.Part:
+    return types.Part.from_bytes(data=data, mime_type="text/plain")
+
+
+def _inline(artifact: types.Part | None) -> types.Blob:
+    assert artifact is not None and artifact.inline_data is not None
+    return artifact.inline_data
+
+
+async def _save(service: BaseArtifactService, filename: str, data: bytes) -> int:
+    return await service.save_artifact(filename=filename, artifact=_part(data), **IDS)
+
+
+def _service(
+    tmp_path: Path, backend: LocalArtifactService, **kwargs: Any
+) -> TieredArtifactService:
+    kwargs.setdefault("cache_dir", str(tmp_path / "cache"))
+    return TieredArtifactService(backend, **kwargs)
+
+
+def test_write_behind_and_tiered_loads(tmp_path: Path) -> None:
+    """Saves of a held file return before the backend write; loads come from memory, then disk."""
+    backend = LocalArtifactService(str(tmp_path / "gcs"), latency_s=0.05)
+    service = _service(tmp_path, backend)
+
+    async def run() -> None:
+        assert await _save(service, "plan.txt", b"v0") == 0
+        assert await _save(service, "plan.txt", b"v1") == 1
+        # Still uploading, but visible through the service.
+        assert await service.list_versions(filename="plan.txt", **IDS) == [0, 1]
+        assert await service.list_artifact_keys(**IDS) == ["plan.txt"]
+        latest = await service.load_artifact(filename="plan.txt", **IDS)
+        assert _inline(latest).data == b"v1"
+
+    asyncio.run(run())
+    assert backend.calls["load_artifact"] == 0
+    assert service.flush(timeout_s=5)
+    backend_copy = asyncio.run(
+        backend.load_artifact(filename="plan.txt", version=0, **IDS)
+    )
+    assert _inline(backend_copy).data == b"v0"
+
+    # A second worker on the host shares the disk tier but not the memory tier.
+    other = _service(tmp_path, backend)
+    before = STATS.snapshot()
+    first = asyncio.run(other.load_artifact(filename="plan.txt", version=0, **IDS))
+    assert _inline(first).data == b"v0"
+    assert _inline(first).mime_type == "text/plain"
+    assert STATS.snapshot()["disk_hits"] == before["disk_hits"] + 1
+    assert backend.calls["load_artifact"] == 1  # only the direct check above
+
+
+def test_versions_from_other_writers(tmp_path: Path) -> None:
+    """Stale version lists are re-read; shared files get the backend's number."""
+    backend = LocalArtifactService(str(tmp_path / "gcs"))
+    service = _service(tmp_path, backend, versions_ttl_seconds=3600)
+
+    async def run() -> None:
+        await _save(service, "user:prefs", b"a")
+        service.flush(timeout_s=5)
+        # Another replica writes version 1 while our version list is cached.
+        await _save(backend, "user:prefs", b"b")
+        conflicts = STATS.snapshot()["version_conflicts"]
+        # User files are written through, so the caller gets the stored number.
+        assert await _save(service, "user:prefs", b"c") == 2
+        assert STATS.snapshot()["version_conflicts"] == conflicts + 1
+        assert await backend.list_versions(filename="user:prefs", **IDS) == [0, 1, 2]
+        # The list was dropped with the conflict, so "latest" is read again.
+        latest = await service.load_artifact(filename="user:prefs", **IDS)
+        assert _inline(latest).data == b"c"
+        # User-namespaced files are shared across sessions.
+        other_session: Ids = {**IDS, "session_id": "s2"}
+        versions = await service.list_versions(filename="user:prefs", **other_session)
+        assert versions == [0, 1, 2]
+
+    asyncio.run(run())
+
+
+def test_saves_write_through_until_the_worker_holds_the_file(tmp_path: Path) -> None:
+    """A first save, or one after the version list went stale, waits for the backend."""
+    backend = LocalArtifactService(str(tmp_path / "gcs"))
+    service = _service(tmp_path, backend, versions_ttl_seconds=0)
+
+    async def run() -> None:
+        before = STATS.snapshot()["write_through"]
+        assert await _save(service, "notes", b"a") == 0
+        await _save(backend, "notes", b"b")  # another replica
+        assert await _save(service, "notes", b"c") == 2
+        assert STATS.snapshot()["write_through"] == before + 2
+        assert await backend.list_versions(filename="notes", **IDS) == [0, 1, 2]
+        assert (
+            _inline(await service.load_artifact(filename="notes", **IDS)).data == b"c"
+        )
+
+    asyncio.run(run())
+
+
+def test_deleted_versions_are_invalidated(tmp_path: Path) -> None:
+    backend = LocalArtifactService(str(tmp_path / "gcs"))
+    service = _service(tmp_path, backend, versions_ttl_seconds=0)
+
+    async def run() -> None:
+        for data in (b"x", b"y"):
+            await _save(service, "notes", data)
+        service.flush(timeout_s=5)
+        latest = await service.load_artifact(filename="notes", **IDS)
+        assert _inline(latest).data == b"y"
+
+        # Deleted elsewhere: the next listing drops both cached versions.
+        await backend.delete_artifact(filename="notes", **IDS)
+        assert await service.load_artifact(filename="notes", **IDS) is None
+        assert service.memory.get(("app", "u1", "s1", "notes", 1)) is None
+        assert service.disk.get(("app", "u1", "s1", "notes", 1)) is None
+
+        # Deleting through the service waits for queued writes first.
+        await _save(service, "notes", b"z")
+        await service.delete_artifact(filename="notes", **IDS)
+        assert await backend.list_versions(filename="notes", **IDS) == []
+        assert await service.load_artifact(filename="notes", version=0, **IDS) is None
+
+    asyncio.run(run())
+
+
+def test_tiers_stay_within_their_budgets(tmp_path: Path) -> None:
+    memory = MemoryTier(max_bytes=10)
+    for i in range(5):
+        memory.put(("a", "u", "s", "f", i), (b"1234", "text/plain"))
+    kept = [memory.get(("a", "u", "s", "f", i)) is not None for i in range(5)]
+    assert kept == [False, False, False, True, True]
+
+    disk = DiskTier(str(tmp_path / "disk"), max_bytes=4000, ttl_seconds=60)
+    for i in range(10):
+        disk.put(("a", "u", "s", "f", i), (b"x" * 1000, "text/plain"))
+    assert sum(size for _, size, _ in disk._files()) <= 4000
+    assert disk.get(("a", "u", "s", "f", 9)) == (b"x" * 1000, "text/plain")
+    expired = DiskTier(str(tmp_path / "disk"), max_bytes=4000, ttl_seconds=-1)
+    assert expired.get(("a", "u", "s", "f", 9)) is None
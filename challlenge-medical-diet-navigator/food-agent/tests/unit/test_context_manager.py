@@ -0,0 +1,209 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from app import context_manager
+from app.config import Config
+
+
+def _user(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def _turn(i: int, prompt: str, rows: int = 50) -> list[types.Content]:
+    """A question answered with one execute_sql call returning `rows` rows."""
+    result = {
+        "status": "SUCCESS",
+        "rows": [
+            {"fdc_id": i * 1000 + r, "description": f"Food {i}-{r}", "amount": r}
+            for r in range(rows)
+        ],
+    }
+    return [
+        _user(prompt),
+        types.Content(
+            role="model",
+            parts=[
+                types.Part(
+                    function_call=types.FunctionCall(
+                        id=f"c{i}", name="execute_sql", args={"query": "SELECT 1"}
+                    )
+                )
+            ],
+        ),
+        types.Content(
+            role="user",
+            parts=[
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        id=f"c{i}", name="execute_sql", response=result
+                    )
+                )
+            ],
+        ),
+        types.Content(
+            role="model", parts=[types.Part(text=f"Answer {i}: Food {i}-0 is best.")]
+        ),
+    ]
+
+
+def _compact(history: list[types.Content], context: SimpleNamespace) -> LlmRequest:
+    request = LlmRequest(contents=[c.model_copy(deep=True) for c in history])
+    context_manager.compact_context(context, request)
+    return request
+
+
+def _part(content: types.Content) -> types.Part:
+    assert content.parts
+    return content.parts[0]
+
+
+def _text(content: types.Content) -> str:
+    return _part(content).text or ""
+
+
+def _response(content: types.Content) -> types.FunctionResponse:
+    response = _part(content).function_response
+    assert response and response.response is not None
+    return response
+
+
+@pytest.fixture
+def small_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Config, "CONTEXT_MANAGER_ENABLED", True)
+    monkeypatch.setattr(Config, "CONTEXT_KEEP_TURNS", 3)
+    monkeypatch.setattr(Config, "CONTEXT_MAX_TOOL_CHARS", 1000)
+    monkeypatch.setattr(Config, "CONTEXT_SUMMARY_CHARS", 1500)
+
+
+def test_input_stays_flat_over_a_long_chat(small_window: None) -> None:
+    """Input size levels off while history grows; the summary rolls forward from state."""
+    context = SimpleNamespace(agent_name="main_agent", state={})
+    history: list[types.Content] = []
+    sizes = []
+    prompts = ["I have type 2 diabetes and a peanut allergy. What should I eat?"]
+    prompts += [f"How much fiber is in food {i}?" for i in range(1, 30)]
+    for i, prompt in enumerate(prompts):
+        history += _turn(i, prompt)
+        request = _compact(history[:-1], context)  # the model is about to answer turn i
+        sizes.append(context_manager.content_chars(request.contents))
+
+    assert context_manager.content_chars(history) > 10 * sizes[-1]
+    # Flat once the summary has filled its budget.
+    assert max(sizes[15:]) - min(sizes[15:]) < 0.05 * sizes[-1]
+
+    summary = _text(request.contents[0])
+    assert summary.startswith(context_manager.SUMMARY_HEADER)
+    assert "Allergies mentioned: peanut" in summary
+    assert (
+        "type 2 diabetes" in summary
+        and "Health conditions mentioned: diabetes" not in summary
+    )
+    assert "Food 26-0" in summary  # foods from summarized tool results
+    assert "earlier turns not shown" in summary  # the oldest lines rolled off
+    stored = context.state["context_summary:main_agent"]
+    assert stored["turns"] == 27
+    # Three kept turns (the last one still open) follow the summary verbatim.
+    assert _text(request.contents[1]) == prompts[27]
+
+
+def test_recent_turns_kept_and_only_earlier_results_cut(small_window: None) -> None:
+    context = SimpleNamespace(agent_name="usda_agent", state={})
+    history = _turn(0, "Protein in lentils?") + _turn(1, "And in chickpeas?")[:3]
+    request = _compact(history, context)
+
+    assert len(request.contents) == len(history)  # nothing summarized yet
+    earlier = _response(request.contents[2])
+    current = _response(request.contents[6])
+    assert earlier.response and current.response
+    assert 0 < len(earlier.response["rows"]) < 50
+    assert earlier.response["rows_omitted"] == 50 - len(earlier.response["rows"])
+    assert len(current.response["rows"]) == 50
+    # Calls and their responses stay paired.
+    call = _part(request.contents[1]).function_call
+    assert call and call.id == earlier.id
+
+
+def test_summary_restarts_when_state_does_not_match(small_window: None) -> None:
+    history = [c for i in range(6) for c in _turn(i, f"Question {i}?", rows=1)]
+    stale = {
+        "turns": 2,
+        "last_user": "something else",
+        "lines": ["- stale"],
+        "dropped": 0,
+        "facts": {"allergies": [], "conditions": [], "foods": []},
+    }
+    context = SimpleNamespace(
+        agent_name="main_agent", state={"context_summary:main_agent": stale}
+    )
+    request = _compact([*history, _user("Question 6?")], context)
+
+    summary = _text(request.contents[0])
+    assert "- stale" not in summary
+    assert "Question 0?" in summary and "Answer 3" in summary
+    assert context.state["context_summary:main_agent"]["turns"] == 4
+
+
+def test_disabled_leaves_request_unchanged(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Config, "CONTEXT_MANAGER_ENABLED", False)
+    history = [c for i in range(10) for c in _turn(i, f"Question {i}?")]
+    request = _compact(history, SimpleNamespace(agent_name="main_agent", state={}))
+    assert request.contents == history
+
+
+def test_extract_facts_needs_a_stated_allergy() -> None:
+    """Only foods an allergy cue applies to count, and negated cues rule them out."""
+    assert (
+        context_manager.extract_facts("Does peanut butter contain peanuts?")[
+            "allergies"
+        ]
+        == []
+    )
+    facts = context_manager.extract_facts(
+        "My son is allergic to sesame. He also has celiac disease and high blood pressure.",
+        "{'description': 'Hummus, commercial'}",
+    )
+    assert "sesame" in facts["allergies"]
+    assert facts["conditions"] == ["hypertension", "celiac disease"]
+    assert facts["foods"] == ["Hummus, commercial"]
+    assert context_manager.extract_facts(
+        "I am allergic to peanuts, is almond butter ok?"
+    )["allergies"] == ["peanuts"]
+    facts = context_manager.extract_facts(
+        "My son has no milk allergy, but can he have soy?"
+    )
+    assert facts["allergies"] == []
+    assert facts["ruled_out_allergies"] == ["milk"]
+    facts = context_manager.extract_facts("Should I avoid eggs for high cholesterol?")
+    assert facts["allergies"] == []
+    assert facts["conditions"] == ["high cholesterol"]
+
+
+def test_summary_drops_facts_a_later_turn_rules_out(small_window: None) -> None:
+    prompts = [
+        "I have a milk allergy and hypertension.",
+        "Sorry, I have no milk allergy, I am allergic to eggs.",
+    ]
+    old_turns = [_turn(i, prompt, rows=1) for i, prompt in enumerate(prompts)]
+    summary, added = context_manager.update_summary(None, old_turns[:1])
+    assert summary["facts"]["allergies"] == ["milk"]
+    summary, added = context_manager.update_summary(summary, old_turns)
+    assert added == 1
+    assert summary["facts"]["allergies"] == ["egg"]
+    assert summary["facts"]["conditions"] == ["hypertension"]
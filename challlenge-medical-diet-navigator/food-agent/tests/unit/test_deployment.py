@@ -0,0 +1,121 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app import agent_engine_app
+from app.utils.deployment import content_hash, find_agent_engine
+from tests.benchmarks.fakes import FakeAgentEngines
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A package to deploy, with the cloud calls outside the client stubbed out."""
+    (tmp_path / "app" / "__pycache__").mkdir(parents=True)
+    (tmp_path / "app" / "agent.py").write_text("root_agent = None\n")
+    (tmp_path / "requirements.txt").write_text("google-adk==1.8.0\nsqlglot==26.0\n")
+    monkeypatch.setattr(
+        agent_engine_app, "create_bucket_if_not_exists", lambda **kw: None
+    )
+    monkeypatch.setattr(agent_engine_app.vertexai, "init", lambda **kw: None)
+    monkeypatch.setattr(agent_engine_app, "get_root_agent", lambda: None)
+    monkeypatch.setattr(
+        agent_engine_app, "AgentEngineApp", lambda **kw: SimpleNamespace(**kw)
+    )
+    return tmp_path
+
+
+def _deploy(project: Path, client: FakeAgentEngines, **kwargs: Any) -> Any:
+    kwargs.setdefault("env_vars", {})
+    return agent_engine_app.deploy_agent_engine_app(
+        project="p",
+        location="us-central1",
+        agent_name="food-agent",
+        requirements_file=str(project / "requirements.txt"),
+        extra_packages=[str(project / "app")],
+        client=SimpleNamespace(agent_engines=client),
+        metadata_file=str(project / "deployment_metadata.json"),
+        **kwargs,
+    )
+
+
+def test_unchanged_deploy_is_skipped(project: Path) -> None:
+    engines = FakeAgentEngines()
+    first = _deploy(project, engines)
+    metadata = json.loads((project / "deployment_metadata.json").read_text())
+    assert metadata["remote_agent_engine_id"] == first.api_resource.name
+    assert engines.calls["create"] == 1
+    assert engines.filters == ['display_name="food-agent"']
+
+    # Bytecode and requirement order do not count as changes.
+    (project / "app" / "__pycache__" / "agent.cpython-312.pyc").write_bytes(b"\0")
+    (project / "requirements.txt").write_text("sqlglot==26.0\ngoogle-adk==1.8.0\n")
+    assert _deploy(project, engines) is first
+    assert (engines.calls["create"], engines.calls["update"]) == (1, 0)
+    # The recorded engine is fetched directly; nothing is listed again.
+    assert (engines.calls["get"], engines.calls["list"]) == (1, 1)
+
+    _deploy(project, engines, force=True)
+    assert engines.calls["update"] == 1
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda p: (p / "app" / "agent.py").write_text("root_agent = 1\n"),
+        lambda p: (p / "app" / "new_tool.py").write_text(""),
+        lambda p: (p / "requirements.txt").write_text("google-adk==1.9.0\n"),
+    ],
+)
+def test_changes_update_the_same_engine(project: Path, change: Any) -> None:
+    engines = FakeAgentEngines()
+    first = _deploy(project, engines)
+    change(project)
+    second = _deploy(project, engines)
+    assert second.api_resource.name == first.api_resource.name
+    assert (engines.calls["create"], engines.calls["update"]) == (1, 1)
+
+
+def test_env_var_change_redeploys(project: Path) -> None:
+    engines = FakeAgentEngines()
+    _deploy(project, engines, env_vars={"MODEL": "gemini-2.5-flash"})
+    _deploy(project, engines, env_vars={"MODEL": "gemini-2.5-flash"})
+    assert engines.calls["update"] == 0
+    _deploy(project, engines, env_vars={"MODEL": "gemini-2.5-pro"})
+    assert engines.calls["update"] == 1
+
+
+def test_find_agent_engine_falls_back_to_a_name_filter() -> None:
+    engines = FakeAgentEngines()
+    client = SimpleNamespace(agent_engines=engines)
+    engine = engines._engine("projects/p/locations/l/reasoningEngines/7", "food-agent")
+    engines._engine("projects/p/locations/l/reasoningEngines/8", "other-agent")
+
+    # The recorded engine was deleted: look it up by display name instead.
+    missing = "projects/p/locations/l/reasoningEngines/1"
+    assert find_agent_engine(client, "food-agent", missing) is engine
+    assert engines.filters == ['display_name="food-agent"']
+    assert find_agent_engine(client, "new-agent") is None
+
+
+def test_content_hash_covers_settings(tmp_path: Path) -> None:
+    args = ([str(tmp_path)], ["a==1"], {"X": "1"})
+    first = content_hash(*args, {"agent_name": "a"})
+    assert first == content_hash(*args, {"agent_name": "a"})
+    assert first != content_hash(*args, {"agent_name": "b"})
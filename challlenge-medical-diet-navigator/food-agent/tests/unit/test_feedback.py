@@ -0,0 +1,115 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import signal
+import time
+from typing import Any
+
+from app.utils.feedback import FeedbackWriter
+from app.utils.typing import Feedback
+
+
+class FakeLogger:
+    """Records committed batches; `fail` makes the next commits raise."""
+
+    def __init__(self) -> None:
+        self.commits: list[list[dict]] = []
+        self.single_writes = 0
+        self.fail = 0
+
+    def log_struct(self, info: dict, **kwargs: Any) -> None:
+        self.single_writes += 1
+
+    def batch(self) -> Any:
+        logger = self
+
+        class Batch:
+            entries: list[dict]
+
+            def __init__(self) -> None:
+                self.entries = []
+
+            def log_struct(self, info: dict, **kwargs: Any) -> None:
+                self.entries.append(info)
+
+            def commit(self) -> None:
+                if logger.fail:
+                    logger.fail -= 1
+                    raise RuntimeError("unavailable")
+                logger.commits.append(self.entries)
+
+        return Batch()
+
+
+def _feedback(i: int) -> Feedback:
+    return Feedback(
+        score=i % 5 + 1, invocation_id=f"inv-{i % 3}", user_id=f"user-{i % 2}"
+    )
+
+
+def test_burst_is_written_in_batches_with_aggregates() -> None:
+    """120 feedback calls become three log writes; aggregates are queryable at once."""
+    logger = FakeLogger()
+    writer = FeedbackWriter(logger, batch_size=50, flush_interval_s=60)
+    for i in range(120):
+        writer.add(_feedback(i))
+
+    summary = writer.summary(invocation_id="inv-0", user_id="user-1")
+    assert summary["overall"]["count"] == 120
+    assert summary["invocation"]["count"] == 40
+    assert summary["user"]["count"] == 60
+    assert summary["user"]["min"] == 1 and summary["user"]["max"] == 5
+    assert writer.summary(invocation_id="missing")["invocation"]["count"] == 0
+
+    writer.close()
+    assert logger.single_writes == 0
+    assert sum(len(c) for c in logger.commits) == 120
+    assert len(logger.commits) == 3
+
+
+def test_interval_flush_and_retry_after_failure() -> None:
+    """Entries are written after the interval, and a failed write is retried in order."""
+    logger = FakeLogger()
+    logger.fail = 1
+    writer = FeedbackWriter(logger, batch_size=50, flush_interval_s=0.05)
+    for i in range(3):
+        writer.add(_feedback(i))
+
+    deadline = time.monotonic() + 2
+    while not logger.commits and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+    assert [e["invocation_id"] for c in logger.commits for e in c] == [
+        "inv-0",
+        "inv-1",
+        "inv-2",
+    ]
+    assert writer.summary()["buffered"] == 0
+
+
+def test_sigterm_writes_buffered_feedback() -> None:
+    """SIGTERM flushes what is buffered, then runs the previous handler."""
+    received: list[int] = []
+    original = signal.signal(
+        signal.SIGTERM, lambda signum, frame: received.append(signum)
+    )
+    try:
+        logger = FakeLogger()
+        writer = FeedbackWriter(logger, batch_size=50, flush_interval_s=60)
+        writer.add(_feedback(0))
+        signal.raise_signal(signal.SIGTERM)
+        assert [len(c) for c in logger.commits] == [1]
+        assert received == [signal.SIGTERM]
+    finally:
+        signal.signal(signal.SIGTERM, original)
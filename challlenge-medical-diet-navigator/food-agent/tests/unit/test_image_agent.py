@@ -0,0 +1,234 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import io
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from google.genai import types
+from PIL import Image
+
+from app import image_agent
+from app.utils import image_cache
+from app.utils.cache_store import SqliteTTLCache
+from app.utils.image_jobs import JobRunner
+
+
+def test_prompt_normalization() -> None:
+    """Phrasing around the subject does not change the key."""
+    assert image_cache.normalize_image_prompt(
+        "Generate an image of a healthy Mediterranean breakfast plate!"
+    ) == image_cache.normalize_image_prompt("healthy mediterranean breakfast plate")
+    options = {"n": 1}
+    assert image_cache.image_cache_key(
+        "a salad", "m", options
+    ) != image_cache.image_cache_key("a salad", "m", {"n": 2})
+    assert image_cache.image_cache_key("draw a picture", "m", options) is None
+
+
+class FakeGenai:
+    """Stands in for the pooled `genai.Client`; each stream takes `delay` s."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.calls = 0
+        self.closed = 0
+        self.loops: set[asyncio.AbstractEventLoop] = set()
+        self.aio = SimpleNamespace(models=self)
+
+    async def generate_content_stream(self, **kwargs: Any) -> AsyncIterator[Any]:
+        self.calls += 1
+        self.loops.add(asyncio.get_running_loop())
+        data = f"img{self.calls}".encode()
+
+        async def stream() -> AsyncIterator[Any]:
+            try:
+                await asyncio.sleep(self.delay)
+                part = types.Part.from_bytes(data=data, mime_type="image/png")
+                yield SimpleNamespace(
+                    candidates=[
+                        SimpleNamespace(
+                            content=types.Content(role="model", parts=[part])
+                        )
+                    ]
+                )
+                yield SimpleNamespace(candidates=[])
+            finally:
+                self.closed += 1
+
+        return stream()
+
+
+@pytest.fixture
+def fakes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    monkeypatch.setattr(
+        image_cache,
+        "_cache",
+        SqliteTTLCache(str(tmp_path / "c.sqlite3"), "generated_images", ttl_seconds=60),
+    )
+    genai_client = FakeGenai()
+    monkeypatch.setattr(image_agent, "_get_genai_client", lambda: genai_client)
+    uploads: list[bytes] = []
+
+    def fake_upload(
+        data: bytes, bucket: str, mime_type: str = "image/png", **kw: Any
+    ) -> dict:
+        time.sleep(genai_client.delay / 2)
+        uploads.append(data)
+        name = (
+            kw.get("blob_name") or f"generated/{image_cache.content_address(data)}.png"
+        )
+        url = f"https://x/{name}"
+        return {"public_url": url, "filename": name, "markdown": f"![{name}]({url})"}
+
+    monkeypatch.setattr(image_agent, "_upload_bytes_to_gcs", fake_upload)
+    return SimpleNamespace(genai=genai_client, uploads=uploads)
+
+
+def _generate(prompt: str, **kwargs: Any) -> dict:
+    return asyncio.run(image_agent.generate_image_tool(prompt, **kwargs))
+
+
+def test_repeat_prompt_is_served_from_cache(fakes: SimpleNamespace) -> None:
+    """Repeats skip generation and upload; fresh=True generates a new image."""
+    first = _generate("A healthy Mediterranean breakfast plate")
+    again = _generate("generate an image of a healthy mediterranean breakfast plate")
+    assert fakes.genai.calls == 1 and len(fakes.uploads) == 1
+    assert again["cache"] == "hit"
+    assert again["images"] == first["images"]
+
+    new = _generate("A healthy Mediterranean breakfast plate", fresh=True)
+    assert fakes.genai.calls == 2
+    assert new["images"] != first["images"]
+    assert (
+        _generate("a healthy mediterranean breakfast plate")["images"] == new["images"]
+    )
+
+
+def test_genai_client_stays_on_one_loop(fakes: SimpleNamespace) -> None:
+    """Calls from separate event loops share the client on the job loop."""
+    _generate("A bowl of lentil soup", fresh=True)
+    _generate("A bowl of lentil soup", fresh=True, n=2)
+    assert fakes.genai.calls == 3
+    assert len(fakes.genai.loops) == 1
+    # Each stream is closed as soon as its image has arrived.
+    assert fakes.genai.closed == 3
+
+
+def test_images_generate_and_upload_concurrently(fakes: SimpleNamespace) -> None:
+    """n images take about one generate + one upload, not n of each."""
+    fakes.genai.delay = 0.2
+    start = time.perf_counter()
+    result = _generate("Three bowls of lentil soup", n=3)
+    elapsed = time.perf_counter() - start
+    assert len(result["images"]) == 3
+    assert len(fakes.uploads) == 3
+    assert elapsed < 0.6  # sequential would be 3 * (0.2 + 0.1) = 0.9
+
+
+class FakeBlob:
+    def __init__(self, name: str, store: dict) -> None:
+        self.name, self.store, self.cache_control = name, store, None
+
+    def upload_from_string(self, data: bytes, content_type: str, **kwargs: Any) -> None:
+        self.store[self.name] = (len(data), content_type, self.cache_control)
+
+
+def test_publish_image_uploads_immutable_variants(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A PNG becomes smaller WebP display/thumbnail variants with srcset markup."""
+    store: dict[str, tuple[int, str, str | None]] = {}
+    client = SimpleNamespace(
+        bucket=lambda name: SimpleNamespace(
+            blob=lambda blob_name: FakeBlob(blob_name, store)
+        )
+    )
+    monkeypatch.setattr(image_agent, "_get_storage_client", lambda: client)
+    monkeypatch.setattr(image_agent.Config, "IMAGE_AVIF_ENABLED", False)
+    monkeypatch.setattr(image_agent.Config, "IMAGE_VARIANT_WIDTHS", (320, 1024))
+
+    buf = io.BytesIO()
+    Image.effect_noise((1024, 1024), 64).convert("RGB").save(buf, format="PNG")
+    info = image_agent._publish_image(buf.getvalue(), bucket="b")
+
+    assert [(v["width"], v["mime_type"]) for v in info["variants"]] == [
+        (320, "image/webp"),
+        (1024, "image/webp"),
+    ]
+    assert all(v["bytes"] < info["bytes"] for v in info["variants"])
+    assert len(store) == 3
+    assert {cc for _, _, cc in store.values()} == {image_agent.IMMUTABLE_CACHE_CONTROL}
+    stem = info["filename"].rsplit(".", 1)[0]
+    assert f"{stem}-320w.webp 320w" in info["srcset"]
+    assert info["html"].startswith(f'<a href="{info["public_url"]}"><picture>')
+    assert "-1024w.webp" in info["markdown"]
+
+
+def test_job_runner_bounds_concurrency() -> None:
+    """Jobs beyond max_concurrent wait; submits beyond max_pending are refused."""
+    runner = JobRunner(max_concurrent=2, max_pending=4)
+    running = peak = 0
+
+    async def job() -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+    futures = [runner.submit(job) for _ in range(5)]
+    assert futures[-1] is None
+    for f in futures[:-1]:
+        assert f is not None
+        f.result(timeout=2)
+    assert peak == 2
+    assert runner.pending == 0
+
+
+def test_image_job_returns_placeholder_then_publishes_status(
+    fakes: SimpleNamespace, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The tool returns before generation; the job writes a done status with html."""
+    fakes.genai.delay = 0.3
+    statuses: dict[str, dict] = {}
+    monkeypatch.setattr(
+        image_agent,
+        "_write_job_status",
+        lambda bucket, job_id, status: statuses.update({job_id: status}),
+    )
+    monkeypatch.setattr(
+        image_agent, "_job_runner", JobRunner(max_concurrent=1, max_pending=2)
+    )
+
+    start = time.perf_counter()
+    pending = image_agent.start_image_job("A bowl of oatmeal with berries")
+    assert time.perf_counter() - start < 0.1
+    assert pending["status"] == "pending"
+    assert f'data-image-job="{pending["job_id"]}"' in pending["html"]
+
+    deadline = time.monotonic() + 3
+    while pending["job_id"] not in statuses and time.monotonic() < deadline:
+        time.sleep(0.02)
+    status = statuses[pending["job_id"]]
+    assert status["status"] == "done"
+    assert status["images"][0]["public_url"] in status["html"]
+
+    repeat = image_agent.start_image_job("an image of a bowl of oatmeal with berries")
+    assert repeat["cache"] == "hit"
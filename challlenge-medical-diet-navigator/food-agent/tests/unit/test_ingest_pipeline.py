@@ -0,0 +1,221 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import json
+import os
+import zipfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pyarrow.parquet as pq
+import pytest
+
+from app.ingest import pipeline
+from app.ingest.pipeline import LocalLoader, csv_to_parquet, download, run_import
+from app.ingest.schema import TABLES_BY_NAME, TableSpec
+
+FOOD_CSV = (
+    '"fdc_id","data_type","description","food_category_id","publication_date"\n'
+    '"321358","foundation_food","Hummus, commercial","16","2019-04-01"\n'
+)
+NUTRIENT_CSV = (
+    '"id","name","unit_name","nutrient_nbr","rank"\n"1003","Protein","G","203","600"\n'
+)
+
+
+def _write_release(path: Path, food_csv: str = FOOD_CSV) -> None:
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("FoodData_Central_foundation_food_csv/food.csv", food_csv)
+        zf.writestr("FoodData_Central_foundation_food_csv/nutrient.csv", NUTRIENT_CSV)
+
+
+def test_rerun_only_reloads_changed_tables(tmp_path: Path) -> None:
+    """Unchanged members are skipped by CRC; a changed one is reloaded."""
+    release = tmp_path / "release.zip"
+    _write_release(release)
+    loader = LocalLoader(str(tmp_path / "out"))
+
+    first = run_import(str(release), str(tmp_path / "work"), loader, workers=2)
+    assert sorted(r["table"] for r in first.loaded) == ["food", "nutrient"]
+    assert all(r["rows"] == 1 for r in first.loaded)
+    assert first.failed == []
+    assert os.path.exists(tmp_path / "out" / "food.parquet")
+
+    second = run_import(str(release), str(tmp_path / "work"), loader)
+    assert second.loaded == []
+    assert sorted(second.skipped) == ["food", "nutrient"]
+
+    _write_release(release, FOOD_CSV + '"321359","foundation_food","Tahini","16",""\n')
+    third = run_import(str(release), str(tmp_path / "work"), loader, use_parquet=False)
+    assert [r["table"] for r in third.loaded] == ["food"]
+    assert third.loaded[0]["rows"] == 2
+    assert third.skipped == ["nutrient"]
+
+    # State is kept per destination: another target loads everything.
+    other = LocalLoader(str(tmp_path / "other"))
+    fourth = run_import(str(release), str(tmp_path / "work"), other)
+    assert sorted(r["table"] for r in fourth.loaded) == ["food", "nutrient"]
+
+
+def test_parquet_columns_follow_the_csv_header(tmp_path: Path) -> None:
+    """Columns are read by name, whatever their order in the file."""
+    csv_path = tmp_path / "nutrient.csv"
+    csv_path.write_text('"name","id","extra","unit_name"\n"Protein","1003","x","G"\n')
+    parquet_path = tmp_path / "nutrient.parquet"
+    assert csv_to_parquet(str(csv_path), TABLES_BY_NAME["nutrient"], str(parquet_path))
+    table = pq.read_table(parquet_path)
+    assert table.column_names == ["id", "name", "unit_name", "nutrient_nbr", "rank"]
+    assert table.to_pylist() == [
+        {
+            "id": 1003,
+            "name": "Protein",
+            "unit_name": "G",
+            "nutrient_nbr": None,
+            "rank": None,
+        }
+    ]
+
+
+def _write_rows(path: Path, spec: TableSpec, rows: list[dict[str, Any]]) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, spec.column_names)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_csv_to_parquet_nulls_values_that_are_not_numbers(tmp_path: Path) -> None:
+    """Lenient number columns keep the row and load a bad value as NULL."""
+    spec = TABLES_BY_NAME["input_food"]
+    csv_path = tmp_path / "input_food.csv"
+    parquet_path = tmp_path / "input_food.parquet"
+    _write_rows(
+        csv_path,
+        spec,
+        [
+            {
+                "id": 1,
+                "fdc_id": 321358,
+                "seq_num": " 2",
+                "amount": 1.5,
+                "gram_weight": "n/a",
+            },
+            {"id": 2, "fdc_id": 321358, "seq_num": "x", "gram_weight": "1e2"},
+        ],
+    )
+
+    assert csv_to_parquet(str(csv_path), spec, str(parquet_path))
+    table = pq.read_table(parquet_path)
+    assert str(table.schema.field("seq_num").type) == "int64"
+    assert table.select(["seq_num", "amount", "gram_weight"]).to_pylist() == [
+        {"seq_num": 2, "amount": 1.5, "gram_weight": None},
+        {"seq_num": None, "amount": None, "gram_weight": 100.0},
+    ]
+    # Other columns stay strict: a bad key still fails the conversion.
+    _write_rows(csv_path, spec, [{"id": 1, "fdc_id": "x"}])
+    assert not csv_to_parquet(str(csv_path), spec, str(parquet_path))
+
+
+def test_download_resumes_and_skips_unchanged(tmp_path: Path) -> None:
+    """A partial file resumes with Range; a matching ETag skips the GET."""
+    payload = b"x" * 1000
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        headers = {"etag": '"v1"', "content-length": str(len(payload))}
+        if request.method == "HEAD":
+            return httpx.Response(200, headers=headers)
+        start = int(request.headers.get("range", "bytes=0-")[6:-1])
+        return httpx.Response(206 if start else 200, content=payload[start:])
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    dest = tmp_path / "release.zip"
+    (tmp_path / "release.zip.part").write_bytes(payload[:400])
+    state = {
+        "download": {
+            "url": "https://x/r.zip",
+            "etag": '"v1"',
+            "complete": False,
+            "offset": 400,
+        }
+    }
+
+    assert download("https://x/r.zip", str(dest), state, http_client=client)
+    assert dest.read_bytes() == payload
+    assert requests[1].headers["range"] == "bytes=400-"
+    assert state["download"]["complete"]
+
+    requests.clear()
+    assert not download("https://x/r.zip", str(dest), state, http_client=client)
+    assert [r.method for r in requests] == ["HEAD"]
+
+
+class _FailingStream(httpx.SyncByteStream):
+    """Sends `data`, then drops the connection."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.data
+        raise httpx.ReadError("connection reset")
+
+
+def test_crashed_download_resumes_from_saved_offset(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Progress is saved while streaming, so a fresh process can resume."""
+    monkeypatch.setattr(pipeline, "CHUNK_SIZE", 100)
+    payload = bytes(range(256)) * 4
+    ranges: list[str] = []
+    fail = True
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        headers = {"etag": '"v1"', "content-length": str(len(payload))}
+        if request.method == "HEAD":
+            return httpx.Response(200, headers=headers)
+        ranges.append(request.headers.get("range", ""))
+        if fail:
+            return httpx.Response(200, stream=_FailingStream(payload[:300]))
+        start = int(request.headers["range"][6:-1])
+        return httpx.Response(206, content=payload[start:])
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    dest = tmp_path / "release.zip"
+    saved: list[dict[str, Any]] = []
+    state: dict[str, Any] = {}
+
+    def save() -> None:
+        saved.append(json.loads(json.dumps(state)))
+
+    with pytest.raises(httpx.ReadError):
+        download(
+            "https://x/r.zip", str(dest), state, http_client=client, save_state=save
+        )
+    # Saved before the first byte arrived, then after each chunk.
+    assert saved[0]["download"] == {
+        "url": "https://x/r.zip",
+        "etag": '"v1"',
+        "complete": False,
+        "offset": 0,
+    }
+    assert saved[-1]["download"]["offset"] == 300
+
+    fail = False
+    assert download("https://x/r.zip", str(dest), saved[-1], http_client=client)
+    assert ranges[-1] == "bytes=300-"
+    assert dest.read_bytes() == payload
@@ -0,0 +1,176 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+import sqlglot
+
+from app import allergen_index
+from app.allergen_index import AllergenIndex, allergen_names
+from app.ingest.refresh import DatasetVersion, changed_fdc_ids_sql, merge_sql
+from app.ingest.schema import INT64, STRING, TABLES_BY_NAME, FieldSpec, TableSpec
+
+
+def test_merge_sql_scopes_fdc_tables_to_changed_foods() -> None:
+    """fdc_id tables merge only changed foods; the SQL is valid BigQuery."""
+    sql = merge_sql(
+        TABLES_BY_NAME["food_nutrient"],
+        "p.d.food_nutrient",
+        "p.d_staging.food_nutrient",
+        True,
+    )
+    sqlglot.parse_one(sql, read="bigquery")
+    assert "WHERE fdc_id IN UNNEST(@changed_fdc_ids)" in sql
+    assert (
+        "NOT MATCHED BY SOURCE AND T.fdc_id IN UNNEST(@changed_fdc_ids) THEN DELETE"
+        in sql
+    )
+    assert "T.`amount` IS DISTINCT FROM S.`amount`" in sql
+    assert "UPDATE SET `fdc_id` = S.`fdc_id`" in sql  # the key `id` is never updated
+
+    # Key-only link tables have nothing to update.
+    sql = merge_sql(
+        TABLES_BY_NAME["lab_method_nutrient"], "p.d.lmn", "p.d_staging.lmn", False
+    )
+    sqlglot.parse_one(sql, read="bigquery")
+    assert "WHEN MATCHED" not in sql
+    assert sql.endswith("WHEN NOT MATCHED BY SOURCE THEN DELETE")
+
+
+def test_merge_sql_casts_an_fdc_id_that_is_not_int64() -> None:
+    """The INT64 id parameter is compared with a cast of a text fdc_id."""
+    spec = TableSpec(
+        "notes",
+        (FieldSpec("id", INT64, "REQUIRED"), FieldSpec("fdc_id", STRING)),
+        primary_key=("id",),
+    )
+    sql = merge_sql(spec, "p.d.notes", "p.d_staging.notes", True)
+    sqlglot.parse_one(sql, read="bigquery")
+    assert "WHERE SAFE_CAST(fdc_id AS INT64) IN UNNEST(@changed_fdc_ids)" in sql
+    assert "AND SAFE_CAST(T.fdc_id AS INT64) IN UNNEST(@changed_fdc_ids)" in sql
+    # food_component.fdc_id is typed, so its scope needs no cast.
+    sql = merge_sql(TABLES_BY_NAME["food_component"], "p.d.fc", "p.d_staging.fc", True)
+    assert "CAST" not in sql
+
+
+def test_changed_ids_sql_uses_update_log_and_food() -> None:
+    """Re-dated log entries and added or removed foods count as changed."""
+    sql = changed_fdc_ids_sql("p.d", "p.s", {"food_update_log_entry", "food"})
+    assert sql is not None
+    sqlglot.parse_one(sql, read="bigquery")
+    assert sql.count("UNION DISTINCT") == 2
+    assert changed_fdc_ids_sql("p.d", "p.s", {"nutrient"}) is None
+
+
+class FakeClient:
+    """Answers allergen index queries, scoped to `@fdc_ids` when given."""
+
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = rows
+        self.scoped_ids: list[int] | None = None
+
+    def query(self, sql: str, job_config: Any = None) -> Any:
+        rows = self.rows
+        if job_config is not None:
+            (param,) = job_config.query_parameters
+            self.scoped_ids = list(param.values)
+            rows = [r for r in rows if r["fdc_id"] in self.scoped_ids]
+        return SimpleNamespace(result=lambda: rows)
+
+
+def test_allergen_index_catches_up_selectively(monkeypatch: pytest.MonkeyPatch) -> None:
+    """An incremental refresh re-scans only its foods; a full one rebuilds."""
+    index = AllergenIndex.from_rows(
+        [
+            {
+                "fdc_id": 1,
+                "description": "Hummus",
+                "food_category": "",
+                "ingredients": [],
+            },
+            {
+                "fdc_id": 2,
+                "description": "Tofu",
+                "food_category": "",
+                "ingredients": [],
+            },
+        ]
+    )
+    client = FakeClient(
+        [
+            {
+                "fdc_id": 1,
+                "description": "Hummus",
+                "food_category": "",
+                "ingredients": ["Tahini"],
+            },
+            {
+                "fdc_id": 2,
+                "description": "Tofu, firm",
+                "food_category": "",
+                "ingredients": ["Soybeans"],
+            },
+        ]
+    )
+    versions = [
+        DatasetVersion(3, "incremental", ["food_nutrient", "input_food"], [1]),
+        DatasetVersion(4, "incremental", ["nutrient"], []),
+    ]
+    monkeypatch.setattr(
+        allergen_index,
+        "read_versions",
+        lambda client, project, dataset, after=0: [
+            v for v in versions if v.version > after
+        ],
+    )
+
+    assert index.catch_up(client=client)
+    assert client.scoped_ids == [1]
+    assert index.version == 4
+    assert allergen_names(index.get(1).contains) == ["sesame"]  # type: ignore[union-attr]
+    assert index.get(2).description == "Tofu"  # type: ignore[union-attr]
+    assert not index.catch_up(client=client)
+
+    versions.append(DatasetVersion(5, "full", ["food"]))
+    assert index.catch_up(client=client)
+    assert index.version == 5
+    assert index.get(2).description == "Tofu, firm"  # type: ignore[union-attr]
+
+
+def test_import_publishes_the_allergen_index(
+    tmp_path: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The first publish scans the dataset; later ones only catch up."""
+    client = FakeClient(
+        [{"fdc_id": 1, "description": "Hummus", "food_category": "", "ingredients": []}]
+    )
+    versions = [DatasetVersion(1, "full", ["food"])]
+    monkeypatch.setattr(
+        allergen_index,
+        "read_versions",
+        lambda client, project, dataset, after=0: [
+            v for v in versions if v.version > after
+        ],
+    )
+    path = str(tmp_path / "allergens.bin")
+    assert allergen_index.publish_allergen_index(path, client=client)
+    assert AllergenIndex.load(path).version == 1
+    assert not allergen_index.publish_allergen_index(path, client=client)
+
+    client.rows[0]["ingredients"] = ["Tahini"]
+    versions.append(DatasetVersion(2, "incremental", ["input_food"], [1]))
+    assert allergen_index.publish_allergen_index(path, client=client)
+    assert allergen_names(AllergenIndex.load(path).get(1).contains) == ["sesame"]  # type: ignore[union-attr]
@@ -0,0 +1,124 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from typing import Any
+
+from google.api_core.exceptions import NotFound
+from google.cloud.bigquery import SchemaField
+
+from app.bq_schema import DB_SCHEMA
+from app.ingest.load import load_file, load_job_config
+from app.ingest.schema import TABLES, TABLES_BY_NAME
+
+
+def test_number_columns_with_bad_values_are_typed() -> None:
+    """Columns with some non-numbers load typed; bad values become NULL."""
+    input_food = {f.name: f for f in TABLES_BY_NAME["input_food"].fields}
+    assert input_food["seq_num"].type == "INT64"
+    assert input_food["amount"].type == "FLOAT64"
+    assert input_food["gram_weight"].type == "FLOAT64"
+    assert input_food["amount"].null_if_invalid
+    assert not input_food["fdc_id"].null_if_invalid
+    label_weight = TABLES_BY_NAME["market_acquisition"].fields[3]
+    assert (label_weight.name, label_weight.type) == ("label_weight", "FLOAT64")
+
+    # The agent sees plain types: it is told never to CAST columns.
+    rendered = {t["table_name"]: t for t in json.loads(DB_SCHEMA)}
+    fields = {f["column_name"]: f for f in rendered["food_component"]["fields"]}
+    assert fields["fdc_id"] == {"column_name": "fdc_id", "data_type": "INT64"}
+    assert "CAST" not in DB_SCHEMA
+
+
+def test_prompt_schema_is_rendered_from_typed_tables() -> None:
+    """bq_schema.DB_SCHEMA covers every table and shows clustering."""
+    rendered = {t["table_name"]: t for t in json.loads(DB_SCHEMA)}
+    assert set(rendered) == {t.name for t in TABLES}
+    assert len(rendered) == 24
+    assert rendered["food_nutrient"]["clustered_by"] == ["fdc_id", "nutrient_id"]
+    assert rendered["food"]["clustered_by"] == ["food_category_id"]
+
+
+def test_load_job_config_uses_schema_and_clustering() -> None:
+    """Known tables load with an explicit schema; unknown ones autodetect."""
+    config = load_job_config(TABLES_BY_NAME["food_nutrient"])
+    assert not config.autodetect
+    assert [f.name for f in config.schema][:3] == ["id", "fdc_id", "nutrient_id"]
+    assert config.clustering_fields == ["fdc_id", "nutrient_id"]
+    # The table is created from the spec; loads must keep its REQUIRED modes.
+    assert config.write_disposition == "WRITE_TRUNCATE_DATA"
+    assert config.max_bad_records == 0
+    parquet = load_job_config(TABLES_BY_NAME["food"], source_format="PARQUET")
+    assert parquet.write_disposition == "WRITE_TRUNCATE_DATA"
+    assert load_job_config(None).autodetect
+    assert load_job_config(None).write_disposition == "WRITE_TRUNCATE"
+
+
+class _Job:
+    def __init__(self) -> None:
+        self.output_rows = 9
+        self.errors = [{"message": "Could not parse 'x' as INT64"}]
+        self._properties = {"statistics": {"load": {"badRecords": "3"}}}
+
+    def result(self) -> None:
+        pass
+
+
+class _Client:
+    def __init__(self, table: Any = None) -> None:
+        self.table = table
+        self.calls: list[str] = []
+
+    def get_table(self, table_id: str) -> Any:
+        if self.table is None:
+            raise NotFound(table_id)
+        return self.table
+
+    def delete_table(self, table_id: str) -> None:
+        self.calls.append("delete")
+
+    def create_table(self, table: Any) -> None:
+        self.calls.append("create")
+        self.table = table
+
+    def load_table_from_file(self, f: Any, table_id: str, job_config: Any) -> _Job:
+        self.calls.append("load")
+        return _Job()
+
+
+def test_load_file_creates_tables_and_reports_rejected_rows(tmp_path: Any) -> None:
+    """Tables are created from the spec once; rejected rows are reported."""
+    path = tmp_path / "food.parquet"
+    path.write_bytes(b"")
+    client = _Client()
+    summary = load_file(client, str(path), "p", "d", source_format="PARQUET")
+    assert client.calls == ["create", "load"]
+    assert client.table.schema[0].mode == "REQUIRED"
+    assert summary == {"table": "food", "rows": 9, "rejected": 3, "errors": 1}
+
+    # The API reports INT64 as INTEGER; an unchanged table is kept.
+    client.table.schema = [
+        SchemaField(
+            f.name, "INTEGER" if f.field_type == "INT64" else f.field_type, f.mode
+        )
+        for f in client.table.schema
+    ]
+    client.calls.clear()
+    load_file(client, str(path), "p", "d", source_format="PARQUET")
+    assert client.calls == ["load"]
+
+    client.table.clustering_fields = ["fdc_id"]
+    client.calls.clear()
+    load_file(client, str(path), "p", "d", source_format="PARQUET")
+    assert client.calls == ["delete", "create", "load"]
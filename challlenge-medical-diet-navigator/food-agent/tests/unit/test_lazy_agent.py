@@ -0,0 +1,48 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+def test_importing_app_does_not_build_the_agent_graph() -> None:
+    """ADK, credentials and BigQuery are only loaded when root_agent is used."""
+    script = (
+        "import json, sys\n"
+        "import app, app.agent, app.bq_agent, app.allergen_agent\n"
+        "print(json.dumps([m for m in ('google.adk.agents', 'google.adk.tools.bigquery', "
+        "'google.auth') if m in sys.modules]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).resolve().parents[2],
+        check=True,
+    )
+    assert json.loads(result.stdout) == []
+
+
+def test_unknown_attributes_still_raise() -> None:
+    import app
+    import app.agent
+
+    with pytest.raises(AttributeError):
+        app.agent.not_an_agent  # noqa: B018
+    with pytest.raises(ImportError):
+        from app import not_an_agent  # noqa: F401
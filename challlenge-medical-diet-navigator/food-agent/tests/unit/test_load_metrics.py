@@ -0,0 +1,48 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import random
+from collections import Counter
+
+from tests.load_test.corpus import CORPUS, pick_prompt
+from tests.load_test.metrics import LatencySummary, StreamTimer, percentile
+
+
+def test_stream_timer_and_percentiles() -> None:
+    """First event, gaps and totals are recorded per category and summarized."""
+    ticks = iter([0.0, 0.4, 0.5, 0.8, 1.0])
+    timer = StreamTimer(clock=lambda: next(ticks))
+    for _ in range(3):
+        timer.event()
+    summary = LatencySummary()
+    summary.record_stream("diet", timer, timer.finish())
+
+    rows = {row["metric"]: row for row in summary.rows()}
+    assert math.isclose(rows["ttft"]["p50"], 400)
+    assert rows["gap"]["count"] == 2
+    assert math.isclose(rows["gap"]["max"], 300)
+    assert math.isclose(rows["total"]["p99"], 1000)
+    assert rows["events"]["p50"] == 3
+
+    values = list(range(1, 101))
+    assert [percentile(values, q) for q in (50, 95, 99)] == [50, 95, 99]
+    assert math.isnan(percentile([], 50))
+
+
+def test_prompt_mix_follows_weights() -> None:
+    rng = random.Random(0)
+    counts = Counter(pick_prompt(rng)[0] for _ in range(4000))
+    for category, weight, _ in CORPUS:
+        assert abs(counts[category] / 4000 - weight) < 0.03
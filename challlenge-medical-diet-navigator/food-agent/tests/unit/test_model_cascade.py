@@ -0,0 +1,215 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections.abc import AsyncGenerator
+from typing import ClassVar
+
+import pytest
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools import FunctionTool
+from google.genai import types
+
+from app import model_cascade
+from app.model_cascade import (
+    STATS,
+    CascadeLlm,
+    ModelTier,
+    cascade_model,
+    parse_tiers,
+)
+
+
+class ScriptedLlm(BaseLlm):
+    """Returns the next scripted response for its model name."""
+
+    script: ClassVar[dict[str, list[LlmResponse]]] = {}
+    seen: ClassVar[list[tuple[str, int | None]]] = []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        assert llm_request.config is not None
+        self.seen.append((self.model, llm_request.config.max_output_tokens))
+        yield self.script[self.model].pop(0)
+
+
+def _text(text: str) -> LlmResponse:
+    return LlmResponse(
+        content=types.Content(role="model", parts=[types.Part(text=text)])
+    )
+
+
+def _call(name: str, **args: object) -> LlmResponse:
+    part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+    return LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def lookup_food_allergens(fdc_id: int) -> dict:
+    """Look up allergens."""
+    return {}
+
+
+def _run(cascade: CascadeLlm, request: LlmRequest) -> list[LlmResponse]:
+    async def collect() -> list[LlmResponse]:
+        return [r async for r in cascade.generate_content_async(request)]
+
+    return asyncio.run(collect())
+
+
+def _cascade(name: str) -> CascadeLlm:
+    cascade = CascadeLlm(
+        model="strong",
+        name=name,
+        tiers=[ModelTier("cheap", 1024), ModelTier("strong", 8192)],
+    )
+    for model in ("cheap", "strong"):
+        cascade._llms[model] = ScriptedLlm(model=model)
+    return cascade
+
+
+def _request(*contents: types.Content) -> LlmRequest:
+    request = LlmRequest(
+        contents=list(contents)
+        or [types.Content(role="user", parts=[types.Part(text="hi")])],
+        config=types.GenerateContentConfig(max_output_tokens=32768, tools=[]),
+    )
+    request.append_tools([FunctionTool(lookup_food_allergens)])
+    return request
+
+
+def test_parse_tiers() -> None:
+    """Budgets are optional per tier."""
+    assert parse_tiers("a:100:0, b") == [ModelTier("a", 100, 0), ModelTier("b")]
+
+
+def test_cheap_tier_answers_and_budget_applies() -> None:
+    """A confident cheap answer is used as-is, with that tier's budget."""
+    ScriptedLlm.seen.clear()
+    ScriptedLlm.script = {"cheap": [_text("Hummus contains sesame.")], "strong": []}
+    responses = _run(_cascade("t1"), _request())
+    assert responses[0].custom_metadata == {"model_tier": "cheap"}
+    assert ScriptedLlm.seen == [("cheap", 1024)]
+    assert STATS.snapshot()["t1"]["answered_by"] == {"cheap": 1}
+
+
+def test_escalates_on_low_confidence_and_invalid_calls() -> None:
+    """Hedged answers, unknown tools and missing arguments escalate."""
+    for bad in (
+        _text("I'm not sure which foods contain sesame."),
+        _call("drop_tables"),
+        _call("lookup_food_allergens"),
+    ):
+        ScriptedLlm.script = {
+            "cheap": [bad],
+            "strong": [_call("lookup_food_allergens", fdc_id=1)],
+        }
+        responses = _run(_cascade("t2"), _request())
+        assert responses[0].custom_metadata is not None
+        assert responses[0].custom_metadata["model_tier"] == "strong"
+    assert STATS.snapshot()["t2"]["escalations"] == {
+        "low_confidence": 1,
+        "unknown_tool": 1,
+        "missing_argument": 1,
+    }
+
+
+def test_tool_error_starts_at_stronger_tier() -> None:
+    """After a failed tool call the cheap tier is skipped for the next turn."""
+    ScriptedLlm.seen.clear()
+    ScriptedLlm.script = {"cheap": [], "strong": [_text("Sorry, let me retry.")]}
+    error = types.Part(
+        function_response=types.FunctionResponse(
+            name="execute_sql",
+            response={"status": "ERROR", "error_details": "bad column"},
+        )
+    )
+    _run(_cascade("t3"), _request(types.Content(role="user", parts=[error])))
+    assert ScriptedLlm.seen == [("strong", 8192)]
+    assert STATS.snapshot()["t3"]["escalations"] == {"tool_error": 1}
+
+
+class StreamingLlm(BaseLlm):
+    """Streams its scripted chunks, logging each one it sends."""
+
+    script: ClassVar[dict[str, list[str]]] = {}
+    log: ClassVar[list[str]] = []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        for i, chunk in enumerate(self.script[self.model]):
+            self.log.append(f"{self.model} sent {i}")
+            response = _text(chunk)
+            response.partial = True
+            yield response
+
+
+def _stream(cascade: CascadeLlm) -> list[LlmResponse]:
+    async def collect() -> list[LlmResponse]:
+        received: list[LlmResponse] = []
+        async for r in cascade.generate_content_async(_request(), stream=True):
+            StreamingLlm.log.append(f"got {len(received)}")
+            received.append(r)
+        return received
+
+    for model in ("cheap", "strong"):
+        cascade._llms[model] = StreamingLlm(model=model)
+    return asyncio.run(collect())
+
+
+def test_streamed_cheap_answer_is_not_buffered() -> None:
+    """Once past COMMIT_CHARS without hedging, chunks pass straight through."""
+    StreamingLlm.log.clear()
+    first = "Hummus is made from chickpeas and tahini. " * 4
+    StreamingLlm.script = {"cheap": [first, "Tahini is sesame.", "Done."], "strong": []}
+    received = _stream(_cascade("t4"))
+    assert len(first) >= model_cascade.COMMIT_CHARS
+    assert StreamingLlm.log == [
+        "cheap sent 0",
+        "got 0",
+        "cheap sent 1",
+        "got 1",
+        "cheap sent 2",
+        "got 2",
+    ]
+    assert all(r.custom_metadata == {"model_tier": "cheap"} for r in received)
+
+
+def test_streamed_hedge_escalates_without_reading_on() -> None:
+    """A hedge in the first chunks stops the cheap tier and nothing leaks."""
+    StreamingLlm.log.clear()
+    StreamingLlm.script = {
+        "cheap": ["I'm not sure, ", "but maybe?"],
+        "strong": ["Hummus contains sesame."],
+    }
+    received = _stream(_cascade("t5"))
+    assert StreamingLlm.log == ["cheap sent 0", "strong sent 0", "got 0"]
+    assert received[0].custom_metadata is not None
+    assert received[0].custom_metadata["model_tier"] == "strong"
+
+
+def test_cascade_is_opt_in_per_agent(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Off by default; when on, only the listed agents use it."""
+    config = model_cascade.Config
+    monkeypatch.setattr(config, "MODEL_TIERS", "cheap,strong")
+    assert not config.MODEL_CASCADE_ENABLED
+    assert cascade_model("allergy_research_agent") == config.MODEL
+
+    monkeypatch.setattr(config, "MODEL_CASCADE_ENABLED", True)
+    assert cascade_model("allergy_research_agent") == config.MODEL
+    assert cascade_model("main_agent") == config.MODEL
+    assert isinstance(cascade_model("imagen_tool_agent"), CascadeLlm)
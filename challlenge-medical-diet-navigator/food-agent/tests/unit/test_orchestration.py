@@ -0,0 +1,41 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from argparse import Namespace
+from collections import defaultdict
+
+from app import image_agent
+from tests.benchmarks import bench_orchestration
+from tests.benchmarks.fakes import ScriptedLlm
+
+
+def test_scenario_corpus_runs_on_script() -> None:
+    """Every benchmark scenario runs through root_agent with exactly its scripted model calls."""
+    ScriptedLlm.install()
+    root_agent = bench_orchestration.build_root_agent(query_s=0.0, rows=3)
+    args = Namespace(llm_s=0.0, query_s=0.0)
+    results: dict = defaultdict(bench_orchestration.TurnResult)
+
+    # run_turn raises when a turn leaves its script or calls an agent off-script.
+    asyncio.run(bench_orchestration.run_pass(root_agent, args, results))
+    jobs = image_agent._get_job_runner()
+    while jobs.pending:
+        time.sleep(0.01)
+
+    assert results[("allergen_scan", 0)].model_calls == 0
+    planner = results[("compound_planner", 0)]
+    assert (planner.model_calls, planner.function_calls) == (4, 1)
+    assert results[("transfer_bigquery", 0)].events == 5
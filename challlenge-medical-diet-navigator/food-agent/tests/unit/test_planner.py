@@ -0,0 +1,239 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from typing import ClassVar
+
+from google.adk.agents import BaseAgent, LlmAgent, ParallelAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from app.planner import (
+    ALLERGY_RESULT_KEY,
+    ALLERGY_TASK_KEY,
+    DATA_RESULT_KEY,
+    DATA_TASK_KEY,
+    QUESTION_KEY,
+    PlannerAgent,
+    build_compound_pipeline,
+    plan_compound,
+)
+
+# (start, end) of each SlowAgent run, to check which runs overlapped.
+RUNS: list[tuple[float, float]] = []
+
+
+class SlowAgent(BaseAgent):
+    """Sleeps, then writes its name to `output_key` like an LlmAgent would."""
+
+    delay: float = 0.2
+    output_key: str = ""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        start = time.perf_counter()
+        await asyncio.sleep(self.delay)
+        RUNS.append((start, time.perf_counter()))
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(
+                role="model", parts=[types.Part.from_text(text=self.name)]
+            ),
+            actions=EventActions(state_delta={self.output_key: self.name}),
+        )
+
+
+class MergeAgent(BaseAgent):
+    """Echoes both branch results from state."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        text = f"{state[DATA_RESULT_KEY]}+{state[ALLERGY_RESULT_KEY]}"
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            content=types.Content(
+                role="model", parts=[types.Part.from_text(text=text)]
+            ),
+        )
+
+
+class BranchLlm(BaseLlm):
+    """Replays scripted responses per model name and records the requests."""
+
+    script: ClassVar[dict[str, list[LlmResponse]]] = {}
+    requests: ClassVar[list[tuple[str, LlmRequest]]] = []
+    delay: float = 0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.requests.append((self.model, llm_request))
+        await asyncio.sleep(self.delay)
+        yield self.script[self.model].pop(0)
+
+
+def _reply(text: str) -> LlmResponse:
+    return LlmResponse(
+        content=types.Content(role="model", parts=[types.Part(text=text)])
+    )
+
+
+def _call(name: str, **args: object) -> LlmResponse:
+    part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+    return LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def test_plan_compound_detects_independent_tasks() -> None:
+    """Data + allergy questions split; single-intent questions do not."""
+    plan = plan_compound(
+        "Give me high-protein snacks that are safe for a sesame allergy"
+    )
+    assert plan is not None
+    assert "sesame" in plan.allergy_task
+    assert "nutrition data" in plan.data_task
+    assert plan_compound("What are the top 10 highest protein foods?") is None
+    assert plan_compound("What are the symptoms of a sesame allergy?") is None
+    # Allergy questions that only mention foods need no USDA lookup.
+    assert plan_compound("What foods should I avoid with a peanut allergy?") is None
+    assert plan_compound("Give me a recipe without eggs") is None
+
+
+async def run_sql(sql: str) -> dict:
+    """Runs a query; slow enough for the allergy branch to answer first."""
+    await asyncio.sleep(0.4)
+    return {"rows": [{"description": "Lentils", "protein_g": 9.0}]}
+
+
+def test_data_branch_keeps_its_own_tool_calls() -> None:
+    """
+    The allergy branch answers between the data branch's SQL call and its
+    result. The data branch must still see its call (include_contents="none"
+    starts its turn at that reply, drops the call and fails).
+    """
+    BranchLlm.script = {
+        "data": [_call("run_sql", sql="SELECT 1"), _reply("Lentils: 9 g")],
+        "allergy": [_reply("Avoid peanuts")],
+        "merge": [_reply("Lentils are fine")],
+    }
+    BranchLlm.requests.clear()
+    data = LlmAgent(
+        name="data",
+        model=BranchLlm(model="data"),
+        instruction="data rules",
+        tools=[run_sql],
+    )
+    allergy = LlmAgent(
+        name="allergy",
+        model=BranchLlm(model="allergy", delay=0.1),
+        instruction="allergy rules",
+    )
+    pipeline = build_compound_pipeline(data, allergy, model=BranchLlm(model="merge"))
+    runner = InMemoryRunner(agent=pipeline, app_name="test")
+    session = asyncio.run(
+        runner.session_service.create_session(
+            app_name="test",
+            user_id="u",
+            state={
+                QUESTION_KEY: "High protein, no peanuts",
+                DATA_TASK_KEY: "high protein",
+                ALLERGY_TASK_KEY: "peanuts",
+            },
+        )
+    )
+
+    events = list(
+        runner.run(
+            user_id="u",
+            session_id=session.id,
+            new_message=types.Content(
+                role="user",
+                parts=[types.Part.from_text(text="High protein, no peanuts")],
+            ),
+        )
+    )
+
+    authors = [e.author for e in events]
+    call = authors.index("planner_data_branch")
+    assert (
+        call
+        < authors.index("planner_allergy_branch")
+        < authors.index("planner_data_branch", call + 1)
+    )
+    (_, second) = [r for model, r in BranchLlm.requests if model == "data"]
+    parts = [p for c in second.contents for p in c.parts or []]
+    assert [p.function_call.name for p in parts if p.function_call] == ["run_sql"]
+    assert [p.function_response.name for p in parts if p.function_response] == [
+        "run_sql"
+    ]
+    assert events[-1].content is not None and events[-1].content.parts
+    assert events[-1].content.parts[0].text == "Lentils are fine"
+
+
+def test_compound_question_runs_branches_concurrently() -> None:
+    """The two lookups run at the same time."""
+    RUNS.clear()
+    pipeline = SequentialAgent(
+        name="pipeline",
+        sub_agents=[
+            ParallelAgent(
+                name="lookups",
+                sub_agents=[
+                    SlowAgent(name="data", delay=0.3, output_key=DATA_RESULT_KEY),
+                    SlowAgent(name="allergy", delay=0.3, output_key=ALLERGY_RESULT_KEY),
+                ],
+            ),
+            MergeAgent(name="merge"),
+        ],
+    )
+    planner = PlannerAgent(
+        name="compound_planner", sub_agents=[SlowAgent(name="main", delay=0), pipeline]
+    )
+    runner = InMemoryRunner(agent=planner, app_name="test")
+    service = runner.session_service
+    session = asyncio.run(service.create_session(app_name="test", user_id="u"))
+
+    events = list(
+        runner.run(
+            user_id="u",
+            session_id=session.id,
+            new_message=types.Content(
+                role="user",
+                parts=[types.Part.from_text(text="Low sugar snacks without peanuts")],
+            ),
+        )
+    )
+
+    (data_start, data_end), (allergy_start, allergy_end) = sorted(RUNS)
+    assert allergy_start < data_end and data_start < allergy_end
+    assert events[-1].content is not None and events[-1].content.parts
+    assert events[-1].content.parts[0].text == "data+allergy"
+    updated = asyncio.run(
+        service.get_session(app_name="test", user_id="u", session_id=session.id)
+    )
+    assert updated is not None
+    session = updated
+    assert "peanuts" in session.state[ALLERGY_TASK_KEY]
@@ -0,0 +1,156 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from app import allergen_index
+from app.allergen_index import AllergenIndex
+from app.router import (
+    ALLERGEN_SCAN,
+    IMAGE_AGENT,
+    USDA_AGENT,
+    IntentRouter,
+    IntentRouterAgent,
+    NaiveBayesIntentClassifier,
+)
+
+
+class EchoAgent(BaseAgent):
+    """Replies with its own name, standing in for a model-backed agent."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            content=types.Content(
+                role="model", parts=[types.Part.from_text(text=self.name)]
+            ),
+        )
+
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A tiny allergen index in place of the published snapshot."""
+    rows = [
+        {"fdc_id": 1, "description": "Shrimp salad", "ingredients": ["Shrimp, cooked"]},
+        {"fdc_id": 2, "description": "Hummus, commercial", "ingredients": []},
+    ]
+    monkeypatch.setattr(allergen_index, "_index", AllergenIndex.from_rows(rows))
+
+
+def test_rules_route_confident_messages() -> None:
+    """Unambiguous messages are routed by rules; ambiguous ones fall back."""
+    router = IntentRouter()
+    assert (
+        router.route("What are the top 10 highest protein foods?").target == USDA_AGENT
+    )
+    assert router.route("How much fiber is in 100 g of oats?").target == USDA_AGENT
+    assert (
+        router.route("Generate an image of a Mediterranean breakfast").target
+        == IMAGE_AGENT
+    )
+    # Safety questions always go to the main agent.
+    safety = "Is it safe to eat 50 grams of almonds with an allergy?"
+    assert router.route(safety).target is None
+    assert router.route("Tell me about the Mediterranean diet").target is None
+    # Nutrient words alone are not a lookup in the USDA data.
+    assert router.route("How many calories should I eat per day?").target is None
+    assert router.route("how much water should I drink").target is None
+    assert router.route("How many grams of protein do I need?").target is None
+
+
+def test_allergen_answers_need_the_index() -> None:
+    """Only allergens the index lists for a named USDA food are answered locally."""
+    router = IntentRouter()
+    decision = router.route("Does fdc_id 1 contain shellfish?")
+    assert decision.target == ALLERGEN_SCAN
+    assert decision.details["allergens"] == ["shellfish"]
+    assert decision.decision_ms < 50
+    # The index not listing an allergen, or not knowing the food, is no answer.
+    assert router.route("Does fdc_id 2 contain sesame?").target is None
+    assert router.route("Does fdc_id 3 contain milk?").target is None
+    for question in (
+        "Does peanut butter contain peanuts?",
+        "Does vegan butter contain milk?",
+        "Does dairy-free cheese contain milk?",
+        "Does egg-free mayonnaise contain egg?",
+        "Is gluten free bread made with wheat?",
+    ):
+        assert router.route(question).target is None, question
+
+
+def test_classifier_routes_above_threshold() -> None:
+    """A classifier trained on transfers routes what the rules miss."""
+    clf = NaiveBayesIntentClassifier().fit(
+        [("which foods pack the most iron", USDA_AGENT)] * 5
+        + [("paint me a bowl of fruit", IMAGE_AGENT)] * 5
+    )
+    router = IntentRouter(classifier=clf, threshold=0.8)
+    decision = router.route("which foods pack the most zinc")
+    assert decision.target == USDA_AGENT
+    assert decision.source == "classifier"
+    restored = NaiveBayesIntentClassifier.from_dict(clf.to_dict())
+    assert restored.predict_proba("paint me a salad")[IMAGE_AGENT] > 0.8
+
+
+def _run(agent: BaseAgent, text: str) -> list[Event]:
+    runner = InMemoryRunner(agent=agent, app_name="test")
+    session = asyncio.run(
+        runner.session_service.create_session(app_name="test", user_id="u")
+    )
+    return list(
+        runner.run(
+            user_id="u",
+            session_id=session.id,
+            new_message=types.Content(
+                role="user", parts=[types.Part.from_text(text=text)]
+            ),
+        )
+    )
+
+
+def test_router_agent_dispatches_and_reports_saved_latency() -> None:
+    """Routed turns skip main_agent and carry saved-latency metadata."""
+    main = EchoAgent(name="main_agent", sub_agents=[EchoAgent(name=USDA_AGENT)])
+    root = IntentRouterAgent(name="intent_router", sub_agents=[main])
+
+    events = _run(root, "How many calories are in an apple?")
+    assert [e.author for e in events] == [USDA_AGENT]
+    assert events[0].custom_metadata is not None
+    assert events[0].custom_metadata["router"]["saved_ms"] > 0
+
+    events = _run(root, "Does fdc_id 1 contain shellfish?")
+    assert [e.author for e in events] == ["intent_router"]
+    assert events[0].content is not None and events[0].content.parts
+    reply = events[0].content.parts[0].text
+    assert reply == (
+        "Shrimp salad (USDA fdc_id 1) lists shellfish in its description or ingredients."
+    )
+
+    events = _run(root, "Plan my week of meals")
+    assert [e.author for e in events] == ["main_agent"]
+
+    stats = root.stats.snapshot()
+    assert stats["routed"] == {USDA_AGENT: 1, ALLERGEN_SCAN: 1}
+    assert stats["fallbacks"] == 1
@@ -0,0 +1,102 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from app.utils import search_cache
+from app.utils.cache_store import SqliteTTLCache
+
+
+def test_cache_store_ttl_lru_and_stats(tmp_path: Path) -> None:
+    """Entries expire, LRU entries are evicted and stats are shared."""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SqliteTTLCache(path, namespace="t", ttl_seconds=60, max_entries=2)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.set("c", {"v": 3})  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    cache.set("d", {"v": 4}, ttl_seconds=-1)
+    assert cache.get("d") is None
+
+    other_worker = SqliteTTLCache(path, namespace="t", ttl_seconds=60)
+    assert other_worker.get("c") == {"v": 3}
+    stats = other_worker.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == pytest.approx(0.5)
+
+
+def test_normalize_query() -> None:
+    """Case, punctuation and filler words do not change the key."""
+    assert search_cache.normalize_query(
+        "What are the symptoms of a SESAME allergy?"
+    ) == search_cache.normalize_query("symptoms of sesame allergy")
+
+
+def _request(text: str) -> LlmRequest:
+    return LlmRequest(
+        model="gemini-2.5-flash",
+        contents=[types.Content(role="user", parts=[types.Part.from_text(text=text)])],
+    )
+
+
+def test_callbacks_replay_grounded_answer(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A repeat question is served from the cache with its citations."""
+    monkeypatch.setattr(
+        search_cache,
+        "_cache",
+        SqliteTTLCache(str(tmp_path / "c.sqlite3"), "google_search", ttl_seconds=60),
+    )
+    ctx: Any = SimpleNamespace(state={}, agent_name="allergy_research_agent")
+
+    assert (
+        search_cache.before_model_search_cache(ctx, _request("Is tahini sesame?"))
+        is None
+    )
+    answer = LlmResponse(
+        content=types.Content(
+            role="model", parts=[types.Part.from_text(text="Yes, tahini is sesame.")]
+        ),
+        grounding_metadata=types.GroundingMetadata(
+            grounding_chunks=[
+                types.GroundingChunk(
+                    web=types.GroundingChunkWeb(uri="https://example.org", title="FARE")
+                )
+            ]
+        ),
+    )
+    search_cache.after_model_search_cache(ctx, answer)
+
+    start = time.perf_counter()
+    cached = search_cache.before_model_search_cache(ctx, _request("is TAHINI sesame"))
+    assert time.perf_counter() - start < 0.5
+    assert cached is not None
+    assert cached.content is not None and cached.content.parts
+    assert cached.content.parts[0].text == "Yes, tahini is sesame."
+    assert cached.grounding_metadata is not None
+    assert cached.grounding_metadata.grounding_chunks
+    web = cached.grounding_metadata.grounding_chunks[0].web
+    assert web is not None and web.uri == "https://example.org"
+    assert search_cache.search_cache_stats()["hits"] == 1
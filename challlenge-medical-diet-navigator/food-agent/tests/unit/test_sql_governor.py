@@ -0,0 +1,150 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app import sql_governor
+from app.sql_governor import QueryRejected, govern_sql
+
+DS = "`proj.usda_dataset"
+
+
+def _govern(sql: str) -> sql_governor.GovernedQuery:
+    return govern_sql(sql, project_id="proj", dataset_name="usda_dataset", max_rows=100)
+
+
+def test_select_star_is_pruned_and_limited() -> None:
+    """`SELECT *` on a wide table becomes a short column list with a LIMIT."""
+    governed = _govern(f"SELECT * FROM {DS}.food_nutrient` WHERE nutrient_id = 1003")
+    assert "*" not in governed.sql
+    assert "fdc_id, nutrient_id, amount" in governed.sql
+    assert governed.sql.endswith("LIMIT 100")
+    assert governed.rewrites == ["expanded * on food_nutrient", "added LIMIT 100"]
+
+
+def test_limit_is_capped_and_count_star_untouched() -> None:
+    """Large limits are capped; aggregates keep their `*`."""
+    governed = _govern(f"SELECT COUNT(*) FROM {DS}.food` LIMIT 100000")
+    assert "COUNT(*)" in governed.sql
+    assert governed.sql.endswith("LIMIT 100")
+
+
+def test_joins_must_follow_key_paths() -> None:
+    """Key-path joins pass; cross joins and arbitrary joins are rejected."""
+    governed = _govern(
+        f"SELECT f.description, n.name, fn.amount FROM {DS}.food` f "
+        f"JOIN {DS}.food_nutrient` fn ON f.fdc_id = fn.fdc_id "
+        f"JOIN {DS}.nutrient` n ON n.id = fn.nutrient_id "
+        "WHERE n.name = 'Protein' ORDER BY fn.amount DESC LIMIT 10"
+    )
+    assert governed.sql.endswith("LIMIT 10")
+
+    with pytest.raises(QueryRejected, match="Cross and comma joins"):
+        _govern(f"SELECT f.fdc_id FROM {DS}.food` f, {DS}.food_nutrient` fn")
+    with pytest.raises(QueryRejected, match="Cross and comma joins"):
+        _govern(f"SELECT f.fdc_id FROM {DS}.food` f CROSS JOIN {DS}.nutrient` n")
+    with pytest.raises(QueryRejected, match="known key path"):
+        _govern(
+            f"SELECT f.fdc_id FROM {DS}.food` f JOIN {DS}.nutrient` n ON f.fdc_id = n.id"
+        )
+
+
+def test_self_joins_and_join_conditions() -> None:
+    """Same-table key joins pass; the key equality must be an AND term."""
+    governed = _govern(
+        f"SELECT a.amount, b.amount FROM {DS}.food_nutrient` a "
+        f"JOIN {DS}.food_nutrient` b ON a.fdc_id = b.fdc_id AND b.nutrient_id = 1008 "
+        "WHERE a.nutrient_id = 1003"
+    )
+    assert governed.sql.endswith("LIMIT 100")
+
+    for on in (
+        "f.fdc_id = fn.fdc_id OR TRUE",
+        "(f.fdc_id = fn.fdc_id AND fn.amount > 1) OR fn.amount > 0",
+        "f.fdc_id = f.fdc_id",
+    ):
+        with pytest.raises(QueryRejected, match=r"known key path|equality"):
+            _govern(
+                f"SELECT f.fdc_id FROM {DS}.food` f JOIN {DS}.food_nutrient` fn ON {on}"
+            )
+
+
+def test_rejects_other_datasets_and_statements() -> None:
+    """Only single SELECTs over the configured dataset are allowed."""
+    with pytest.raises(QueryRejected):
+        _govern("SELECT * FROM `bigquery-public-data.samples.wikipedia`")
+    with pytest.raises(QueryRejected):
+        _govern(f"DELETE FROM {DS}.food` WHERE TRUE")
+    with pytest.raises(QueryRejected):
+        _govern(f"SELECT 1; SELECT * FROM {DS}.food`")
+
+
+def test_callback_rewrites_args_and_enforces_byte_budget(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The tool callback rewrites in place and rejects over-budget dry runs."""
+    monkeypatch.setattr(sql_governor.Config, "SQL_DRY_RUN", True)
+    monkeypatch.setattr(sql_governor.Config, "SQL_MAX_BYTES_SCANNED", 1000)
+    scanned = {"bytes": 10}
+    monkeypatch.setattr(sql_governor, "_get_bq_client", lambda project_id: None)
+    monkeypatch.setattr(
+        sql_governor, "dry_run_bytes", lambda client, sql: scanned["bytes"]
+    )
+    tool: Any = SimpleNamespace(name="execute_sql")
+    ctx: Any = SimpleNamespace(function_call_id="call-1")
+
+    args = {"project_id": "proj", "query": f"SELECT * FROM {DS}.food`"}
+    monkeypatch.setattr(
+        sql_governor,
+        "govern_sql",
+        lambda sql, project_id: govern_sql(sql, project_id, "usda_dataset", 100),
+    )
+    assert sql_governor.before_execute_sql(tool, args, ctx) is None
+    assert "LIMIT 100" in args["query"]
+
+    scanned["bytes"] = 10_000
+    args = {"project_id": "proj", "query": f"SELECT fdc_id FROM {DS}.food`"}
+    result = sql_governor.before_execute_sql(tool, args, ctx)
+    assert result is not None
+    assert "byte budget" in result["error_details"]
+
+
+def test_dry_run_errors_are_not_rejections(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A failing dry run is reported to the model but not counted as rejected."""
+    monkeypatch.setattr(sql_governor.Config, "SQL_DRY_RUN", True)
+    monkeypatch.setattr(sql_governor, "STATS", sql_governor.GovernorStats())
+    monkeypatch.setattr(sql_governor, "_get_bq_client", lambda project_id: None)
+
+    def fail(client: Any, sql: str) -> int:
+        raise RuntimeError("Unrecognized name: protein")
+
+    monkeypatch.setattr(sql_governor, "dry_run_bytes", fail)
+    tool: Any = SimpleNamespace(name="execute_sql")
+    args = {"project_id": "proj", "query": f"SELECT protein FROM {DS}.food`"}
+    result = sql_governor.before_execute_sql(tool, args, None)
+    assert result is not None
+    assert "Unrecognized name" in result["error_details"]
+    stats = sql_governor.sql_governor_stats()
+    assert stats["rejected"] == 0
+    assert stats["dry_run_errors"] == 1
+
+
+def test_stale_start_times_are_dropped(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Calls whose after callback never ran do not pile up."""
+    monkeypatch.setattr(sql_governor, "_started", {"lost": -1e9})
+    sql_governor._mark_started("call-2")
+    assert list(sql_governor._started) == ["call-2"]
@@ -0,0 +1,105 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any
+
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.trace import Status, StatusCode, set_span_in_context
+
+from app.utils.tail_sampling import TailSamplingSpanProcessor
+
+
+class Collect(SpanProcessor):
+    def __init__(self) -> None:
+        self.spans: list[ReadableSpan] = []
+
+    def on_end(self, span: ReadableSpan) -> None:
+        self.spans.append(span)
+
+
+def _setup(**kwargs: Any) -> tuple[TailSamplingSpanProcessor, Collect, TracerProvider]:
+    collect = Collect()
+    sampler = TailSamplingSpanProcessor(collect, keep_tools={"execute_sql"}, **kwargs)
+    provider = TracerProvider()
+    provider.add_span_processor(sampler)
+    return sampler, collect, provider
+
+
+def _turn(
+    provider: TracerProvider, tool: str | None = None, error: bool = False
+) -> None:
+    tracer = provider.get_tracer("test")
+    with tracer.start_as_current_span("invocation"):
+        with tracer.start_as_current_span("call_llm"):
+            pass
+        if tool:
+            with tracer.start_as_current_span(f"execute_tool {tool}") as span:
+                span.set_attribute("gen_ai.tool.name", tool)
+                if error:
+                    span.set_status(Status(StatusCode.ERROR, "bad column"))
+
+
+def test_interesting_traces_are_kept_whole() -> None:
+    """Tool and error traces are always exported, with every span of the trace."""
+    sampler, collect, provider = _setup(sample_rate=0.0)
+    _turn(provider)
+    _turn(provider, tool="execute_sql")
+    _turn(provider, tool="google_search", error=True)
+    _turn(provider, tool="google_search")
+
+    assert [s.name for s in collect.spans] == [
+        "call_llm",
+        "execute_tool execute_sql",
+        "invocation",
+        "call_llm",
+        "execute_tool google_search",
+        "invocation",
+    ]
+    stats = sampler.stats()
+    assert stats["kept_traces"] == {"tool": 1, "error": 1}
+    assert stats["dropped_traces"] == 2
+    assert (stats["kept_spans"], stats["dropped_spans"]) == (6, 5)
+    assert stats["pending_traces"] == 0
+
+
+def test_slow_and_sampled_traces() -> None:
+    """Slow traces are kept; fast ones follow the sample rate."""
+    _, collect, provider = _setup(sample_rate=0.0, slow_ms=0)
+    _turn(provider)
+    assert len(collect.spans) == 2
+
+    sampler, collect, provider = _setup(sample_rate=0.5)
+    for _ in range(400):
+        _turn(provider)
+    kept = sampler.stats()["kept_traces"]["sampled"]
+    assert 140 < kept < 260
+    assert len(collect.spans) == 2 * kept
+
+
+def test_unfinished_traces_are_bounded() -> None:
+    """Traces whose root never ends are decided once the buffer is full."""
+    sampler, collect, provider = _setup(sample_rate=0.0, max_traces=3)
+    tracer = provider.get_tracer("test")
+    roots = [tracer.start_span("invocation") for _ in range(5)]
+    for root in roots:
+        with tracer.start_as_current_span(
+            "execute_tool execute_sql", context=set_span_in_context(root)
+        ) as span:
+            span.set_attribute("gen_ai.tool.name", "execute_sql")
+    assert sampler.stats()["pending_traces"] == 3
+    assert len(collect.spans) == 2
+
+    # The root of a decided trace follows the earlier decision.
+    roots[0].end()
+    assert collect.spans[-1].name == "invocation"
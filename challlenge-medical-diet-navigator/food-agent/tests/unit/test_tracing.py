@@ -0,0 +1,208 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from types import SimpleNamespace
+from typing import Any
+
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.trace import Link, Status, StatusCode
+
+from app.utils.tracing import (
+    CloudTraceLoggingSpanExporter,
+    attribute_size_bounds,
+    load_offloaded_attribute,
+)
+
+
+class Recorder:
+    """Fake logging, storage and trace clients that record calls."""
+
+    def __init__(self, max_commit_bytes: int | None = None) -> None:
+        self.max_commit_bytes = max_commit_bytes
+        self.commits: list[list[dict]] = []
+        self.single_writes = 0
+        self.exists_calls = 0
+        self.uploads: dict[str, bytes] = {}
+        self.failing_uploads = 0
+
+    def logger(self, name: str) -> Any:
+        recorder = self
+
+        class Batch:
+            def __init__(self) -> None:
+                self.entries: list[dict] = []
+
+            def log_struct(self, info: dict, **kwargs: Any) -> None:
+                self.entries.append(info)
+
+            def commit(self) -> None:
+                size = len(json.dumps(self.entries, default=str))
+                if recorder.max_commit_bytes and size > recorder.max_commit_bytes:
+                    raise ValueError("Request payload size exceeds the limit")
+                recorder.commits.append(list(self.entries))
+                self.entries.clear()
+
+        def log_struct(info: dict, **kwargs: Any) -> None:
+            recorder.single_writes += 1
+
+        return SimpleNamespace(batch=Batch, log_struct=log_struct)
+
+    def bucket(self, name: str) -> Any:
+        def exists() -> bool:
+            self.exists_calls += 1
+            return True
+
+        def blob(blob_name: str) -> Any:
+            def upload_from_string(content: bytes, *args: Any, **kwargs: Any) -> None:
+                if self.failing_uploads:
+                    self.failing_uploads -= 1
+                    raise ConnectionError("upload failed")
+                self.uploads[blob_name] = content
+
+            return SimpleNamespace(
+                upload_from_string=upload_from_string,
+                download_as_bytes=lambda **kw: self.uploads[blob_name],
+            )
+
+        return SimpleNamespace(exists=exists, blob=blob)
+
+    def batch_write_spans(self, **kwargs: Any) -> None:
+        pass
+
+
+def _exporter(recorder: Recorder, **kwargs: Any) -> CloudTraceLoggingSpanExporter:
+    return CloudTraceLoggingSpanExporter(
+        project_id="p",
+        client=recorder,
+        logging_client=recorder,  # type: ignore[arg-type]
+        storage_client=recorder,
+        bucket_name="b",
+        **kwargs,
+    )
+
+
+def _spans(*sizes: int, prefix: str = "") -> list[ReadableSpan]:
+    tracer = TracerProvider().get_tracer("test")
+    spans: list[ReadableSpan] = []
+    with tracer.start_as_current_span("parent") as parent:
+        for i, size in enumerate(sizes):
+            link = Link(parent.get_span_context(), {"why": "retry"})
+            with tracer.start_as_current_span(f"child {i}", links=[link]) as span:
+                span.set_attribute("payload", prefix + "é" * size)
+                span.set_attribute("tools", ("execute_sql", "get_table_info"))
+                span.set_attribute("n", 3)
+                span.add_event("done", {"tokens": 12})
+                span.set_status(Status(StatusCode.ERROR, "boom"))
+            assert isinstance(span, ReadableSpan)
+            spans.append(span)
+    return spans
+
+
+def test_span_dict_matches_to_json() -> None:
+    """Building the dict directly gives the same fields as the JSON round trip."""
+    exporter = _exporter(Recorder())
+    for span in _spans(10, 20):
+        assert exporter.span_to_dict(span) == json.loads(span.to_json())
+
+
+def test_size_bounds_bracket_exact_size() -> None:
+    """The cheap bounds always contain the exact encoded size."""
+    for attributes in (
+        {"a": "x" * 100, "b": 1.0 / 3, "c": ("u", "v"), "d": True},
+        {"é": 'é\n"' * 50, "n": (1, 2, 3)},
+    ):
+        low, high = attribute_size_bounds(attributes)
+        exact = len(json.dumps(attributes, ensure_ascii=False).encode())
+        assert low <= exact <= high
+
+
+def test_export_batches_logs_and_offloads_large_payloads() -> None:
+    """One write per batch; only oversized values go to GCS, compressed and deduplicated."""
+    recorder = Recorder()
+    exporter = _exporter(recorder)
+    schema = "".join(f"column_{i} INT64, " for i in range(20_000))  # ~350 KB
+    spans = _spans(100, 200_000, 300, 150_000, prefix=schema)
+    exporter.export(spans)
+    exporter.shutdown()
+
+    assert recorder.single_writes == 0
+    assert len(recorder.commits) == 1
+    entries = recorder.commits[0]
+    assert [e["name"] for e in entries] == [s.name for s in spans]
+    assert recorder.exists_calls == 1
+
+    for span, entry in zip(spans, entries, strict=True):
+        attributes = entry["attributes"]
+        assert attributes["tools"] == ["execute_sql", "get_table_info"]
+        assert len(json.dumps(attributes)) < 8 * 1024
+        [manifest] = attributes["offloaded_attributes"]
+        assert manifest["key"] == "payload"
+        assert attributes["payload"].startswith("column_0 INT64")
+        assert span.attributes is not None
+        assert (
+            load_offloaded_attribute(recorder, manifest) == span.attributes["payload"]
+        )
+
+    stats = exporter.offload_stats()
+    assert stats["attributes_offloaded"] == 4
+    # The shared schema prefix is stored once, and chunks are compressed.
+    assert stats["chunks_deduplicated"] > 0
+    assert stats["chunks_uploaded"] == len(recorder.uploads)
+    assert stats["stored_bytes"] < stats["offloaded_bytes"] / 10
+
+
+def test_failed_chunk_upload_is_retried() -> None:
+    """A chunk is only treated as stored once its upload succeeded."""
+    recorder = Recorder()
+    recorder.failing_uploads = 1
+    exporter = _exporter(recorder, chunk_bytes=1_000, upload_workers=1)
+    data = b"x" * 1_000
+
+    def drain() -> None:
+        exporter._upload_pool.submit(lambda: None).result()
+
+    [digest] = exporter.store_chunks(data, "text/plain")
+    drain()
+    assert recorder.uploads == {}
+    assert exporter.store_chunks(data, "text/plain") == [digest]
+    drain()
+    assert list(recorder.uploads) == [f"span-chunks/{digest}.gz"]
+    exporter.store_chunks(data, "text/plain")
+    drain()
+    assert exporter.offload_stats()["chunks_uploaded"] == 1
+    assert exporter.offload_stats()["chunks_deduplicated"] == 1
+    exporter.shutdown()
+
+
+def test_export_splits_batches_by_size() -> None:
+    """A batch is written before the next entry would exceed max_batch_bytes."""
+    recorder = Recorder()
+    exporter = _exporter(recorder, max_batch_bytes=8_000)
+    exporter.export(_spans(1_000, 1_000, 1_000, 1_000))
+    assert [len(c) for c in recorder.commits] == [3, 1]
+
+
+def test_oversized_entry_is_written_alone() -> None:
+    """An entry over the limit fails on its own, not with its neighbours."""
+    recorder = Recorder(max_commit_bytes=20_000)
+    exporter = _exporter(
+        recorder, max_batch_bytes=20_000, offload_attribute_bytes=10**6
+    )
+    spans = _spans(1_000, 30_000, 1_000)
+    exporter.export(spans)
+    assert [[e["name"] for e in c] for c in recorder.commits] == [
+        [spans[0].name],
+        [spans[2].name],
+    ]
@@ -1,10 +1,11 @@
 # app/routes/home.py
 from __future__ import annotations
 from flask import Blueprint, render_template, request, jsonify, session as flask_session, current_app
-import os, asyncio, uuid, logging, threading
+import os, asyncio, uuid, logging, threading, json, re
 from mimetypes import guess_type
 from config import Config
 from google.cloud import storage
+from google.api_core.exceptions import NotFound
 
 logging.basicConfig(level=logging.INFO)
 home_bp = Blueprint("home", __name__)
@@ -13,23 +14,73 @@ RE_FULL = Config.Agent_Engine_Full_Adress
 PROJECT_ID = Config.PROJECT_ID
 LOCATION = Config.LOCATION
 UPLOAD_BUCKET = Config.UPLOAD_BUCKET # <-- set this
+IMAGE_BUCKET = Config.IMAGE_BUCKET
+IMAGE_JOB_PREFIX = Config.IMAGE_JOB_PREFIX
+_JOB_ID_PAT = re.compile(r"^[0-9a-f]{32}$")
 
 _adk_app = None
 _init_lock = threading.Lock()
 def _get_adk_app():
     """
-    Lazily import agent_engines, and cache the Agent Engine handle.
+    Lazily create and cache the agent handle: the remote Agent Engine, or with
+    AGENT_MODE=local an in-process Runner with the same two async methods.
     Safe to be called from multiple threads.
     """
-    from vertexai import agent_engines
     global _adk_app
     with _init_lock:
         if _adk_app is not None:
             return _adk_app
-        
-        _adk_app = agent_engines.get(RE_FULL)
+
+        if Config.AGENT_MODE == "local":
+            from app.services.local_agent import LocalAgentApp, build_session_service, load_root_agent
+            _adk_app = LocalAgentApp(
+                load_root_agent(Config.FOOD_AGENT_PATH, PROJECT_ID),
+                build_session_service(
+                    Config.SESSION_BACKEND, Config.SESSION_MAX_SESSIONS, Config.SESSION_DB_PATH
+                ),
+            )
+        else:
+            from vertexai import agent_engines
+            _adk_app = agent_engines.get(RE_FULL)
         return _adk_app
 
+_storage_client = None
+def _get_storage_client() -> storage.Client:
+    """One storage client per process; it holds auth state and a connection pool."""
+    global _storage_client
+    with _init_lock:
+        if _storage_client is None:
+            _storage_client = storage.Client()  # uses ADC
+        return _storage_client
+
+_photo_cache = None
+def _get_photo_cache():
+    """The process-wide cache of photo analyses, or None when disabled."""
+    global _photo_cache
+    if not Config.PHOTO_CACHE_ENABLED:
+        return None
+    with _init_lock:
+        if _photo_cache is None:
+            from app.services.photo_cache import PhotoAnalysisCache
+            _photo_cache = PhotoAnalysisCache(
+                ttl_seconds=Config.PHOTO_CACHE_TTL_SECONDS,
+                max_entries=Config.PHOTO_CACHE_MAX_ENTRIES,
+                max_distance=Config.PHOTO_CACHE_MAX_DISTANCE,
+            )
+        return _photo_cache
+
+_turn_recorder = None
+def _get_turn_recorder():
+    """What appends cache-served turns to agent sessions: the local app, or Agent Engine."""
+    global _turn_recorder
+    if Config.AGENT_MODE == "local":
+        return _get_adk_app()
+    with _init_lock:
+        if _turn_recorder is None:
+            from app.services.session_turns import AgentEngineSessions
+            _turn_recorder = AgentEngineSessions(RE_FULL)
+        return _turn_recorder
+
 def _safe_event_text(ev) -> str:
     """Extract just the assistant-visible text from an Agent Engine event."""
     # Dict-shaped events (what you're getting)
@@ -100,6 +151,7 @@ async def _ensure_session() -> tuple[str, str]:
 @home_bp.route("/", methods=["GET"])
 def home():
     flask_session.pop("ae_session_id", None)
+    flask_session.pop("ae_turns", None)
     return render_template("home.html")
 
 
@@ -215,8 +267,7 @@ def _parse_event_text(ev) -> tuple[str | None, str | None]:
 
 
 def _upload_to_gcs(image_bytes: bytes, mime_type: str) -> str:
-    client = storage.Client()  # uses ADC
-    bucket = client.bucket(UPLOAD_BUCKET)
+    bucket = _get_storage_client().bucket(UPLOAD_BUCKET)
     obj = f"chat-uploads/{uuid.uuid4().hex}"
     # (optional) add a sensible extension
     ext = {"image/png":"png","image/jpeg":"jpg","image/webp":"webp"}.get(mime_type, "bin")
@@ -256,6 +307,34 @@ async def _ask_agent_mm(prompt: str, image_bytes: bytes | None = None, mime_type
     user_id, session_id = await _ensure_session()
     adk_app = _get_adk_app()
 
+    # Near-identical photo asked the same way: reuse the earlier analysis and
+    # skip the upload and the vision turn. A session's first question does not
+    # depend on anything said before, so it can be shared between users. The
+    # reused turn is appended to the agent session so follow-up questions see
+    # it; if that fails the agent is asked as usual.
+    photo_key = None
+    photo_cache = _get_photo_cache() if image_bytes and mime_type and mime_type.startswith("image/") else None
+    if photo_cache is not None:
+        from app.services.photo_cache import image_hashes, intent_key
+        hashes = await asyncio.to_thread(image_hashes, image_bytes)
+        if hashes is not None:
+            scope = session_id if flask_session.get("ae_turns") else ""
+            photo_key = (scope, intent_key(prompt), hashes)
+            cached = photo_cache.get(*photo_key)
+            logging.info(json.dumps({"photo_cache": "hit" if cached else "miss", **photo_cache.stats()}))
+            if cached:
+                reply, author = cached
+                try:
+                    await _get_turn_recorder().async_append_turn(
+                        user_id=user_id, session_id=session_id,
+                        prompt=prompt or "(photo)", reply=reply, author=author,
+                    )
+                except Exception:
+                    logging.warning("photo cache: could not record the cached turn", exc_info=True)
+                else:
+                    flask_session["ae_turns"] = flask_session.get("ae_turns", 0) + 1
+                    return reply
+
     file_uris: list[tuple[str, str]] = []
     if image_bytes and mime_type and mime_type.startswith("image/"):
         gcs_uri = _upload_to_gcs(image_bytes, mime_type)
@@ -282,6 +361,7 @@ async def _ask_agent_mm(prompt: str, image_bytes: bytes | None = None, mime_type
     # Stream + aggregate
     delta_buf: list[str] = []
     last_complete: str | None = None
+    last_author: str | None = None
     have_image = bool(file_uris)
 
     async for event in adk_app.async_stream_query(
@@ -301,17 +381,23 @@ async def _ask_agent_mm(prompt: str, image_bytes: bytes | None = None, mime_type
             if have_image and _IMG_BLIND_PAT.search(final_text):
                 continue
             last_complete = final_text.strip()
+            last_author = event.get("author") if isinstance(event, dict) else getattr(event, "author", None)
+
+    flask_session["ae_turns"] = flask_session.get("ae_turns", 0) + 1
 
     # Pick best available
-    if last_complete:
-        return last_complete
-    if delta_buf:
+    reply = last_complete
+    if not reply and delta_buf:
         joined = "".join(delta_buf).strip()
         if have_image and _IMG_BLIND_PAT.search(joined):
             # guard against only getting the blind message in deltas
             return "Sorry—I couldn’t extract a final answer. Try a smaller/clearer image or add ingredients."
-        return joined
-    return "Sorry—I didn’t receive any text back from the agent."
+        reply = joined
+    if not reply:
+        return "Sorry—I didn’t receive any text back from the agent."
+    if photo_key is not None and reply == last_complete and last_author:
+        photo_cache.put(*photo_key, reply, last_author)
+    return reply
 
 
 @home_bp.route("/chat", methods=["POST"])
@@ -340,3 +426,24 @@ def chat():
     except Exception as e:
         logging.exception("Chat error")
         return jsonify({"error": str(e)}), 500
+
+
+@home_bp.route("/image-jobs/<job_id>", methods=["GET"])
+def image_job_status(job_id: str):
+    """
+    Status of a background image job started by the agent. The job writes
+    its result to GCS when it finishes; until then it is pending.
+    """
+    if not _JOB_ID_PAT.match(job_id):
+        return jsonify({"error": "Unknown image job."}), 404
+    blob = _get_storage_client().bucket(IMAGE_BUCKET).blob(f"{IMAGE_JOB_PREFIX}/{job_id}.json")
+    try:
+        status = json.loads(blob.download_as_bytes())
+    except NotFound:
+        status = {"job_id": job_id, "status": "pending"}
+    except Exception as e:
+        logging.exception("Image job status error")
+        return jsonify({"error": str(e)}), 500
+    resp = jsonify({k: status.get(k) for k in ("job_id", "status", "html", "text", "error_message") if k in status})
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
@@ -0,0 +1,168 @@
+# app/services/local_agent.py
+"""
+Runs food-agent's root_agent in this process with an ADK Runner.
+
+`LocalAgentApp` has the two methods the chat route uses on the remote Agent
+Engine handle, `async_create_session` and `async_stream_query`, with the same
+argument and event shapes, so the route works unchanged in either mode. It
+also has `async_append_turn`, like `session_turns.AgentEngineSessions`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator
+
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService, DatabaseSessionService, InMemorySessionService
+from google.genai import types
+
+_DONE = object()
+
+
+class LruSessionService(InMemorySessionService):
+    """In-memory sessions; the least recently used are deleted beyond `max_sessions`."""
+
+    def __init__(self, max_sessions: int = 1000):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self._lru: OrderedDict[tuple[str, str, str], None] = OrderedDict()
+
+    async def create_session(self, *, app_name, user_id, state=None, session_id=None):
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._lru[(app_name, user_id, session.id)] = None
+        while len(self._lru) > self.max_sessions:
+            (old_app, old_user, old_id), _ = self._lru.popitem(last=False)
+            await super().delete_session(app_name=old_app, user_id=old_user, session_id=old_id)
+        return session
+
+    async def get_session(self, *, app_name, user_id, session_id, config=None):
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None and (key := (app_name, user_id, session_id)) in self._lru:
+            self._lru.move_to_end(key)
+        return session
+
+    async def delete_session(self, *, app_name, user_id, session_id):
+        self._lru.pop((app_name, user_id, session_id), None)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+
+def build_session_service(backend: str, max_sessions: int, db_path: str) -> BaseSessionService:
+    if backend == "memory":
+        return LruSessionService(max_sessions=max_sessions)
+    if backend == "sqlite":
+        return DatabaseSessionService(db_url=f"sqlite:///{db_path}")
+    raise ValueError(f"Unknown SESSION_BACKEND {backend!r}; use 'memory' or 'sqlite'.")
+
+
+def load_root_agent(food_agent_path: str, project_id: str) -> Any:
+    """
+    Import food-agent's root_agent. Both projects name their package `app`,
+    so food-agent's package directory is added to this package's search path
+    instead of importing it under its own name; its modules import each other
+    as `app.*` and resolve there. The two packages share no module names.
+    """
+    import app as web_app
+
+    agent_pkg = os.path.join(os.path.abspath(food_agent_path), "app")
+    if not os.path.isdir(agent_pkg):
+        raise RuntimeError(f"FOOD_AGENT_PATH has no app/ package: {food_agent_path}")
+    if agent_pkg not in web_app.__path__:
+        web_app.__path__.append(agent_pkg)
+    # food-agent reads its settings from the environment at import time.
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", project_id)
+
+    from app.agent import get_root_agent
+
+    return get_root_agent()
+
+
+class LocalAgentApp:
+    """
+    In-process stand-in for the Agent Engine handle.
+
+    Flask handles each request with its own `asyncio.run`, but the agent's
+    model and storage clients must stay on one event loop, so the Runner
+    lives on a private loop in a daemon thread and events are handed back
+    to the caller's loop as they arrive.
+    """
+
+    def __init__(self, agent: Any, session_service: BaseSessionService, app_name: str = "app"):
+        self.app_name = app_name
+        self.runner = Runner(app_name=app_name, agent=agent, session_service=session_service)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="local-agent", daemon=True).start()
+
+    async def _call(self, coro) -> Any:
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    async def async_create_session(self, *, user_id: str) -> dict[str, Any]:
+        session = await self._call(
+            self.runner.session_service.create_session(app_name=self.app_name, user_id=user_id)
+        )
+        return session.model_dump(mode="json", exclude_none=True)
+
+    async def async_append_turn(
+        self, *, user_id: str, session_id: str, prompt: str, reply: str, author: str
+    ) -> None:
+        """Record a question and its answer in the session without running the agent."""
+        from app.services.session_turns import append_turn
+
+        await self._call(
+            append_turn(
+                self.runner.session_service,
+                app_name=self.app_name,
+                user_id=user_id,
+                session_id=session_id,
+                prompt=prompt,
+                reply=reply,
+                author=author,
+            )
+        )
+
+    async def async_stream_query(
+        self, *, user_id: str, session_id: str, message: str | dict[str, Any]
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yields events as JSON-style dicts, like the remote `async_stream_query`."""
+        if isinstance(message, str):
+            content = types.Content(role="user", parts=[types.Part.from_text(text=message)])
+        else:
+            content = types.Content.model_validate(message)
+
+        caller = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def put(item: Any) -> None:
+            try:
+                caller.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # The request finished and closed its loop.
+
+        async def produce() -> None:
+            try:
+                async for event in self.runner.run_async(
+                    user_id=user_id, session_id=session_id, new_message=content
+                ):
+                    put(event.model_dump(mode="json", exclude_none=True))
+            except Exception as e:
+                logging.exception("Local agent run failed")
+                put(e)
+            finally:
+                put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self._loop)
+        try:
+            while (item := await queue.get()) is not _DONE:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # The client went away: stop the run instead of finishing it unseen.
+            future.cancel()
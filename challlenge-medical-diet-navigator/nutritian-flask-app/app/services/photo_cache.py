@@ -0,0 +1,180 @@
+# app/services/photo_cache.py
+"""
+Reuses the agent's analysis of a photo for near-identical uploads.
+
+People photograph the same nutrition labels and packaged snacks over and
+over. Each upload is reduced to two 64-bit perceptual hashes (pHash from the
+low DCT frequencies, dHash from neighbouring pixel gradients). Re-encoding,
+resizing, small crops or a different phone camera move them by a few bits,
+so an upload whose hashes are both within `max_distance` bits (Hamming
+distance) of a stored one, asked with the same intent, gets the stored reply
+instead of a new vision turn.
+
+Entries expire after `ttl_seconds`; at most `max_entries` are kept and the
+least recently used go first. Lookups do not scan every entry: the pHash is
+cut into `max_distance + 1` bands, and two hashes within `max_distance` bits
+of each other agree exactly on at least one band, so only entries sharing a
+band value are compared.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+_HASH_SIZE = 8
+_DCT_SIZE = 32
+
+# Words that do not change what is being asked about the photo.
+_FILLER = frozenset(
+    "a an the this that these those it its is are was be please can could would "
+    "you me my i tell show give let us what whats do does in on of for to about "
+    "photo picture pic image here there".split()
+)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def intent_key(prompt: str | None) -> str:
+    """The prompt without case, punctuation and filler words."""
+    words = _WORD.findall((prompt or "").lower().replace("'", ""))
+    return " ".join(w for w in words if w not in _FILLER)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def _bits(mask: np.ndarray) -> int:
+    return int("".join("1" if b else "0" for b in mask.flatten()), 2)
+
+
+def image_hashes(image_bytes: bytes) -> tuple[int, int] | None:
+    """(pHash, dHash) of an image, or None when Pillow is missing or cannot read it."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            # JPEGs decode straight to a small grayscale image; much faster
+            # than decoding a 12 MP photo only to shrink it.
+            img.draft("L", (_DCT_SIZE * 2, _DCT_SIZE * 2))
+            img = ImageOps.exif_transpose(img).convert("L")
+            pixels = np.asarray(
+                img.resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.LANCZOS), dtype=np.float64
+            )
+            small = np.asarray(
+                img.resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.LANCZOS), dtype=np.int16
+            )
+    except Exception:
+        logging.info("photo cache: unreadable image, not cached", exc_info=True)
+        return None
+
+    low = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE]
+    # The DC term is overall brightness; leave it out of the median.
+    phash = _bits(low > np.median(low.flatten()[1:]))
+    dhash = _bits(small[:, 1:] > small[:, :-1])
+    return phash, dhash
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@dataclass
+class _Entry:
+    scope: str
+    intent: str
+    phash: int
+    dhash: int
+    reply: str
+    author: str
+    expires_at: float
+
+
+class PhotoAnalysisCache:
+    """Thread-safe, bounded store of replies keyed by (scope, intent, image hashes)."""
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 2000, max_distance: int = 6):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        # (scope, intent, band, pHash bits in that band) -> entry ids
+        self._index: dict[tuple[str, str, int, int], set[int]] = {}
+        bands = min(max_distance + 1, 64)
+        edges = [64 * i // bands for i in range(bands + 1)]
+        self._bands = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _keys(self, scope: str, intent: str, phash: int) -> list[tuple[str, str, int, int]]:
+        return [(scope, intent, i, (phash >> shift) & mask) for i, (shift, mask) in enumerate(self._bands)]
+
+    def _remove(self, entry_id: int) -> None:
+        e = self._entries.pop(entry_id)
+        for key in self._keys(e.scope, e.intent, e.phash):
+            ids = self._index[key]
+            ids.discard(entry_id)
+            if not ids:
+                del self._index[key]
+
+    def get(self, scope: str, intent: str, hashes: tuple[int, int]) -> tuple[str, str] | None:
+        """(reply, author of the reply) for the closest matching photo, or None."""
+        phash, dhash = hashes
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for key in self._keys(scope, intent, phash):
+                candidates |= self._index.get(key, set())
+            best_id, best_distance = None, None
+            for entry_id in candidates:
+                e = self._entries[entry_id]
+                if e.expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                dp, dd = hamming(e.phash, phash), hamming(e.dhash, dhash)
+                if max(dp, dd) > self.max_distance:
+                    continue
+                if best_distance is None or dp + dd < best_distance:
+                    best_id, best_distance = entry_id, dp + dd
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            best = self._entries[best_id]
+            return best.reply, best.author
+
+    def put(self, scope: str, intent: str, hashes: tuple[int, int], reply: str, author: str) -> None:
+        """Store `reply`; `author` is the agent that gave it, for recording reuse in a session."""
+        phash, dhash = hashes
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(
+                scope, intent, phash, dhash, reply, author, time.monotonic() + self.ttl_seconds
+            )
+            for key in self._keys(scope, intent, phash):
+                self._index.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
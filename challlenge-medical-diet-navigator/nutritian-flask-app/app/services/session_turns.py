@@ -0,0 +1,87 @@
+# app/services/session_turns.py
+"""
+Records a turn the agent did not run itself (a reply served from the photo
+cache) in the agent's session, so later turns see the question and answer.
+
+`AgentEngineSessions` does this for a deployed Agent Engine; `LocalAgentApp`
+has the same `async_append_turn` method for the in-process Runner.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService
+from google.genai import types
+
+
+def turn_events(prompt: str, reply: str, author: str) -> list[Event]:
+    """A user event with `prompt` and a model event from `author` with `reply`."""
+    invocation_id = f"e-{uuid.uuid4()}"
+    now = time.time()
+    return [
+        Event(
+            invocation_id=invocation_id,
+            author="user",
+            timestamp=now,
+            content=types.Content(role="user", parts=[types.Part.from_text(text=prompt)]),
+        ),
+        Event(
+            invocation_id=invocation_id,
+            author=author,
+            timestamp=now,
+            content=types.Content(role="model", parts=[types.Part.from_text(text=reply)]),
+        ),
+    ]
+
+
+async def append_turn(
+    session_service: BaseSessionService,
+    *,
+    app_name: str,
+    user_id: str,
+    session_id: str,
+    prompt: str,
+    reply: str,
+    author: str,
+) -> None:
+    session = await session_service.get_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    )
+    if session is None:
+        raise LookupError(f"Session {session_id} not found.")
+    for event in turn_events(prompt, reply, author):
+        await session_service.append_event(session, event)
+
+
+class AgentEngineSessions:
+    """Appends turns to the sessions of a deployed Agent Engine."""
+
+    def __init__(self, resource_name: str):
+        """:param resource_name: projects/<p>/locations/<l>/reasoningEngines/<id>"""
+        parts = resource_name.strip("/").split("/")
+        fields = dict(zip(parts[::2], parts[1::2]))
+        self.project = fields["projects"]
+        self.location = fields["locations"]
+        self.engine_id = fields["reasoningEngines"]
+
+    async def async_append_turn(
+        self, *, user_id: str, session_id: str, prompt: str, reply: str, author: str
+    ) -> None:
+        from google.adk.sessions import VertexAiSessionService
+
+        # Built per call: its API client belongs to the event loop of the
+        # request that made it, and each Flask request runs its own loop.
+        service = VertexAiSessionService(
+            project=self.project, location=self.location, agent_engine_id=self.engine_id
+        )
+        await append_turn(
+            service,
+            app_name=self.engine_id,
+            user_id=user_id,
+            session_id=session_id,
+            prompt=prompt,
+            reply=reply,
+            author=author,
+        )
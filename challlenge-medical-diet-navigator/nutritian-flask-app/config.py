@@ -8,9 +8,34 @@ class Config:
     # Need to create a GCS bucket that images will be uploaded to when users submit them via the web app    
     UPLOAD_BUCKET = os.getenv("UPLOAD_BUCKET", "diet-navigator-uploads-cool-benefit-472616-t9") 
     
+    # Bucket the agent publishes generated images to; background image jobs
+    # write their status to IMAGE_JOB_PREFIX/<job_id>.json in it.
+    IMAGE_BUCKET = os.getenv("IMAGE_BUCKET", "food-agent-generated-images-dar")
+    IMAGE_JOB_PREFIX = os.getenv("IMAGE_JOB_PREFIX", "image-jobs")
+
     # This will need to be updated with your actual agent engine full address
     Agent_Engine_Full_Adress = os.getenv("Agent_Engine_Full_Adress", "projects/cool-benefit-472616-t9/locations/us-central1/reasoningEngines/6627156802838462464")
     
     
+    # "remote" talks to the Agent Engine above; "local" runs food-agent's
+    # root_agent in this process with an ADK Runner (self-hosted, co-located).
+    AGENT_MODE = os.getenv("AGENT_MODE", "remote")
+    FOOD_AGENT_PATH = os.getenv(
+        "FOOD_AGENT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "food-agent")
+    )
+    # Local mode only: "memory" (LRU-bounded, lost on restart) or "sqlite".
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+    SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+
+    # Replies to photo uploads are reused for near-identical photos asked the
+    # same question: perceptual hashes at most PHOTO_CACHE_MAX_DISTANCE bits
+    # apart (of 64). Opening questions are shared between users; later turns
+    # depend on the conversation and only match within the same session.
+    PHOTO_CACHE_ENABLED = os.getenv("PHOTO_CACHE_ENABLED", "true").lower() == "true"
+    PHOTO_CACHE_TTL_SECONDS = int(os.getenv("PHOTO_CACHE_TTL_SECONDS", "86400"))
+    PHOTO_CACHE_MAX_ENTRIES = int(os.getenv("PHOTO_CACHE_MAX_ENTRIES", "2000"))
+    PHOTO_CACHE_MAX_DISTANCE = int(os.getenv("PHOTO_CACHE_MAX_DISTANCE", "6"))
+
     # Add other Flask config settings if needed
     DEBUG = True